@@ -0,0 +1,181 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from PIL import Image
+
+
+# A shed request keeps capture hints at their most conservative for this long
+SHED_MEMORY_SECONDS = 10
+# Capture settings suggested to camera clients as gate pressure rises:
+# (pressure below, frame interval ms, max image dimension px, JPEG quality)
+CAPTURE_LEVELS = [
+    (0.5, 200, 1280, 85),
+    (1.0, 500, 960, 80),
+    (1.5, 1000, 640, 70),
+    (float('inf'), 2000, 480, 60),
+]
+
+
+class AdmissionRejected(Exception):
+    """Raised when the upstream is saturated and the request should be retried later"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Busy, retry after {retry_after:.2f}s")
+        self.retry_after = retry_after
+
+
+def frame_fingerprint(image):
+    """64-bit difference hash of a PIL image; near-identical frames share a fingerprint"""
+    small = image.convert('L').resize((9, 8), Image.BILINEAR)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (1 if left > right else 0)
+    return bits
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into a single execution"""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, fn):
+        """Run fn() once per key at a time; returns (result, shared)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.waiters += 1
+                self.shared += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+            return flight.result, False
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+class AdmissionGate:
+    """Bounds concurrent upstream calls with a short, bounded wait queue"""
+
+    def __init__(self, max_in_flight, max_queue, max_wait, target_latency=1.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        # Upstream latency beyond which the gate counts as under pressure even with free slots
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.avg_latency = 0.0
+        self.last_shed = 0.0
+        self._cond = threading.Condition()
+
+    def _retry_after(self):
+        # Rough time for the queue ahead to drain, never less than the max wait
+        backlog = (self.waiting + 1) / max(self.max_in_flight, 1)
+        return max(self.max_wait, backlog * (self.avg_latency or self.max_wait))
+
+    @contextmanager
+    def admit(self):
+        with self._cond:
+            if self.in_flight >= self.max_in_flight:
+                if self.waiting >= self.max_queue:
+                    self.shed += 1
+                    self.last_shed = time.monotonic()
+                    raise AdmissionRejected(self._retry_after())
+                self.waiting += 1
+                deadline = time.monotonic() + self.max_wait
+                try:
+                    while self.in_flight >= self.max_in_flight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            # Waited too long; the frame is stale by the time it would run
+                            self.shed += 1
+                            self.last_shed = time.monotonic()
+                            raise AdmissionRejected(self._retry_after())
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_flight += 1
+            self.admitted += 1
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._cond:
+                self.in_flight -= 1
+                self.avg_latency = elapsed if not self.avg_latency else 0.8 * self.avg_latency + 0.2 * elapsed
+                self._cond.notify()
+
+    def pressure(self):
+        """0 when idle; 1 or more once every slot is busy or calls take longer than the target latency"""
+        with self._cond:
+            if time.monotonic() - self.last_shed < SHED_MEMORY_SECONDS:
+                return float('inf')
+            occupancy = (self.in_flight + self.waiting) / max(self.max_in_flight, 1)
+            return max(occupancy, self.avg_latency / self.target_latency)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'shed': self.shed,
+                'avg_latency_ms': round(self.avg_latency * 1000, 1),
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue
+            }
+
+
+def capture_hints(gate, retry_after=None):
+    """Frame interval, resolution and JPEG quality a camera client should use at the gate's current load"""
+    pressure = gate.pressure()
+    for limit, interval_ms, max_dimension, jpeg_quality in CAPTURE_LEVELS:
+        if pressure < limit:
+            break
+    # A single client gains nothing from sending faster than one search takes
+    interval_ms = max(interval_ms, round(gate.avg_latency * 1000), round((retry_after or 0) * 1000))
+    return {
+        'frame_interval_ms': interval_ms,
+        'max_dimension': max_dimension,
+        'jpeg_quality': jpeg_quality
+    }
+
+
+def retry_after_header(seconds):
+    """Retry-After must be whole seconds"""
+    return str(max(1, math.ceil(seconds)))
@@ -1,7 +1,10 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, send_file, Response, stream_with_context
 from flask_cors import CORS
 import boto3
 import base64
+import hashlib
+import atexit
+import time
 import uuid
 from datetime import datetime
 import os
@@ -10,28 +13,354 @@ import json
 from PIL import Image
 import io
 import requests
+import tempfile
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows
+from jobs import JobRegistry
+from bulk_import import BulkImporter, parse_zip_archive
+from deletion import PersonDeleter
+from exemplars import ExemplarIndexer
+from tenants import TenantRouter, item_tenant
+from roster import is_roster_meta
+from admission import SingleFlight, AdmissionGate, AdmissionRejected, frame_fingerprint, retry_after_header, capture_hints
+from aws_scheduler import parse_rate_limits, RateLimited, PRIORITY_LIVE, PRIORITY_ENROLLMENT, PRIORITY_BACKGROUND
+from backends import create_backend, NoFaceError
+from media_dedup import MediaDeduplicator, content_digest
+from events import EventBus, RosterNotifier, TooManySubscribers
+from device_auth import DeviceTokens, token_from_request
+from phrase_audio import PhraseAudioCache, announcement_segments
+from audio_profiles import AudioProfileStats, get_profile, profile_from_request
+from reminders import ReminderScheduler, new_reminder, is_reminder_item, REMINDER_AUDIO_FOLDER
+from profiling import RequestProfiler
+from history import RecognitionLog, new_event, parse_time, now_ms
+from tracing import Tracer, parse_exporters, instrument_boto3, from_otlp, format_traceparent, KIND_SERVER, KIND_CLIENT, MAX_INGEST_SPANS
+from serialization import ResponseSerializer, compress_response, representation_etag
+from uploads import DirectUploads, ChunkedUploads, thumbnail_key, media_type, THUMBNAIL_SIZE
+from image_pool import ImagePool, ImagePoolBusy
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+# jsonify() goes through the shared serializer: ?fields=, orjson, MessagePack/CBOR by Accept
+app.json_provider_class = ResponseSerializer
+app.json = ResponseSerializer(app)
 CORS(app)
 
-# AWS clients
-rekognition = boto3.client('rekognition')
-s3 = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
-bedrock = boto3.client('bedrock-runtime')
-
 # Configuration
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'aws')
 BUCKET_NAME = os.getenv('S3_BUCKET_NAME', 'alzheimer-camera-faces')
 COLLECTION_ID = os.getenv('REKOGNITION_COLLECTION_ID', 'alzheimer-faces')
 TABLE_NAME = os.getenv('DYNAMODB_TABLE_NAME', 'alzheimer-persons')
+HISTORY_TABLE_NAME = os.getenv('HISTORY_TABLE_NAME', 'alzheimer-recognitions')
+# Days raw recognition events are kept; per-person daily rollups are kept longer
+HISTORY_RAW_DAYS = int(os.getenv('HISTORY_RAW_DAYS', '90'))
+HISTORY_ROLLUP_DAYS = int(os.getenv('HISTORY_ROLLUP_DAYS', '730'))
 ELEVENLABS_API_KEY = os.getenv('ELEVEN_LAB_API_KEY')
 ELEVENLABS_VOICE_ID = os.getenv('VOICE_ID')
+BULK_IMPORT_WORKERS = int(os.getenv('BULK_IMPORT_WORKERS', '4'))
+MAX_EXEMPLARS_PER_PERSON = int(os.getenv('MAX_EXEMPLARS_PER_PERSON', '8'))
+# Largest photo the phone may upload straight to the bucket
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', str(15 * 1024 * 1024)))
+# Largest video message, uploaded in chunks through the API
+MAX_VIDEO_BYTES = int(os.getenv('MAX_VIDEO_BYTES', str(200 * 1024 * 1024)))
+RECOGNIZE_MAX_IN_FLIGHT = int(os.getenv('RECOGNIZE_MAX_IN_FLIGHT', '8'))
+RECOGNIZE_MAX_QUEUE = int(os.getenv('RECOGNIZE_MAX_QUEUE', '16'))
+RECOGNIZE_MAX_WAIT = float(os.getenv('RECOGNIZE_MAX_WAIT', '0.5'))
+# Minimum similarity (0-100) for a face to count as a match; tune with GET /history/stats
+FACE_MATCH_THRESHOLD = float(os.getenv('FACE_MATCH_THRESHOLD', '70'))
+# Search latency at which camera clients are told to slow down, even with free slots
+RECOGNIZE_TARGET_LATENCY = float(os.getenv('RECOGNIZE_TARGET_LATENCY', '1.0'))
+AWS_RATE_LIMITS = parse_rate_limits(os.getenv('AWS_RATE_LIMITS'))
+# Longest enrollment and background Rekognition calls wait for a token before giving up
+ENROLLMENT_MAX_WAIT = float(os.getenv('ENROLLMENT_MAX_WAIT', '10'))
+BACKGROUND_MAX_WAIT = float(os.getenv('BACKGROUND_MAX_WAIT', '60'))
+LOCAL_DATA_DIR = os.getenv('LOCAL_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'local_data'))
+LOCAL_PUBLIC_URL = os.getenv('LOCAL_PUBLIC_URL', 'http://localhost:8000')
+LOCAL_MEDIA_SECRET = os.getenv('LOCAL_MEDIA_SECRET')
+# Held by the serving process so a second API process on the same host refuses to start
+SERVER_LOCK_PATH = os.getenv('SERVER_LOCK_PATH', os.path.join(tempfile.gettempdir(), 'alzheimer-api.lock'))
+LOCAL_EMBEDDER = os.getenv('LOCAL_EMBEDDER')
+# Max dHash bit distance at which an upload counts as a copy of an existing photo; unset only dedups exact copies
+MEDIA_DEDUP_PHASH_DISTANCE = os.getenv('MEDIA_DEDUP_PHASH_DISTANCE')
+DEVICE_TOKEN_SECRET = os.getenv('DEVICE_TOKEN_SECRET')
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv('EVENTS_MAX_SUBSCRIBERS', '100'))
+# Audio profile (see audio_profiles.py) for clients that don't ask for one, and for reminders
+DEFAULT_AUDIO_PROFILE = get_profile(os.getenv('DEFAULT_AUDIO_PROFILE', 'standard'))
+# Build announcements from cached phrase segments instead of synthesizing each sentence in full
+TTS_PHRASE_STITCHING = os.getenv('TTS_PHRASE_STITCHING', '1') != '0'
+# Time zone for scheduled reminders that don't name one
+REMINDER_DEFAULT_TIMEZONE = os.getenv('REMINDER_DEFAULT_TIMEZONE', 'UTC')
+# Request profiling: fraction of requests sampled, and the token that forces a profile and unlocks /admin/profiles
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'sample')
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '200'))
+# Sampled requests faster than this many seconds aren't worth keeping
+PROFILE_MIN_DURATION = float(os.getenv('PROFILE_MIN_DURATION', '0'))
+# Where finished spans go: "file:<path>" and/or "otlp:<collector /v1/traces URL>", comma separated
+TRACE_EXPORT = os.getenv('TRACE_EXPORT')
+# Share of traces recorded when a request doesn't arrive with a traceparent
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '1.0'))
+# Worker processes for photo decoding and re-encoding (0 runs it on the request thread),
+# photos allowed to wait for one, and how long a request waits for a place in that queue
+IMAGE_POOL_WORKERS = int(os.getenv('IMAGE_POOL_WORKERS', '2'))
+IMAGE_POOL_MAX_QUEUE = int(os.getenv('IMAGE_POOL_MAX_QUEUE', '32'))
+IMAGE_POOL_MAX_WAIT = float(os.getenv('IMAGE_POOL_MAX_WAIT', '5'))
+
+# Photo work for enrollment, galleries and imports runs in worker processes, off the GIL that
+# /recognize needs. They're forked here, before any thread starts; the debug reloader's
+# watcher process never serves, so it doesn't fork any.
+image_pool = ImagePool(IMAGE_POOL_WORKERS, IMAGE_POOL_MAX_QUEUE)
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    image_pool.start()
+
+# Traces tie a camera frame to the AWS and TTS calls it causes and to its announcement.
+# AWS calls are timed through boto3's event hooks, which clients copy when created.
+tracer = Tracer('backend', parse_exporters(TRACE_EXPORT), sample_rate=TRACE_SAMPLE_RATE)
+if boto3.DEFAULT_SESSION is None:
+    boto3.setup_default_session()
+instrument_boto3(tracer, boto3.DEFAULT_SESSION)
+
+# Object store, person store and face index: AWS (S3, DynamoDB, Rekognition) or
+# local (files, SQLite, in-process vector index) for a home hub with no cloud
+storage = create_backend(STORAGE_BACKEND, {
+    'bucket_name': BUCKET_NAME,
+    'table_name': TABLE_NAME,
+    'history_table_name': HISTORY_TABLE_NAME,
+    'history_raw_days': HISTORY_RAW_DAYS,
+    'history_rollup_days': HISTORY_ROLLUP_DAYS,
+    'rate_limits': AWS_RATE_LIMITS,
+    'live_wait': RECOGNIZE_MAX_WAIT,
+    'enrollment_wait': ENROLLMENT_MAX_WAIT,
+    'background_wait': BACKGROUND_MAX_WAIT,
+    'local_dir': LOCAL_DATA_DIR,
+    'public_url': LOCAL_PUBLIC_URL,
+    'media_secret': LOCAL_MEDIA_SECRET,
+    'embedder': LOCAL_EMBEDDER
+})
+objects = storage.objects
+
+# Face index views by priority: live recognition goes first, then enrollment,
+# then background maintenance
+faces_live = storage.faces(PRIORITY_LIVE)
+faces_enrollment = storage.faces(PRIORITY_ENROLLMENT)
+faces_background = storage.faces(PRIORITY_BACKGROUND)
+
+# Bedrock is only reachable with the AWS backend
+bedrock = boto3.client('bedrock-runtime') if STORAGE_BACKEND == 'aws' else None
+
+# Per-patient/household routing of collection, S3 prefix and DynamoDB partition
+tenant_router = TenantRouter(COLLECTION_ID)
+
+# Push channel to paired devices
+event_bus = EventBus(max_subscribers=EVENTS_MAX_SUBSCRIBERS)
+device_tokens = DeviceTokens(DEVICE_TOKEN_SECRET) if DEVICE_TOKEN_SECRET else None
+
+# Person records with the versioned roster changelog backing /reminders delta sync and ETags;
+# roster writes publish change notifications on the push channel
+roster = RosterNotifier(storage.people, event_bus)
+
+# Opt-in profiling of sampled or explicitly flagged requests
+profiler = RequestProfiler(
+    PROFILE_DIR,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    token=PROFILE_TOKEN,
+    mode=PROFILE_MODE,
+    max_profiles=PROFILE_MAX_FILES,
+    min_duration=PROFILE_MIN_DURATION
+) if PROFILE_SAMPLE_RATE > 0 or PROFILE_TOKEN else None
+
+@app.before_request
+def start_trace():
+    # Continue the trace a camera or relay started at capture, or start one here
+    if request.path == '/v1/traces':
+        return
+    rule = request.url_rule.rule if request.url_rule else request.path
+    g.trace_span = tracer.start_span(f"{request.method} {rule}", KIND_SERVER,
+                                     traceparent=request.headers.get('traceparent'), route=rule)
+
+@app.before_request
+def start_profile():
+    if profiler:
+        g.profile = profiler.start(request)
+
+@app.before_request
+def resolve_tenant():
+    try:
+        g.tenant = tenant_router.from_request(request)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+def finish_profile(status, response_bytes=None):
+    """Write the current request's profile, if it has one; returns the profile ID"""
+    handle = g.pop('profile', None)
+    if not handle:
+        return None
+    try:
+        return profiler.finish(handle, {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'args': {key: value for key, value in request.args.items() if key != 'token'},
+            'tenant': g.tenant.tenant_id if 'tenant' in g else None,
+            'status': status,
+            'request_bytes': request.content_length,
+            'response_bytes': response_bytes
+        })
+    except Exception as e:
+        print(f"[PROFILE] Failed to write profile: {e}")
+        return None
 
-# DynamoDB table
-table = dynamodb.Table(TABLE_NAME)
+@app.after_request
+def write_profile(response):
+    profile_id = finish_profile(response.status_code, None if response.is_streamed else response.calculate_content_length())
+    if profile_id:
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+@app.after_request
+def end_trace(response):
+    span = g.pop('trace_span', None)
+    if span:
+        span.set(status=response.status_code)
+        if 'tenant' in g:
+            span.set(tenant=g.tenant.tenant_id)
+        response.headers['traceresponse'] = format_traceparent(span)
+        span.end()
+    return response
+
+@app.after_request
+def compress(response):
+    return compress_response(response, request)
+
+@app.teardown_request
+def abandon_request(error):
+    # after_request doesn't run when a view raises; still stop the profiler and trace
+    finish_profile(500)
+    span = g.pop('trace_span', None)
+    if span:
+        span.fail(error or 'request aborted')
+        span.end()
+
+def get_person(person_id, tenant):
+    """Fetch a person record, hiding records that belong to another tenant"""
+    if is_roster_meta(person_id) or is_reminder_item(person_id):
+        return None
+    person_info = roster.get(person_id)
+    if person_info and item_tenant(person_info) != tenant.tenant_id:
+        return None
+    return person_info
+
+def query_roster(tenant):
+    """All person records owned by a tenant, via the owner index"""
+    return roster.query(tenant)
+
+def media_key(tenant, person_id, media_id):
+    return f"{tenant.s3_prefix}{person_id}/{media_id}.jpg"
+
+def image_busy_response(e):
+    """503 telling the client when the image pool (or Rekognition rate limit) should have room again"""
+    response = jsonify({'error': str(e), 'retry_after': round(e.retry_after, 2)})
+    response.status_code = 503
+    response.headers['Retry-After'] = retry_after_header(e.retry_after)
+    return response
+
+# Background indexing of gallery photos as extra face exemplars
+exemplar_indexer = ExemplarIndexer(
+    faces_background, roster,
+    max_exemplars=MAX_EXEMPLARS_PER_PERSON
+)
+
+# Per-person content-hash index so re-uploads reuse the existing media
+media_dedup = MediaDeduplicator(
+    roster,
+    perceptual_distance=int(MEDIA_DEDUP_PHASH_DISTANCE) if MEDIA_DEDUP_PHASH_DISTANCE else None
+)
+
+def save_person_photo(tenant, person_info, raw_bytes, rendition=None, wait=IMAGE_POOL_MAX_WAIT):
+    """Store a gallery photo and its thumbnail unless the person already has it; returns (media_id, s3_key, duplicate)
+
+    `rendition` is render_photo() output when the caller already has it; otherwise the image
+    pool makes one, waiting up to `wait` seconds for a slot (ImagePoolBusy after that).
+    """
+    person_id = person_info['person_id']
+    digest = content_digest(raw_bytes)
+    media_id = media_dedup.find(person_info, digest)
+    if media_id:
+        return media_id, media_key(tenant, person_id, media_id), True
+    
+    if rendition is None:
+        rendition = image_pool.render(raw_bytes, wait=wait, thumbnail_size=THUMBNAIL_SIZE)
+    phash = rendition['phash']
+    media_id = media_dedup.find(person_info, digest, phash)
+    if media_id:
+        return media_id, media_key(tenant, person_id, media_id), True
+    
+    # Claim the hash before uploading so concurrent copies of the same photo store it once
+    media_id = str(uuid.uuid4())
+    existing_id = media_dedup.claim(person_id, digest, media_id, phash)
+    if existing_id:
+        return existing_id, media_key(tenant, person_id, existing_id), True
+    person_info.setdefault('media_hashes', {})[digest] = media_id
+    person_info.setdefault('media_phashes', {})[media_id] = phash
+    
+    s3_key = media_key(tenant, person_id, media_id)
+    try:
+        objects.put(s3_key, rendition['jpeg'], 'image/jpeg')
+    except Exception:
+        media_dedup.release(person_id, media_id)
+        raise
+    if rendition.get('thumb'):
+        try:
+            objects.put(thumbnail_key(tenant, person_id, media_id), rendition['thumb'], 'image/jpeg')
+        except Exception as e:
+            print(f"[MEDIA] Thumbnail for {s3_key} not stored, the full photo stands in: {e}")
+    exemplar_indexer.enqueue(tenant, person_id, media_id, s3_key)
+    return media_id, s3_key, False
+
+# Background jobs (bulk import, person deletion)
+jobs = JobRegistry()
+bulk_importer = BulkImporter(
+    faces_enrollment, objects, roster,
+    images=image_pool,
+    save_photo=save_person_photo,
+    dedup=media_dedup,
+    jobs=jobs,
+    exemplar_indexer=exemplar_indexer,
+    workers=BULK_IMPORT_WORKERS,
+    match_threshold=FACE_MATCH_THRESHOLD,
+    image_wait=IMAGE_POOL_MAX_WAIT
+)
+person_deleter = PersonDeleter(faces_enrollment, objects, roster, jobs)
+# Gallery photos the phone uploads straight to the bucket, processed off the request path
+direct_uploads = DirectUploads(objects, jobs, image_pool, save_person_photo, MAX_UPLOAD_BYTES)
+# Video messages, streamed in resumable chunks into a multipart object
+video_uploads = ChunkedUploads(objects, jobs, MAX_VIDEO_BYTES)
+
+# Whole frames vs. faces pre-cropped by the camera client, with their upload sizes
+recognize_inputs = {'full': 0, 'full_bytes': 0, 'cropped': 0, 'cropped_bytes': 0}
+
+def parse_face_box(crop):
+    """Validated `crop` from a pre-cropped /recognize request: the face box within the full frame"""
+    if crop is None:
+        return None
+    try:
+        left, top, width, height = (int(v) for v in crop['box'])
+        frame_width, frame_height = (int(v) for v in crop['frame'])
+    except (TypeError, KeyError, ValueError):
+        raise ValueError('crop must be {"box": [left, top, width, height], "frame": [width, height]}')
+    if width <= 0 or height <= 0 or left < 0 or top < 0 or left + width > frame_width or top + height > frame_height:
+        raise ValueError('crop box must lie inside the frame')
+    return {'left': left, 'top': top, 'width': width, 'height': height,
+            'frame_width': frame_width, 'frame_height': frame_height}
+
+# Admission control in front of Rekognition for live recognition
+recognize_flight = SingleFlight()
+recognize_gate = AdmissionGate(RECOGNIZE_MAX_IN_FLIGHT, RECOGNIZE_MAX_QUEUE, RECOGNIZE_MAX_WAIT, RECOGNIZE_TARGET_LATENCY)
 
 @app.route('/recognize', methods=['POST'])
 def recognize_face():
@@ -43,81 +372,180 @@ def recognize_face():
         if not image_data:
             return jsonify({'error': 'No image provided'}), 400
         
+        try:
+            face_box = parse_face_box(data.get('crop'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Decode and convert image
         try:
+            decode_span = tracer.start_span('recognize.decode', cropped=bool(face_box))
             if ',' in image_data:
                 image_bytes = base64.b64decode(image_data.split(',')[1])
             else:
                 image_bytes = base64.b64decode(image_data)
             
-            # Convert to JPEG for Rekognition
-            image = Image.open(io.BytesIO(image_bytes))
-            if image.mode in ('RGBA', 'P'):
-                image = image.convert('RGB')
-            
-            buffer = io.BytesIO()
-            image.save(buffer, format='JPEG')
-            image_bytes = buffer.getvalue()
+            if face_box:
+                # Pre-cropped face from a camera client: already a small JPEG, so skip the
+                # re-encode and decode only at 1/8 scale for the fingerprint
+                if not image_bytes.startswith(b'\xff\xd8'):
+                    return jsonify({'error': 'Pre-cropped images must be JPEG'}), 400
+                image = Image.open(io.BytesIO(image_bytes))
+                image.draft('L', (max(image.width // 8, 9), max(image.height // 8, 8)))
+                fingerprint = frame_fingerprint(image)
+                recognize_inputs['cropped'] += 1
+                recognize_inputs['cropped_bytes'] += len(image_bytes)
+            else:
+                # Convert to JPEG for Rekognition
+                image = Image.open(io.BytesIO(image_bytes))
+                if image.mode in ('RGBA', 'P'):
+                    image = image.convert('RGB')
+                
+                buffer = io.BytesIO()
+                image.save(buffer, format='JPEG')
+                image_bytes = buffer.getvalue()
+                fingerprint = frame_fingerprint(image)
+                recognize_inputs['full'] += 1
+                recognize_inputs['full_bytes'] += len(image_bytes)
             print(f"Converted image size: {len(image_bytes)} bytes")
         except Exception as e:
+            decode_span.fail(e)
             return jsonify({'error': f'Image conversion failed: {str(e)}'}), 400
+        finally:
+            decode_span.end()
         
-        # Search for face in collection
-        response = rekognition.search_faces_by_image(
-            CollectionId=COLLECTION_ID,
-            Image={'Bytes': image_bytes},
-            MaxFaces=1,
-            FaceMatchThreshold=70
-        )
+        try:
+            profile = profile_from_request(request, DEFAULT_AUDIO_PROFILE.name)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Merge concurrent near-identical frames (wanting the same audio format) into one upstream recognition
+        flight_key = (g.tenant.collection_id, fingerprint, profile.name)
+        tenant = g.tenant
+        result, shared = recognize_flight.do(flight_key, lambda: run_recognition(tenant, image_bytes, profile, face_box))
+        if shared:
+            print(f"[RECOGNIZE] Coalesced with in-flight request for frame {fingerprint:016x}")
+            g.trace_span.set(coalesced=True)
+        # Tell camera clients how fast and how large to capture at the current load
+        return jsonify(dict(result, capture=capture_hints(recognize_gate), trace_id=g.trace_span.trace_id))
+    
+    except AdmissionRejected as e:
+        print(f"[RECOGNIZE] Shedding request, retry after {e.retry_after:.2f}s")
+        response = jsonify({
+            'error': 'Recognition busy, retry later',
+            'retry_after': round(e.retry_after, 2),
+            'capture': capture_hints(recognize_gate, e.retry_after)
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = retry_after_header(e.retry_after)
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Recognition history: buffered, written in batches off the request path, rolled up per person and day
+recognition_log = RecognitionLog(storage.history, raw_days=HISTORY_RAW_DAYS, rollup_days=HISTORY_ROLLUP_DAYS)
+
+def record_recognition(tenant, matched, person_id=None, similarity=None, **details):
+    span = tracer.current()
+    recognition_log.record(new_event(tenant.tenant_id, matched, person_id, similarity,
+                                     trace_id=span.trace_id if span else None, **details))
+
+def run_recognition(tenant, image_bytes, profile=DEFAULT_AUDIO_PROFILE, face_box=None):
+    """Search the tenant's collection and build the announcement for the best match"""
+    # Search for face in the tenant's collection, behind the admission gate
+    with tracer.span('recognize.search', bytes=len(image_bytes)) as span:
+        with recognize_gate.admit():
+            matches = faces_live.search(tenant, image_bytes, threshold=FACE_MATCH_THRESHOLD)
+        span.set(matches=len(matches))
+    
+    print(f"Face search: {len(matches)} matches found")
+    
+    if matches:
+        match = matches[0]
+        person_id = match['person_id']
+        confidence = match['similarity']
+        print(f"Match found: person_id={person_id}, confidence={confidence}%")
         
-        print(f"Rekognition response: {len(response.get('FaceMatches', []))} matches found")
+        # Get person info from DynamoDB
+        with tracer.span('recognize.person', person_id=person_id):
+            person_info = get_person(person_id, tenant) or {}
+        print(f"Person info: {person_info.get('name', 'Unknown')}")
         
-        if response['FaceMatches']:
-            match = response['FaceMatches'][0]
-            person_id = match['Face']['ExternalImageId']
-            confidence = match['Similarity']
-            print(f"Match found: person_id={person_id}, confidence={confidence}%")
-            
-            # Get person info from DynamoDB
-            db_response = table.get_item(Key={'person_id': person_id})
-            person_info = db_response.get('Item', {})
-            print(f"Person info: {person_info.get('name', 'Unknown')}")
-            
-            # Create structured announcement with name, role, and age
-            name = person_info.get('name', 'Unknown person')
-            relationship = person_info.get('relationship', 'Unknown role')
-            age = person_info.get('age', 'Unknown age')
-            
-            # Create announcement text
-            announcement = f"This is {name}, your {relationship}, age {age}."
-            print(f"Generated announcement: {announcement}")
-            
-            # Generate TTS audio using ElevenLabs
-            print(f"[TTS] Generating audio for person: {name}")
-            audio_base64 = generate_tts_audio(announcement)
-            print(f"[TTS] Audio generated: {bool(audio_base64)}, length: {len(audio_base64) if audio_base64 else 0}")
-            
-            result = {
+        # Create structured announcement with name, role, and age
+        name = person_info.get('name', 'Unknown person')
+        relationship = person_info.get('relationship', 'Unknown role')
+        age = person_info.get('age', 'Unknown age')
+        record_recognition(tenant, True, person_id, confidence, name=name, face_box=face_box)
+        
+        # Create announcement text
+        announcement = f"This is {name}, your {relationship}, age {age}."
+        print(f"Generated announcement: {announcement}")
+        
+        # Generate TTS audio using ElevenLabs, reusing cached phrases
+        print(f"[TTS] Generating audio for person: {name}")
+        with tracer.span('recognize.announcement', audio_profile=profile.name):
+            audio_base64 = generate_announcement_audio(tenant, person_id, name, relationship, age, profile)
+        print(f"[TTS] Audio generated: {bool(audio_base64)}, length: {len(audio_base64) if audio_base64 else 0}")
+        
+        result = {
+            'matched': True,
+            'person': {'name': name},
+            'note': announcement
+        }
+        
+        # Add audio if TTS was successful
+        if audio_base64:
+            result['audio'] = audio_base64
+            result['audio_profile'] = profile.name
+            result['audio_format'] = profile.content_type
+        
+        print(f"Returning result with audio: {bool(audio_base64)}")
+        
+        # Push to the tenant's paired devices, with the audio as a link rather than inline. Published
+        # even with nobody listening, so a device that is reconnecting replays it from the buffer
+        if device_tokens:
+            event = {
                 'matched': True,
-                'person': {'name': name},
-                'note': announcement
+                'person_id': person_id,
+                'name': name,
+                'note': announcement,
+                'similarity': round(confidence, 1)
             }
-            
-            # Add audio if TTS was successful
+            if face_box:
+                event['face_box'] = face_box
+            if tracer.current():
+                event['trace_id'] = tracer.current().trace_id
             if audio_base64:
-                result['audio'] = audio_base64
-            
-            print(f"Returning result with audio: {bool(audio_base64)}")
-            return jsonify(result)
-        else:
-            print("No matches found")
-            return jsonify({
-                'matched': False,
-                'note': 'Person not recognized'
-            })
-            
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+                event['audio_url'] = store_announcement_audio(tenant, person_id, announcement, audio_base64, profile)
+            event_bus.publish(tenant.tenant_id, 'recognition', event)
+        return result
+    else:
+        print("No matches found")
+        record_recognition(tenant, False, face_box=face_box)
+        return {
+            'matched': False,
+            'note': 'Person not recognized'
+        }
+
+# Audio keys already written this process, oldest first
+stored_audio_keys = {}
+
+def announcement_audio_key(tenant, folder, text, profile):
+    return f"{tenant.s3_prefix}{folder}/audio/{hashlib.sha256(text.encode()).hexdigest()[:16]}-{profile.name}.mp3"
+
+def store_audio(audio_key, audio_base64, profile):
+    """Write TTS audio unless this process already stored the same key"""
+    if audio_key not in stored_audio_keys:
+        objects.put(audio_key, base64.b64decode(audio_base64), profile.content_type)
+        stored_audio_keys[audio_key] = True
+        if len(stored_audio_keys) > 1000:
+            stored_audio_keys.pop(next(iter(stored_audio_keys)))
+
+def store_announcement_audio(tenant, person_id, text, audio_base64, profile):
+    """Keep announcement audio in the person's folder so push events can link to it"""
+    audio_key = announcement_audio_key(tenant, person_id, text, profile)
+    store_audio(audio_key, audio_base64, profile)
+    return objects.url(audio_key)
 
 def generate_bedrock_note(person_info):
     """Generate human-like note using Amazon Bedrock"""
@@ -154,8 +582,16 @@ def generate_bedrock_note(person_info):
     except Exception as e:
         return f"This is {name}, your {relationship}. They care about you very much."
 
-def generate_tts_audio(text):
-    """Generate TTS audio using ElevenLabs and return as base64"""
+# Model and voice settings for every synthesis, so cached phrase segments sound alike when stitched
+TTS_MODEL_ID = "eleven_monolingual_v1"
+TTS_VOICE_SETTINGS = {
+    "stability": 0.7,
+    "similarity_boost": 0.5,
+    "speed": 0.8
+}
+
+def synthesize_speech(text, profile=DEFAULT_AUDIO_PROFILE):
+    """Generate TTS audio using ElevenLabs in an audio profile's format and return the bytes"""
     try:
         if not ELEVENLABS_API_KEY or not ELEVENLABS_VOICE_ID:
             print("ElevenLabs API key or Voice ID not configured")
@@ -164,31 +600,29 @@ def generate_tts_audio(text):
         url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
         
         headers = {
-            "Accept": "audio/mpeg",
+            "Accept": profile.content_type,
             "Content-Type": "application/json",
             "xi-api-key": ELEVENLABS_API_KEY
         }
         
         data = {
             "text": text,
-            "model_id": "eleven_monolingual_v1",
-            "voice_settings": {
-                "stability": 0.7,
-                "similarity_boost": 0.5,
-                "speed": 0.8
-            }
+            "model_id": TTS_MODEL_ID,
+            "voice_settings": TTS_VOICE_SETTINGS
         }
         
         print(f"[TTS] Generating audio for: {text[:50]}...")
         print(f"[TTS] Using API key: {ELEVENLABS_API_KEY[:10]}...")
         print(f"[TTS] Using voice ID: {ELEVENLABS_VOICE_ID}")
         
-        response = requests.post(url, json=data, headers=headers, timeout=30)
+        with tracer.span('elevenlabs.tts', KIND_CLIENT, characters=len(text), output_format=profile.output_format) as span:
+            response = requests.post(url, params={'output_format': profile.output_format}, json=data,
+                                     headers=tracer.inject(headers), timeout=30)
+            span.set(status=response.status_code)
         
         if response.status_code == 200:
-            audio_base64 = base64.b64encode(response.content).decode('utf-8')
             print(f"[TTS] Audio generated successfully, size: {len(response.content)} bytes")
-            return audio_base64
+            return response.content
         else:
             print(f"[TTS] API error: {response.status_code}, response: {response.text}")
             return None
@@ -197,6 +631,91 @@ def generate_tts_audio(text):
         print(f"[TTS] Error: {str(e)}")
         return None
 
+# Size and latency of the audio served, per profile
+audio_stats = AudioProfileStats()
+
+def generate_tts_audio(text, profile=DEFAULT_AUDIO_PROFILE):
+    """Generate TTS audio using ElevenLabs and return as base64"""
+    started = time.monotonic()
+    audio = synthesize_speech(text, profile)
+    if not audio:
+        return None
+    audio_stats.record(profile, len(audio), time.monotonic() - started)
+    return base64.b64encode(audio).decode('utf-8')
+
+# Announcement phrases synthesized once and stitched, so a new name costs one short TTS call
+phrase_audio = PhraseAudioCache(synthesize_speech, objects, {
+    'voice_id': ELEVENLABS_VOICE_ID,
+    'model_id': TTS_MODEL_ID,
+    'voice_settings': TTS_VOICE_SETTINGS
+}) if TTS_PHRASE_STITCHING else None
+
+def generate_announcement_audio(tenant, person_id, name, relationship, age, profile=DEFAULT_AUDIO_PROFILE):
+    """Base64 audio of "This is {name}, your {relationship}, age {age}.", stitched from cached phrases when possible"""
+    if phrase_audio and ELEVENLABS_API_KEY and ELEVENLABS_VOICE_ID:
+        started = time.monotonic()
+        phrases = announcement_segments(name, relationship, age, tenant.s3_prefix, f"{tenant.s3_prefix}{person_id}/")
+        audio = phrase_audio.stitch(phrases, profile)
+        if audio:
+            audio_stats.record(profile, len(audio), time.monotonic() - started)
+            return base64.b64encode(audio).decode('utf-8')
+    return generate_tts_audio(f"This is {name}, your {relationship}, age {age}.", profile)
+
+def render_reminder_audio(reminder):
+    """Pre-render a reminder's speech into the tenant's reminder folder; returns the audio key"""
+    tenant = tenant_router.get(reminder['tenant_id'])
+    audio_key = announcement_audio_key(tenant, REMINDER_AUDIO_FOLDER, reminder['text'], DEFAULT_AUDIO_PROFILE)
+    if audio_key in stored_audio_keys:
+        return audio_key
+    audio_base64 = generate_tts_audio(reminder['text'], DEFAULT_AUDIO_PROFILE)
+    if not audio_base64:
+        return None
+    store_audio(audio_key, audio_base64, DEFAULT_AUDIO_PROFILE)
+    return audio_key
+
+def deliver_reminder(reminder, audio_key, late):
+    """Push a due reminder to the tenant's devices; buffered for devices that reconnect later"""
+    event = {
+        'reminder_id': reminder['reminder_id'],
+        'text': reminder['text'],
+        'person_id': reminder.get('person_id'),
+        'fire_at': reminder['fire_at'],
+        'timezone': reminder['timezone'],
+        'late': late
+    }
+    if audio_key:
+        event['audio_url'] = objects.url(audio_key)
+    print(f"[REMINDERS] Delivering {reminder['reminder_id']} to tenant {reminder['tenant_id']}{' (late)' if late else ''}")
+    event_bus.publish(reminder['tenant_id'], 'reminder', event)
+
+def claim_single_process(path):
+    """Lock held for the life of the process; raises if another API process already holds it
+
+    The reminder heap, the event stream's subscribers and buffers, and job status all live in
+    this process's memory. A second worker would fire every reminder again, miss the reminders
+    added through the first, and push events only to its own subscribers.
+    """
+    if fcntl is None:
+        return None
+    lock_file = open(path, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        raise RuntimeError(f"Another API process holds {path}; run a single worker process "
+                           f"(e.g. gunicorn -w 1 --threads 16), or set SERVER_LOCK_PATH for a separate deployment")
+    return lock_file
+
+# Timed reminders ("take pills at 9"), pre-rendered to audio and pushed when due
+reminder_scheduler = ReminderScheduler(storage.reminders, render_reminder_audio, deliver_reminder)
+# With the debug reloader the script also runs in a watcher process that never serves; only the
+# serving process may fire reminders
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    server_lock = claim_single_process(SERVER_LOCK_PATH)
+    reminder_scheduler.start()
+    recognition_log.start()
+    atexit.register(recognition_log.flush)
+
 @app.route('/add_person', methods=['POST'])
 def add_person():
     print(f"[ADD_PERSON] Request received from {request.remote_addr}")
@@ -215,103 +734,86 @@ def add_person():
         # Decode and convert image
         try:
             if ',' in image_data:
-                image_bytes = base64.b64decode(image_data.split(',')[1])
+                raw_bytes = base64.b64decode(image_data.split(',')[1])
             else:
-                image_bytes = base64.b64decode(image_data)
+                raw_bytes = base64.b64decode(image_data)
             
-            # Convert to JPEG for Rekognition
-            image = Image.open(io.BytesIO(image_bytes))
-            if image.mode in ('RGBA', 'P'):
-                image = image.convert('RGB')
-            
-            buffer = io.BytesIO()
-            image.save(buffer, format='JPEG')
-            image_bytes = buffer.getvalue()
+            # Convert to JPEG for Rekognition, with the hash and thumbnail stored alongside
+            rendition = image_pool.render(raw_bytes, wait=IMAGE_POOL_MAX_WAIT, thumbnail_size=THUMBNAIL_SIZE)
+            image_bytes = rendition['jpeg']
+        except ImagePoolBusy as e:
+            return image_busy_response(e)
         except Exception as e:
             return jsonify({'error': f'Image conversion failed: {str(e)}'}), 400
         
         # Check if person already exists
         try:
-            search_response = rekognition.search_faces_by_image(
-                CollectionId=COLLECTION_ID,
-                Image={'Bytes': image_bytes},
-                MaxFaces=1,
-                FaceMatchThreshold=70
-            )
+            matches = faces_enrollment.search(g.tenant, image_bytes, threshold=FACE_MATCH_THRESHOLD)
+        except NoFaceError:
+            matches = []  # Nothing to search with; indexing below reports the missing face
+        
+        if matches:
+            # Person exists - update their info
+            existing_person_id = matches[0]['person_id']
             
-            if search_response['FaceMatches']:
-                # Person exists - update their info
-                existing_person_id = search_response['FaceMatches'][0]['Face']['ExternalImageId']
-                
-                # Update DynamoDB with new info
-                table.update_item(
-                    Key={'person_id': existing_person_id},
-                    UpdateExpression='SET #n = :name, relationship = :rel, age = :age, notes = :notes, updated_at = :updated',
-                    ExpressionAttributeNames={'#n': 'name'},
-                    ExpressionAttributeValues={
-                        ':name': name,
-                        ':rel': relationship,
-                        ':age': age,
-                        ':notes': notes,
-                        ':updated': datetime.utcnow().isoformat()
-                    }
-                )
-                
-                # Add new image to existing person's S3 folder
-                new_face_id = str(uuid.uuid4())
-                s3_key = f"{existing_person_id}/{new_face_id}.jpg"
-                s3.put_object(
-                    Bucket=BUCKET_NAME,
-                    Key=s3_key,
-                    Body=image_bytes,
-                    ContentType='image/jpeg'
-                )
-                
-                return jsonify({
-                    'success': True,
-                    'person_id': existing_person_id,
-                    'updated': True,
-                    'message': 'Person info updated with new photo'
-                })
-        except:
-            pass  # Person doesn't exist, create new
+            # Update DynamoDB with new info
+            roster.update_person(g.tenant, existing_person_id, {
+                'name': name,
+                'relationship': relationship,
+                'age': age,
+                'notes': notes,
+                'updated_at': datetime.utcnow().isoformat()
+            })
+            
+            # Add new image to existing person's folder, unless it's a photo they already have
+            person_info = get_person(existing_person_id, g.tenant) or {'person_id': existing_person_id}
+            _, _, duplicate = save_person_photo(g.tenant, person_info, raw_bytes, rendition=rendition)
+            
+            return jsonify({
+                'success': True,
+                'person_id': existing_person_id,
+                'updated': True,
+                'duplicate': duplicate,
+                'message': 'Person info updated' if duplicate else 'Person info updated with new photo'
+            })
         
         # Create new person
         person_id = str(uuid.uuid4())
         
-        # Add face to Rekognition collection
-        response = rekognition.index_faces(
-            CollectionId=COLLECTION_ID,
-            Image={'Bytes': image_bytes},
-            ExternalImageId=person_id,
-            MaxFaces=1
-        )
+        # Add face to the tenant's face index
+        face_id = faces_enrollment.index(g.tenant, person_id, image_bytes=image_bytes)
         
-        if response['FaceRecords']:
-            face_id = response['FaceRecords'][0]['Face']['FaceId']
-            
-            # Store image in S3
-            s3_key = f"{person_id}/{face_id}.jpg"
-            s3.put_object(
-                Bucket=BUCKET_NAME,
-                Key=s3_key,
-                Body=image_bytes,
-                ContentType='image/jpeg'
-            )
-            
-            # Store person info in DynamoDB
-            table.put_item(
-                Item={
+        if face_id:
+            s3_key = media_key(g.tenant, person_id, face_id)
+            stored_keys = [s3_key, thumbnail_key(g.tenant, person_id, face_id)]
+            try:
+                # Store image in the object store
+                objects.put(s3_key, image_bytes, 'image/jpeg')
+                objects.put(stored_keys[1], rendition['thumb'], 'image/jpeg')
+                
+                # Store person info in DynamoDB
+                roster.put_person(g.tenant, {
                     'person_id': person_id,
+                    'tenant_id': g.tenant.tenant_id,
                     'name': name,
                     'relationship': relationship,
                     'age': age,
                     'notes': notes,
                     'face_id': face_id,
                     's3_key': s3_key,
+                    **media_dedup.initial_hashes(content_digest(raw_bytes), face_id, rendition['phash']),
                     'created_at': datetime.utcnow().isoformat()
-                }
-            )
+                })
+            except Exception as e:
+                # A face left indexed without its record would match this person's next enrollment
+                # to a person_id that doesn't exist, and the update there can never succeed
+                print(f"Add person error: {str(e)}")
+                try:
+                    faces_enrollment.delete(g.tenant, [face_id])
+                    objects.delete_many(stored_keys)
+                except Exception as cleanup_error:
+                    print(f"[ADD_PERSON] Cleanup of {person_id} failed, cleanup.py reconcile --apply will remove it: {cleanup_error}")
+                return jsonify({'error': str(e)}), 500
             
             return jsonify({
                 'success': True,
@@ -322,42 +824,209 @@ def add_person():
         else:
             return jsonify({'error': 'No face detected'}), 400
             
+    except RateLimited as e:
+        return image_busy_response(e)
     except Exception as e:
         print(f"Add person error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/bulk_import', methods=['POST'])
+def bulk_import():
+    """Enroll many people at once from a JSON batch or a zip upload"""
+    print(f"[BULK_IMPORT] Request received from {request.remote_addr}")
+    try:
+        if 'file' in request.files:
+            try:
+                people = parse_zip_archive(request.files['file'])
+            except Exception as e:
+                return jsonify({'error': f'Invalid zip archive: {str(e)}'}), 400
+        else:
+            data = request.get_json(silent=True) or {}
+            people = data.get('people')
+        
+        if not people or not isinstance(people, list):
+            return jsonify({'error': 'At least one person is required'}), 400
+        
+        job = bulk_importer.submit(people, g.tenant)
+        print(f"[BULK_IMPORT] Started job {job.job_id} with {len(people)} people")
+        
+        return jsonify({
+            'success': True,
+            'job_id': job.job_id,
+            'total': job.total,
+            'status_url': f"/jobs/{job.job_id}"
+        }), 202
+        
+    except Exception as e:
+        print(f"Bulk import error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get progress and per-item errors for a background job"""
+    job = jobs.get(job_id)
+    if not job or job.details.get('tenant_id', g.tenant.tenant_id) != g.tenant.tenant_id:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+def format_reminder(person):
+    """Roster entry for a person record, with a presigned image URL"""
+    image_url = None
+    if person.get('s3_key'):
+        try:
+            image_url = objects.url(person.get('s3_key'), expires_in=3600)  # 1 hour
+        except Exception as e:
+            print(f"Error generating presigned URL: {e}")
+    
+    return {
+        'person_id': person.get('person_id'),
+        'name': person.get('name'),
+        'relationship': person.get('relationship'),
+        'age': person.get('age'),
+        'notes': person.get('notes'),
+        'added_date': person.get('created_at'),
+        'image_url': image_url
+    }
+
 @app.route('/reminders', methods=['GET'])
 def get_reminders():
-    """Get all people as reminders"""
+    """Get all people as reminders, or only the changes since ?since=<version>"""
     try:
-        response = table.scan()
-        people = response.get('Items', [])
-        
-        reminders = []
-        for person in people:
-            # Generate presigned URL for the image
-            image_url = None
-            if person.get('s3_key'):
-                try:
-                    image_url = s3.generate_presigned_url(
-                        'get_object',
-                        Params={'Bucket': BUCKET_NAME, 'Key': person.get('s3_key')},
-                        ExpiresIn=3600  # 1 hour
-                    )
-                except Exception as e:
-                    print(f"Error generating presigned URL: {e}")
+        meta = roster.read(g.tenant)
+        etag = representation_etag(roster.etag(g.tenant, meta['version']), request)
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+        
+        since = request.args.get('since', type=int)
+        delta = roster.changes_since(meta, since) if since is not None else None
+        
+        if delta is not None:
+            changed_ids, deleted_ids = delta
+            people = roster.get_people(changed_ids)
+            changed = sorted(people.values(), key=lambda person: person.get('created_at', ''))
+            payload = {
+                'version': meta['version'],
+                'since': since,
+                'full': False,
+                'changed': [format_reminder(person) for person in changed],
+                'deleted': deleted_ids
+            }
+        else:
+            people = {person['person_id']: person for person in query_roster(g.tenant)}
             
-            reminders.append({
-                'person_id': person.get('person_id'),
-                'name': person.get('name'),
-                'relationship': person.get('relationship'),
-                'age': person.get('age'),
-                'notes': person.get('notes'),
-                'added_date': person.get('created_at'),
-                'image_url': image_url
-            })
+            # The owner index is eventually consistent; re-read the latest changes directly
+            recent_ids = roster.recent_person_ids(meta)
+            recent = roster.get_people(recent_ids)
+            for person_id in recent_ids:
+                if person_id in recent:
+                    people[person_id] = recent[person_id]
+                else:
+                    people.pop(person_id, None)
+            
+            ordered = sorted(people.values(), key=lambda person: person.get('created_at', ''))
+            payload = {
+                'version': meta['version'],
+                'full': True,
+                'reminders': [format_reminder(person) for person in ordered]
+            }
+        
+        response = jsonify(payload)
+        response.set_etag(etag)
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/timed_reminders', methods=['GET'])
+def list_timed_reminders():
+    """Pending scheduled reminders for the tenant, soonest first"""
+    return jsonify({'reminders': reminder_scheduler.list(g.tenant.tenant_id)})
+
+@app.route('/timed_reminders', methods=['POST'])
+def add_timed_reminder():
+    """Schedule a one-off or repeating reminder"""
+    try:
+        data = request.get_json() or {}
+        person_id = data.get('person_id')
+        if person_id and not get_person(person_id, g.tenant):
+            return jsonify({'error': 'Person not found'}), 404
+        
+        try:
+            reminder = new_reminder(
+                g.tenant.tenant_id,
+                data.get('text'),
+                data.get('fire_at'),
+                tz=data.get('timezone') or REMINDER_DEFAULT_TIMEZONE,
+                repeat=data.get('repeat'),
+                person_id=person_id
+            )
+            reminder = reminder_scheduler.add(reminder)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        return jsonify({'reminders': reminders})
+        return jsonify({'success': True, 'reminder': reminder}), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/timed_reminders/<reminder_id>', methods=['DELETE'])
+def cancel_timed_reminder(reminder_id):
+    """Cancel a scheduled reminder, including all future repeats"""
+    try:
+        if not reminder_scheduler.cancel(g.tenant.tenant_id, reminder_id):
+            return jsonify({'error': 'Reminder not found'}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def history_range():
+    """(start, end) in epoch ms from ?start=&end= (ISO 8601 or epoch seconds); the last 7 days by default"""
+    end = parse_time(request.args.get('end'), now_ms())
+    start = parse_time(request.args.get('start'), end - 7 * 86400 * 1000)
+    if start >= end:
+        raise ValueError('start must be before end')
+    return start, end
+
+@app.route('/history', methods=['GET'])
+def get_history():
+    """Recognition events in a time range, newest first; ?person_id= narrows to one person"""
+    try:
+        start, end = history_range()
+        limit = min(int(request.args.get('limit', 100)), 1000)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        events = recognition_log.events(g.tenant.tenant_id, start, end, person_id=request.args.get('person_id'), limit=limit)
+        # Page backwards by passing the oldest event's time as the next ?end=
+        next_end = events[-1]['ts'] / 1000 if len(events) == limit else None
+        return jsonify({'events': events, 'next_end': next_end})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/history/visits', methods=['GET'])
+def get_visits():
+    """Who visited when: each person's recognitions collapsed into visits, newest first"""
+    try:
+        start, end = history_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        visits, truncated = recognition_log.visits(g.tenant.tenant_id, start, end, person_id=request.args.get('person_id'))
+        return jsonify({'visits': visits, 'truncated': truncated})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/history/stats', methods=['GET'])
+def get_history_stats():
+    """Per-person recognition counts and match similarity distribution, for tuning FACE_MATCH_THRESHOLD"""
+    try:
+        start, end = history_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        people = recognition_log.confidence_stats(g.tenant.tenant_id, start, end, person_id=request.args.get('person_id'),
+                                                  threshold=FACE_MATCH_THRESHOLD)
+        return jsonify({'threshold': FACE_MATCH_THRESHOLD, 'people': people})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -366,8 +1035,7 @@ def get_person_details(person_id):
     """Get detailed information for a specific person"""
     try:
         # Get person info from DynamoDB
-        db_response = table.get_item(Key={'person_id': person_id})
-        person_info = db_response.get('Item')
+        person_info = get_person(person_id, g.tenant)
         
         if not person_info:
             return jsonify({'error': 'Person not found'}), 404
@@ -376,11 +1044,7 @@ def get_person_details(person_id):
         image_url = None
         if person_info.get('s3_key'):
             try:
-                image_url = s3.generate_presigned_url(
-                    'get_object',
-                    Params={'Bucket': BUCKET_NAME, 'Key': person_info.get('s3_key')},
-                    ExpiresIn=3600
-                )
+                image_url = objects.url(person_info.get('s3_key'))
             except Exception as e:
                 print(f"Error generating presigned URL: {e}")
         
@@ -411,22 +1075,22 @@ def edit_person(person_id):
         if not name or not relationship:
             return jsonify({'error': 'Name and relationship required'}), 400
         
+        person_info = get_person(person_id, g.tenant)
+        if not person_info:
+            return jsonify({'error': 'Person not found'}), 404
+        
         # Update DynamoDB
-        table.update_item(
-            Key={'person_id': person_id},
-            UpdateExpression='SET #n = :name, relationship = :rel, age = :age, notes = :notes, updated_at = :updated',
-            ExpressionAttributeNames={'#n': 'name'},
-            ExpressionAttributeValues={
-                ':name': name,
-                ':rel': relationship,
-                ':age': age,
-                ':notes': notes,
-                ':updated': datetime.utcnow().isoformat()
-            }
-        )
+        roster.update_person(g.tenant, person_id, {
+            'name': name,
+            'relationship': relationship,
+            'age': age,
+            'notes': notes,
+            'updated_at': datetime.utcnow().isoformat()
+        })
         
         # Handle gallery images if provided
         uploaded_media = []
+        duplicates = 0
         if images:
             for image_data in images:
                 try:
@@ -436,28 +1100,15 @@ def edit_person(person_id):
                     else:
                         image_bytes = base64.b64decode(image_data)
                     
-                    # Convert to JPEG
-                    image = Image.open(io.BytesIO(image_bytes))
-                    if image.mode in ('RGBA', 'P'):
-                        image = image.convert('RGB')
-                    
-                    buffer = io.BytesIO()
-                    image.save(buffer, format='JPEG')
-                    image_bytes = buffer.getvalue()
-                    
-                    # Generate unique filename
-                    media_id = str(uuid.uuid4())
-                    s3_key = f"{person_id}/{media_id}.jpg"
-                    
-                    # Upload to S3
-                    s3.put_object(
-                        Bucket=BUCKET_NAME,
-                        Key=s3_key,
-                        Body=image_bytes,
-                        ContentType='image/jpeg'
-                    )
-                    
-                    uploaded_media.append(media_id)
+                    # Convert to JPEG and upload, skipping photos the person already has
+                    media_id, _, duplicate = save_person_photo(g.tenant, person_info, image_bytes)
+                    if duplicate:
+                        duplicates += 1
+                    else:
+                        uploaded_media.append(media_id)
+                except ImagePoolBusy as e:
+                    # Photos saved so far are kept; the retry skips them as duplicates
+                    return image_busy_response(e)
                 except Exception as e:
                     print(f"Error uploading image: {e}")
                     continue
@@ -469,6 +1120,8 @@ def edit_person(person_id):
         
         if uploaded_media:
             response['images_uploaded'] = len(uploaded_media)
+        if duplicates:
+            response['duplicates_skipped'] = duplicates
         
         return jsonify(response)
         
@@ -479,30 +1132,38 @@ def edit_person(person_id):
 def get_person_media(person_id):
     """Get all media/images for a specific person"""
     try:
-        # List all objects in the person's S3 folder
-        response = s3.list_objects_v2(
-            Bucket=BUCKET_NAME,
-            Prefix=f"{person_id}/"
-        )
-        
+        # List all objects in the person's folder
         media = []
-        for obj in response.get('Contents', []):
-            # Generate presigned URL for each image
-            image_url = s3.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': BUCKET_NAME, 'Key': obj['Key']},
-                ExpiresIn=3600
-            )
-            
-            # Extract filename for ID
-            filename = obj['Key'].split('/')[-1].split('.')[0]
-            
-            media.append({
-                'id': filename,
-                'type': 'image',
-                'uri': image_url,
-                'thumb': image_url  # Same URL for thumb
-            })
+        thumbs = set()
+        prefix = f"{g.tenant.s3_prefix}{person_id}/"
+        for keys in objects.list_pages(prefix):
+            for key in keys:
+                # Only photos directly in the folder; audio, thumbnails etc. live in subfolders
+                if key.startswith(f"{prefix}thumbs/"):
+                    thumbs.add(key)
+                if '/' in key[len(prefix):]:
+                    continue
+                
+                # Generate presigned URL for each image
+                image_url = objects.url(key)
+                
+                # Extract filename for ID
+                filename = key.split('/')[-1].split('.')[0]
+                
+                # Presigned URLs serve Range requests, so videos can be streamed and seeked
+                kind = media_type(key)
+                media.append({
+                    'id': filename,
+                    'type': kind,
+                    'uri': image_url,
+                    'thumb': image_url if kind == 'image' else None
+                })
+        
+        # Gallery photos have a thumbnail and videos a poster; photos saved before thumbnails fall back to the full image
+        for item in media:
+            thumb = thumbnail_key(g.tenant, person_id, item['id'])
+            if thumb in thumbs:
+                item['thumb'] = objects.url(thumb)
         
         return jsonify({'media': media})
         
@@ -519,61 +1180,200 @@ def add_person_media(person_id):
         if not image_data:
             return jsonify({'error': 'No image provided'}), 400
         
+        person_info = get_person(person_id, g.tenant)
+        if not person_info:
+            return jsonify({'error': 'Person not found'}), 404
+        
         # Decode image
         if ',' in image_data:
             image_bytes = base64.b64decode(image_data.split(',')[1])
         else:
             image_bytes = base64.b64decode(image_data)
         
-        # Convert to JPEG
-        image = Image.open(io.BytesIO(image_bytes))
-        if image.mode in ('RGBA', 'P'):
-            image = image.convert('RGB')
-        
-        buffer = io.BytesIO()
-        image.save(buffer, format='JPEG')
-        image_bytes = buffer.getvalue()
-        
-        # Generate unique filename
-        media_id = str(uuid.uuid4())
-        s3_key = f"{person_id}/{media_id}.jpg"
-        
-        # Upload to S3
-        s3.put_object(
-            Bucket=BUCKET_NAME,
-            Key=s3_key,
-            Body=image_bytes,
-            ContentType='image/jpeg'
-        )
+        # Convert to JPEG and upload, or reuse the media if the person already has this photo
+        try:
+            media_id, s3_key, duplicate = save_person_photo(g.tenant, person_info, image_bytes)
+        except ImagePoolBusy as e:
+            return image_busy_response(e)
         
         # Generate presigned URL for response
-        image_url = s3.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': BUCKET_NAME, 'Key': s3_key},
-            ExpiresIn=3600
-        )
+        image_url = objects.url(s3_key)
         
         return jsonify({
             'success': True,
+            'duplicate': duplicate,
             'media': {
                 'id': media_id,
                 'type': 'image',
                 'uri': image_url,
-                'thumb': image_url
+                'thumb': objects.url(thumbnail_key(g.tenant, person_id, media_id)) if not duplicate else image_url
             }
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/person/<person_id>/uploads', methods=['POST'])
+def open_uploads(person_id):
+    """Presigned targets for uploading gallery photos straight to the bucket"""
+    try:
+        data = request.get_json(silent=True) or {}
+        if not get_person(person_id, g.tenant):
+            return jsonify({'error': 'Person not found'}), 404
+        try:
+            count = int(data.get('count', 1))
+            uploads = direct_uploads.open(g.tenant, person_id, count, data.get('content_type', 'image/jpeg'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'uploads': uploads,
+            'max_bytes': MAX_UPLOAD_BYTES,
+            'complete_url': f"/person/{person_id}/uploads/complete"
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/person/<person_id>/uploads/complete', methods=['POST'])
+def complete_uploads(person_id):
+    """Process photos uploaded to presigned targets: normalize, thumbnail, dedup and index them"""
+    try:
+        data = request.get_json(silent=True) or {}
+        person_info = get_person(person_id, g.tenant)
+        if not person_info:
+            return jsonify({'error': 'Person not found'}), 404
+        try:
+            job = direct_uploads.complete(g.tenant, person_info, data.get('upload_ids') or [])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'success': True,
+            'job_id': job.job_id,
+            'status': job.status,
+            'status_url': f"/jobs/{job.job_id}"
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/person/<person_id>/videos', methods=['POST'])
+def open_video_upload(person_id):
+    """Start a resumable video upload; the phone then PUTs it in chunk_bytes chunks"""
+    try:
+        data = request.get_json(silent=True) or {}
+        if not get_person(person_id, g.tenant):
+            return jsonify({'error': 'Person not found'}), 404
+        try:
+            upload = video_uploads.open(g.tenant, person_id, data.get('content_type'), int(data.get('size') or 0))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify(dict(upload, upload_url=f"/person/{person_id}/videos/{upload['name']}")), 201
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/person/<person_id>/videos/<name>/parts/<int:part_number>', methods=['PUT'])
+def put_video_part(person_id, name, part_number):
+    """Store one chunk of a video upload, streamed through without holding it in memory"""
+    try:
+        if request.content_length is None:
+            return jsonify({'error': 'Content-Length required'}), 411
+        if not get_person(person_id, g.tenant):
+            return jsonify({'error': 'Person not found'}), 404
+        try:
+            size = video_uploads.write_part(g.tenant, person_id, name, request.args.get('upload_id', ''),
+                                            part_number, request.stream, request.content_length)
+        except KeyError:
+            return jsonify({'error': 'Upload not found'}), 404
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({'part': part_number, 'bytes': size})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/person/<person_id>/videos/<name>', methods=['GET'])
+def get_video_upload(person_id, name):
+    """Parts received so far, so an interrupted upload can resume"""
+    try:
+        if not get_person(person_id, g.tenant):
+            return jsonify({'error': 'Person not found'}), 404
+        try:
+            return jsonify(video_uploads.status(g.tenant, person_id, name, request.args.get('upload_id', '')))
+        except KeyError:
+            return jsonify({'error': 'Upload not found'}), 404
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/person/<person_id>/videos/<name>/complete', methods=['POST'])
+def complete_video_upload(person_id, name):
+    """Assemble the uploaded chunks into the video and queue its poster"""
+    try:
+        if not get_person(person_id, g.tenant):
+            return jsonify({'error': 'Person not found'}), 404
+        try:
+            size, job = video_uploads.complete(g.tenant, person_id, name, request.args.get('upload_id', ''))
+        except KeyError:
+            return jsonify({'error': 'Upload not found'}), 404
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        response = {
+            'success': True,
+            'media': {
+                'id': name.rsplit('.', 1)[0],
+                'type': 'video',
+                'uri': objects.url(f"{g.tenant.s3_prefix}{person_id}/{name}"),
+                'thumb': None,
+                'size': size
+            }
+        }
+        if job:
+            response.update(job_id=job.job_id, status_url=f"/jobs/{job.job_id}")
+        return jsonify(response)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/person/<person_id>/videos/<name>', methods=['DELETE'])
+def abort_video_upload(person_id, name):
+    """Abandon an unfinished video upload and its parts"""
+    try:
+        if not get_person(person_id, g.tenant):
+            return jsonify({'error': 'Person not found'}), 404
+        try:
+            video_uploads.abort(g.tenant, person_id, name, request.args.get('upload_id', ''))
+        except KeyError:
+            return jsonify({'error': 'Upload not found'}), 404
+        
+        return jsonify({'success': True})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/person/<person_id>/media/<media_id>', methods=['DELETE'])
 def delete_person_media(person_id, media_id):
     """Delete a specific media item from person's gallery"""
     try:
-        s3_key = f"{person_id}/{media_id}.jpg"
-        
-        # Delete from S3
-        s3.delete_object(Bucket=BUCKET_NAME, Key=s3_key)
+        # Delete from the object store (a photo, or a video under its own extension), with its thumbnail
+        keys = [thumbnail_key(g.tenant, person_id, media_id)]
+        for page in objects.list_pages(f"{g.tenant.s3_prefix}{person_id}/{media_id}."):
+            keys.extend(page)
+        objects.delete_many(keys)
+        
+        # Drop the face exemplar indexed from this photo, if any, and its hashes
+        person_info = get_person(person_id, g.tenant) or {}
+        if media_id in (person_info.get('media_phashes') or {}) or media_id in (person_info.get('media_hashes') or {}).values():
+            media_dedup.release(person_id, media_id)
+        face_id = (person_info.get('exemplars') or {}).get(media_id)
+        if face_id:
+            faces_enrollment.delete(g.tenant, [face_id])
+            roster.remove_exemplar(person_id, media_id)
         
         return jsonify({'success': True, 'message': 'Media deleted successfully'})
         
@@ -582,43 +1382,24 @@ def delete_person_media(person_id, media_id):
 
 @app.route('/delete_person/<person_id>', methods=['DELETE'])
 def delete_person(person_id):
-    """Delete a person from all AWS services"""
+    """Delete a person from every store"""
     print(f"[DELETE_PERSON] Request to delete person_id: {person_id}")
     try:
         # Get person info first
-        db_response = table.get_item(Key={'person_id': person_id})
-        person_info = db_response.get('Item')
+        person_info = get_person(person_id, g.tenant)
         
         if not person_info:
             return jsonify({'error': 'Person not found'}), 404
         
-        # Delete from Rekognition (get face_id first)
-        face_id = person_info.get('face_id')
-        if face_id:
-            try:
-                rekognition.delete_faces(
-                    CollectionId=COLLECTION_ID,
-                    FaceIds=[face_id]
-                )
-            except Exception as e:
-                print(f"Error deleting from Rekognition: {e}")
-        
-        # Delete all media from S3 (entire person folder)
-        try:
-            response = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=f"{person_id}/")
-            if 'Contents' in response:
-                delete_keys = [{'Key': obj['Key']} for obj in response['Contents']]
-                s3.delete_objects(
-                    Bucket=BUCKET_NAME,
-                    Delete={'Objects': delete_keys}
-                )
-        except Exception as e:
-            print(f"Error deleting media from S3: {e}")
-        
-        # Delete from DynamoDB
-        table.delete_item(Key={'person_id': person_id})
+        # Faces, media and the record are removed by a background job
+        job = person_deleter.submit(g.tenant, person_info)
         
-        return jsonify({'success': True, 'message': 'Person deleted successfully'})
+        return jsonify({
+            'success': True,
+            'job_id': job.job_id,
+            'status': job.status,
+            'status_url': f"/jobs/{job.job_id}"
+        }), 202
         
     except Exception as e:
         print(f"Delete person error: {str(e)}")
@@ -628,6 +1409,140 @@ def delete_person(person_id):
 def health():
     return jsonify({'status': 'healthy'})
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Queue depth, wait times and throttling for AWS calls and live recognition"""
+    tenant_id = trace_caller()
+    if tenant_id is None:
+        return jsonify({'error': 'Device or profiling token required'}), 401
+    events = event_bus.stats()
+    if tenant_id != ALL_TENANTS:
+        # A device only sees its own tenant's buffer, not which other tenants exist
+        events['buffered'] = {tenant: count for tenant, count in events['buffered'].items() if tenant == tenant_id}
+    return jsonify(dict(storage.stats(), recognize={
+        'gate': recognize_gate.stats(),
+        'coalesced': recognize_flight.shared,
+        'inputs': recognize_inputs
+    }, media_dedup={
+        'duplicates': media_dedup.duplicates
+    }, events=events, reminders=reminder_scheduler.stats(), history=recognition_log.stats(),
+        images=image_pool.stats(),
+        phrase_audio=phrase_audio.stats() if phrase_audio else None, audio_profiles=audio_stats.stats(),
+        profiling=profiler.stats() if profiler else None, tracing=tracer.stats()))
+
+@app.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    """Stored request profiles, newest first"""
+    if not profiler:
+        return jsonify({'error': 'Profiling disabled; set PROFILE_SAMPLE_RATE or PROFILE_TOKEN'}), 404
+    if not profiler.authorized(token_from_request(request)):
+        return jsonify({'error': 'Invalid profiling token'}), 401
+    return jsonify({'profiles': profiler.list(), 'stats': profiler.stats()})
+
+@app.route('/admin/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    """Raw profile data: a pstats dump (cProfile) or collapsed stacks (sampler)"""
+    if not profiler:
+        return jsonify({'error': 'Profiling disabled; set PROFILE_SAMPLE_RATE or PROFILE_TOKEN'}), 404
+    if not profiler.authorized(token_from_request(request)):
+        return jsonify({'error': 'Invalid profiling token'}), 401
+    path = profiler.data_path(profile_id)
+    if not path:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path),
+                     mimetype='application/octet-stream' if path.endswith('.prof') else 'text/plain')
+
+# Trace endpoint callers holding the profiling token see and add to every tenant's traces
+ALL_TENANTS = '*'
+
+def trace_caller():
+    """Tenant a trace endpoint caller is limited to, from a device token; ALL_TENANTS or None (unauthorized)"""
+    token = token_from_request(request)
+    if profiler and profiler.authorized(token):
+        return ALL_TENANTS
+    claims = device_tokens.verify(token) if device_tokens else None
+    return claims[0] if claims else None
+
+@app.route('/v1/traces', methods=['POST'])
+def ingest_traces():
+    """OTLP/JSON collector stand-in: camera, relay and phone spans join the backend's own"""
+    tenant_id = trace_caller()
+    if tenant_id is None:
+        return jsonify({'error': 'Device or profiling token required'}), 401
+    try:
+        records = from_otlp(request.get_json(force=True, silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if len(records) > MAX_INGEST_SPANS:
+        return jsonify({'error': f'At most {MAX_INGEST_SPANS} spans per request'}), 413
+    # Device spans are tagged with the device's tenant, so only that tenant can read them back
+    if tenant_id != ALL_TENANTS:
+        for record in records:
+            record['attributes']['tenant'] = tenant_id
+    tracer.record(records, ingested=True)
+    return jsonify({'partialSuccess': {}})
+
+@app.route('/traces/<trace_id>', methods=['GET'])
+def get_trace(trace_id):
+    """A recent trace's spans from every hop, with each stage's timing"""
+    tenant_id = trace_caller()
+    if tenant_id is None:
+        return jsonify({'error': 'Device or profiling token required'}), 401
+    trace = tracer.trace(trace_id.lower(), None if tenant_id == ALL_TENANTS else tenant_id)
+    if not trace:
+        return jsonify({'error': 'Trace not found'}), 404
+    return jsonify(trace)
+
+@app.route('/events', methods=['GET'])
+def events():
+    """Server-Sent Events stream of recognitions and roster changes for a paired device"""
+    if not device_tokens:
+        return jsonify({'error': 'Push channel disabled; set DEVICE_TOKEN_SECRET'}), 503
+    claims = device_tokens.verify(token_from_request(request))
+    if not claims:
+        return jsonify({'error': 'Invalid or expired device token'}), 401
+    tenant_id, device_id = claims
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        stream = event_bus.stream(tenant_id, last_event_id)
+    except TooManySubscribers as e:
+        response = jsonify({'error': str(e)})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    
+    print(f"[EVENTS] Device {device_id} subscribed to tenant {tenant_id} (resume from {last_event_id})")
+    return Response(stream_with_context(stream), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/local-objects/<path:key>', methods=['GET'])
+def get_local_object(key):
+    """Serve media for the local backend through the signed URLs it hands out"""
+    if storage.name != 'local':
+        return jsonify({'error': 'Not found'}), 404
+    if not objects.verify(key, request.args.get('expires'), request.args.get('signature')):
+        return jsonify({'error': 'Invalid or expired link'}), 403
+    found = objects.open(key)
+    if not found:
+        return jsonify({'error': 'Not found'}), 404
+    path, content_type = found
+    return send_file(path, mimetype=content_type, max_age=3600)
+
+@app.route('/local-objects/<path:key>', methods=['PUT'])
+def put_local_object(key):
+    """Accept direct uploads for the local backend through the signed targets it hands out"""
+    if storage.name != 'local':
+        return jsonify({'error': 'Not found'}), 404
+    if not objects.verify(key, request.args.get('expires'), request.args.get('signature'), method='PUT'):
+        return jsonify({'error': 'Invalid or expired link'}), 403
+    if not request.content_length or request.content_length > MAX_UPLOAD_BYTES:
+        return jsonify({'error': f'Upload must be between 1 and {MAX_UPLOAD_BYTES} bytes'}), 413
+    objects.put(key, request.get_data(), request.mimetype or 'application/octet-stream')
+    return '', 204
+
 @app.route('/test-tts', methods=['GET'])
 def test_tts():
     """Test TTS audio generation"""
@@ -663,12 +1578,19 @@ def generate_audio():
         if not text:
             return jsonify({'error': 'Text is required'}), 400
         
-        audio_base64 = generate_tts_audio(text)
+        try:
+            profile = profile_from_request(request, DEFAULT_AUDIO_PROFILE.name)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        audio_base64 = generate_tts_audio(text, profile)
         
         if audio_base64:
             return jsonify({
                 'success': True,
                 'audio': audio_base64,
+                'audio_profile': profile.name,
+                'audio_format': profile.content_type,
                 'text': text
             })
         else:
@@ -687,8 +1609,7 @@ def debug_person(person_id):
     """Debug a specific person's data and audio generation"""
     try:
         # Get person info from DynamoDB
-        db_response = table.get_item(Key={'person_id': person_id})
-        person_info = db_response.get('Item')
+        person_info = get_person(person_id, g.tenant)
         
         if not person_info:
             return jsonify({'error': 'Person not found'}), 404
@@ -700,7 +1621,7 @@ def debug_person(person_id):
         announcement = f"This is {name}, your {relationship}, age {age}."
         
         # Generate audio
-        audio_base64 = generate_tts_audio(announcement)
+        audio_base64 = generate_announcement_audio(g.tenant, person_id, name, relationship, age)
         
         return jsonify({
             'person_info': {
@@ -0,0 +1,490 @@
+import json
+import re
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.conditions import Key
+
+from backends import ObjectStore, PersonStore, FaceIndex, ReminderStore, HistoryStore, Backend, NoFaceError
+from history import HISTORY_PERSON_INDEX, event_key, rollup_key
+from roster import RosterLog
+from reminders import REMINDER_INDEX_NAME, REMINDER_ITEM_TYPE, reminder_item_key
+from tenants import OWNER_INDEX_NAME
+from exemplars import check_face_quality
+from aws_scheduler import (AwsCallScheduler, PRIORITY_LIVE, PRIORITY_ENROLLMENT,
+                           PRIORITY_BACKGROUND)
+
+# Tag on objects uploaded straight from the phone; a bucket lifecycle rule (setup_aws.py)
+# expires the ones never completed, processed uploads are deleted right away
+UPLOAD_TAG = ('upload', 'pending')
+UPLOAD_TAGGING = f"<Tagging><TagSet><Tag><Key>{UPLOAD_TAG[0]}</Key><Value>{UPLOAD_TAG[1]}</Value></Tag></TagSet></Tagging>"
+
+
+class S3ObjectStore(ObjectStore):
+    def __init__(self, s3, bucket_name):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+
+    def put(self, key, data, content_type='application/octet-stream'):
+        self.s3.put_object(Bucket=self.bucket_name, Key=key, Body=data, ContentType=content_type)
+
+    def get(self, key):
+        try:
+            return self.s3.get_object(Bucket=self.bucket_name, Key=key)['Body'].read()
+        except self.s3.exceptions.NoSuchKey:
+            return None
+
+    def delete(self, key):
+        self.s3.delete_object(Bucket=self.bucket_name, Key=key)
+
+    def delete_many(self, keys):
+        if not keys:
+            return
+        response = self.s3.delete_objects(
+            Bucket=self.bucket_name,
+            Delete={'Objects': [{'Key': key} for key in keys]}
+        )
+        errors = response.get('Errors', [])
+        if errors:
+            raise RuntimeError(f"{len(errors)} objects not deleted, first: {errors[0].get('Key')} {errors[0].get('Message')}")
+
+    def list_pages(self, prefix='', page_size=1000):
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix,
+                                       PaginationConfig={'PageSize': page_size}):
+            keys = [obj['Key'] for obj in page.get('Contents', [])]
+            if keys:
+                yield keys
+
+    def url(self, key, expires_in=3600):
+        return self.s3.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket_name, 'Key': key},
+            ExpiresIn=expires_in
+        )
+
+    def head(self, key):
+        try:
+            response = self.s3.head_object(Bucket=self.bucket_name, Key=key)
+        except self.s3.exceptions.ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return {'size': response['ContentLength'], 'content_type': response.get('ContentType')}
+
+    def upload_target(self, key, content_type, max_bytes, expires_in=900):
+        # A POST policy, unlike a presigned PUT, lets S3 itself enforce the size limit
+        post = self.s3.generate_presigned_post(
+            Bucket=self.bucket_name,
+            Key=key,
+            Fields={'Content-Type': content_type, 'tagging': UPLOAD_TAGGING},
+            Conditions=[
+                {'Content-Type': content_type},
+                {'tagging': UPLOAD_TAGGING},
+                ['content-length-range', 1, max_bytes]
+            ],
+            ExpiresIn=expires_in
+        )
+        return {'method': 'POST', 'url': post['url'], 'fields': post['fields'], 'headers': {}}
+
+    def start_multipart(self, key, content_type='application/octet-stream'):
+        return self.s3.create_multipart_upload(Bucket=self.bucket_name, Key=key, ContentType=content_type)['UploadId']
+
+    def upload_part(self, key, upload_id, part_number, fileobj, size):
+        self.s3.upload_part(Bucket=self.bucket_name, Key=key, UploadId=upload_id, PartNumber=part_number,
+                            Body=fileobj, ContentLength=size)
+
+    def _parts(self, key, upload_id):
+        parts = []
+        kwargs = {'Bucket': self.bucket_name, 'Key': key, 'UploadId': upload_id}
+        while True:
+            try:
+                response = self.s3.list_parts(**kwargs)
+            except self.s3.exceptions.NoSuchUpload:
+                raise KeyError(upload_id)
+            parts.extend(response.get('Parts', []))
+            if not response.get('IsTruncated'):
+                return parts
+            kwargs['PartNumberMarker'] = response['NextPartNumberMarker']
+
+    def list_parts(self, key, upload_id):
+        return {part['PartNumber']: part['Size'] for part in self._parts(key, upload_id)}
+
+    def complete_multipart(self, key, upload_id):
+        parts = self._parts(key, upload_id)
+        self.s3.complete_multipart_upload(
+            Bucket=self.bucket_name, Key=key, UploadId=upload_id,
+            MultipartUpload={'Parts': [{'PartNumber': part['PartNumber'], 'ETag': part['ETag']} for part in parts]}
+        )
+        return sum(part['Size'] for part in parts)
+
+    def abort_multipart(self, key, upload_id):
+        try:
+            self.s3.abort_multipart_upload(Bucket=self.bucket_name, Key=key, UploadId=upload_id)
+        except self.s3.exceptions.NoSuchUpload:
+            pass
+
+
+class DynamoPersonStore(RosterLog, PersonStore):
+    """Person items in DynamoDB; roster writes go through RosterLog transactions"""
+
+    def get(self, person_id):
+        return self.table.get_item(Key={'person_id': person_id}).get('Item')
+
+    def query(self, tenant):
+        people = []
+        query_kwargs = {
+            'IndexName': OWNER_INDEX_NAME,
+            'KeyConditionExpression': Key('tenant_id').eq(tenant.tenant_id)
+        }
+        while True:
+            response = self.table.query(**query_kwargs)
+            people.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return people
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def add_exemplar(self, person_id, media_id, face_id, cap):
+        try:
+            self.table.update_item(
+                Key={'person_id': person_id},
+                UpdateExpression='SET exemplars = if_not_exists(exemplars, :empty)',
+                ConditionExpression='attribute_exists(person_id)',
+                ExpressionAttributeValues={':empty': {}}
+            )
+            self.table.update_item(
+                Key={'person_id': person_id},
+                UpdateExpression='SET exemplars.#m = :face_id',
+                ConditionExpression='size(exemplars) < :cap',
+                ExpressionAttributeNames={'#m': media_id},
+                ExpressionAttributeValues={':face_id': face_id, ':cap': cap}
+            )
+            return True
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+    def remove_exemplar(self, person_id, media_id):
+        self.table.update_item(
+            Key={'person_id': person_id},
+            UpdateExpression='REMOVE exemplars.#m',
+            ExpressionAttributeNames={'#m': media_id}
+        )
+
+    def claim_media(self, person_id, digest, media_id, phash=None):
+        try:
+            self.table.update_item(
+                Key={'person_id': person_id},
+                UpdateExpression='SET media_hashes = if_not_exists(media_hashes, :empty), '
+                                 'media_phashes = if_not_exists(media_phashes, :empty)',
+                ConditionExpression='attribute_exists(person_id)',
+                ExpressionAttributeValues={':empty': {}}
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            raise LookupError(f"Person {person_id} not found")
+
+        names = {'#h': digest}
+        values = {':m': media_id}
+        update = 'SET media_hashes.#h = :m'
+        if phash:
+            names['#m'] = media_id
+            values[':p'] = phash
+            update += ', media_phashes.#m = :p'
+        try:
+            self.table.update_item(
+                Key={'person_id': person_id},
+                UpdateExpression=update,
+                ConditionExpression='attribute_not_exists(media_hashes.#h)',
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values
+            )
+            return None
+        except self.client.exceptions.ConditionalCheckFailedException:
+            item = self.table.get_item(
+                Key={'person_id': person_id},
+                ConsistentRead=True,
+                ProjectionExpression='media_hashes.#h',
+                ExpressionAttributeNames={'#h': digest}
+            ).get('Item') or {}
+            return (item.get('media_hashes') or {}).get(digest)
+
+    def release_media(self, person_id, media_id):
+        item = self.table.get_item(
+            Key={'person_id': person_id},
+            ProjectionExpression='media_hashes'
+        ).get('Item') or {}
+        digests = [digest for digest, mapped in (item.get('media_hashes') or {}).items() if mapped == media_id]
+        names = {'#m': media_id}
+        removals = ['media_phashes.#m']
+        for i, digest in enumerate(digests):
+            names[f'#h{i}'] = digest
+            removals.append(f'media_hashes.#h{i}')
+        try:
+            self.table.update_item(
+                Key={'person_id': person_id},
+                UpdateExpression='REMOVE ' + ', '.join(removals),
+                ConditionExpression='attribute_exists(media_phashes)',
+                ExpressionAttributeNames=names
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            pass  # Person gone or never had hashes
+
+
+class DynamoReminderStore(ReminderStore):
+    """Reminders as items in the person table, keyed by a reserved prefix outside the owner index
+
+    They're loaded through a sparse index of their own, so startup reads only reminders
+    however large the roster grows.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def load_all(self):
+        reminders = []
+        query_kwargs = {'IndexName': REMINDER_INDEX_NAME, 'KeyConditionExpression': Key('item_type').eq(REMINDER_ITEM_TYPE)}
+        while True:
+            response = self.table.query(**query_kwargs)
+            reminders.extend(item['reminder'] for item in response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return reminders
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def put(self, reminder):
+        self.table.put_item(Item={
+            'person_id': reminder_item_key(reminder['tenant_id'], reminder['reminder_id']),
+            'item_type': REMINDER_ITEM_TYPE,
+            'reminder': reminder
+        })
+
+    def delete(self, tenant_id, reminder_id):
+        self.table.delete_item(Key={'person_id': reminder_item_key(tenant_id, reminder_id)})
+
+
+class DynamoHistoryStore(HistoryStore):
+    """Recognition history in its own table; retention is left to DynamoDB TTL on expires_at"""
+
+    _BIN_ATTRIBUTE = re.compile(r'^b\d+$')
+
+    def __init__(self, table, raw_days, rollup_days):
+        self.table = table
+        self.raw_seconds = raw_days * 86400
+        self.rollup_seconds = rollup_days * 86400
+
+    def append(self, events, rollups):
+        with self.table.batch_writer() as batch:
+            for event in events:
+                item = {
+                    'tenant_id': event['tenant_id'],
+                    'event_key': event_key(event['ts'], event['event_id']),
+                    'item': json.dumps(event),
+                    'expires_at': event['ts'] // 1000 + self.raw_seconds
+                }
+                if event.get('person_id'):
+                    item['tenant_person'] = f"{event['tenant_id']}#{event['person_id']}"
+                batch.put_item(Item=item)
+        # ADD keeps concurrent flushes from several API processes from overwriting each other; the
+        # per-writer sequence attribute makes a retried rollup a no-op if its first attempt landed
+        unapplied = []
+        failed_keys = set()
+        for entry in rollups:
+            key = {'tenant_id': entry['tenant_id'], 'event_key': rollup_key(entry['day'], entry['person_id'])}
+            if key['event_key'] in failed_keys:
+                # Applying a newer sequence first would make the failed one look already applied
+                unapplied.append(entry)
+                continue
+            try:
+                self._add_rollup(key, entry)
+            except Exception as e:
+                print(f"[HISTORY] Rollup {key['event_key']} failed: {e}")
+                failed_keys.add(key['event_key'])
+                unapplied.append(entry)
+        return unapplied
+
+    def _add_rollup(self, key, entry):
+        day_end = int(datetime.strptime(entry['day'], '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp()) + 86400
+        names = {'#count': 'count', '#day': 'day', '#writer': f"w_{entry['writer']}"}
+        values = {
+            ':count': entry['count'],
+            ':sum': Decimal(str(round(entry['similarity_sum'], 4))),
+            ':sq': Decimal(str(round(entry['similarity_sq'], 4))),
+            ':first': entry['first_at'],
+            ':last': entry['last_at'],
+            ':person': entry['person_id'],
+            ':day': entry['day'],
+            ':expires': day_end + self.rollup_seconds,
+            ':sequence': entry['sequence']
+        }
+        adds = ['#count :count', 'similarity_sum :sum', 'similarity_sq :sq']
+        for i, (bucket, count) in enumerate(entry['bins'].items()):
+            names[f"#bin{i}"] = bucket
+            values[f":bin{i}"] = count
+            adds.append(f"#bin{i} :bin{i}")
+        try:
+            item = self.table.update_item(
+                Key=key,
+                UpdateExpression=('ADD ' + ', '.join(adds) + ' SET #writer = :sequence, '
+                                  'first_at = if_not_exists(first_at, :first), last_at = if_not_exists(last_at, :last), '
+                                  'person_id = :person, #day = :day, expires_at = :expires'),
+                ConditionExpression='attribute_not_exists(#writer) OR #writer < :sequence',
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+                ReturnValues='ALL_NEW'
+            )['Attributes']
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            # Already counted by an attempt whose response was lost; the bounds below may not have been
+            item = {}
+        # Batches from other processes land in any order, so the bounds only ever widen
+        if item.get('first_at', '\uffff') > entry['first_at']:
+            self._widen_bound(key, 'first_at', '>', entry['first_at'])
+        if item.get('last_at', '') < entry['last_at']:
+            self._widen_bound(key, 'last_at', '<', entry['last_at'])
+
+    def _widen_bound(self, key, attribute, comparison, value):
+        try:
+            self.table.update_item(
+                Key=key,
+                UpdateExpression=f"SET {attribute} = :value",
+                ConditionExpression=f"{attribute} {comparison} :value",
+                ExpressionAttributeValues={':value': value}
+            )
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            pass  # Another batch already moved it at least this far
+
+    def _query_all(self, query_kwargs, limit=None):
+        items = []
+        now = time.time()
+        while True:
+            response = self.table.query(**query_kwargs)
+            # TTL deletes lazily; hide items that are already past their expiry
+            items.extend(item for item in response.get('Items', []) if item.get('expires_at', now) >= now)
+            if 'LastEvaluatedKey' not in response or (limit and len(items) >= limit):
+                return items[:limit] if limit else items
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def query(self, tenant_id, start_ms, end_ms, person_id=None, limit=100):
+        key_range = Key('event_key').between(event_key(start_ms), event_key(end_ms))
+        if person_id is None:
+            condition = Key('tenant_id').eq(tenant_id) & key_range
+            query_kwargs = {'KeyConditionExpression': condition}
+        else:
+            condition = Key('tenant_person').eq(f"{tenant_id}#{person_id}") & key_range
+            query_kwargs = {'IndexName': HISTORY_PERSON_INDEX, 'KeyConditionExpression': condition}
+        query_kwargs.update(ScanIndexForward=False, Limit=min(limit, 1000))
+        events = [json.loads(item['item']) for item in self._query_all(query_kwargs, limit)]
+        # between() is inclusive; the range is not
+        return [event for event in events if event['ts'] < end_ms]
+
+    def rollups(self, tenant_id, start_day, end_day, person_id=None):
+        condition = Key('tenant_id').eq(tenant_id) & Key('event_key').between(rollup_key(start_day), rollup_key(end_day, '\uffff'))
+        rollups = []
+        for item in self._query_all({'KeyConditionExpression': condition}):
+            if person_id is not None and item['person_id'] != person_id:
+                continue
+            rollups.append({
+                'tenant_id': tenant_id,
+                'day': item['day'],
+                'person_id': item['person_id'],
+                'count': int(item['count']),
+                'similarity_sum': float(item.get('similarity_sum', 0)),
+                'similarity_sq': float(item.get('similarity_sq', 0)),
+                'bins': {name: int(value) for name, value in item.items() if self._BIN_ATTRIBUTE.match(name)},
+                'first_at': item['first_at'],
+                'last_at': item['last_at']
+            })
+        return rollups
+
+    def expire(self, before_ms, before_day):
+        # DynamoDB TTL removes expired items in the background at no cost
+        return 0, 0
+
+
+class RekognitionFaceIndex(FaceIndex):
+    """One tenant collection per Rekognition collection; calls go through a scheduled client"""
+
+    def __init__(self, rekognition, bucket_name):
+        self.rekognition = rekognition
+        self.bucket_name = bucket_name
+
+    def _image(self, image_bytes=None, object_key=None):
+        if object_key:
+            return {'S3Object': {'Bucket': self.bucket_name, 'Name': object_key}}
+        return {'Bytes': image_bytes}
+
+    def search(self, tenant, image_bytes, threshold=70):
+        try:
+            response = self.rekognition.search_faces_by_image(
+                CollectionId=tenant.collection_id,
+                Image={'Bytes': image_bytes},
+                MaxFaces=1,
+                FaceMatchThreshold=threshold
+            )
+        except self.rekognition.exceptions.InvalidParameterException as e:
+            raise NoFaceError(str(e))
+        return [
+            {
+                'person_id': match['Face']['ExternalImageId'],
+                'face_id': match['Face']['FaceId'],
+                'similarity': match['Similarity']
+            }
+            for match in response['FaceMatches']
+        ]
+
+    def index(self, tenant, person_id, image_bytes=None, object_key=None):
+        response = self.rekognition.index_faces(
+            CollectionId=tenant.collection_id,
+            Image=self._image(image_bytes, object_key),
+            ExternalImageId=person_id,
+            MaxFaces=1,
+            QualityFilter='AUTO'
+        )
+        if not response['FaceRecords']:
+            return None
+        return response['FaceRecords'][0]['Face']['FaceId']
+
+    def check_quality(self, object_key):
+        details = self.rekognition.detect_faces(Image=self._image(object_key=object_key), Attributes=['DEFAULT'])
+        return check_face_quality(details.get('FaceDetails', []))
+
+    def delete(self, tenant, face_ids):
+        if face_ids:
+            self.rekognition.delete_faces(CollectionId=tenant.collection_id, FaceIds=list(face_ids))
+
+    def list_pages(self, tenant):
+        paginator = self.rekognition.get_paginator('list_faces')
+        try:
+            for page in paginator.paginate(CollectionId=tenant.collection_id, PaginationConfig={'PageSize': 4096}):
+                yield [(face['FaceId'], face.get('ExternalImageId', '')) for face in page.get('Faces', [])]
+        except self.rekognition.exceptions.ResourceNotFoundException:
+            return
+
+
+def create(config):
+    """S3 + DynamoDB + Rekognition, with Rekognition calls rate-limited by priority"""
+    s3 = boto3.client('s3')
+    table = boto3.resource('dynamodb').Table(config['table_name'])
+    rekognition = boto3.client('rekognition')
+
+    # Rekognition calls share the account's TPS quota: live recognition goes first,
+    # then enrollment, then background maintenance. Every class gives up after its wait budget,
+    # so a saturated quota surfaces as RateLimited rather than a request thread blocked for good
+    scheduler = AwsCallScheduler(config['rate_limits'], wait_budgets={
+        PRIORITY_LIVE: config['live_wait'],
+        PRIORITY_ENROLLMENT: config.get('enrollment_wait'),
+        PRIORITY_BACKGROUND: config.get('background_wait')
+    })
+    face_indexes = {
+        priority: RekognitionFaceIndex(scheduler.wrap(rekognition, priority), config['bucket_name'])
+        for priority in (PRIORITY_LIVE, PRIORITY_ENROLLMENT, PRIORITY_BACKGROUND)
+    }
+    return Backend(
+        'aws',
+        objects=S3ObjectStore(s3, config['bucket_name']),
+        people=DynamoPersonStore(table),
+        face_indexes=face_indexes,
+        reminders=DynamoReminderStore(table),
+        history=DynamoHistoryStore(boto3.resource('dynamodb').Table(config['history_table_name']),
+                                   config['history_raw_days'], config['history_rollup_days']),
+        stats=lambda: {'aws_scheduler': scheduler.stats()}
+    )
@@ -0,0 +1,199 @@
+import heapq
+import itertools
+import threading
+import time
+
+from admission import AdmissionRejected
+
+PRIORITY_LIVE = 0
+PRIORITY_ENROLLMENT = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {
+    PRIORITY_LIVE: 'live',
+    PRIORITY_ENROLLMENT: 'enrollment',
+    PRIORITY_BACKGROUND: 'background'
+}
+
+# Share of each bucket's burst a class must leave untouched for the classes above it
+RESERVE_FRACTIONS = {
+    PRIORITY_LIVE: 0.0,
+    PRIORITY_ENROLLMENT: 0.2,
+    PRIORITY_BACKGROUND: 0.5
+}
+
+# Rekognition's default per-operation TPS in most regions; raise via AWS_RATE_LIMITS
+# to match the account's quotas (e.g. "search_faces_by_image=50,index_faces=50")
+DEFAULT_RATE_LIMITS = {
+    'search_faces_by_image': 5,
+    'index_faces': 5,
+    'detect_faces': 5,
+    'delete_faces': 5,
+    'list_faces': 5
+}
+
+THROTTLE_ERROR_CODES = ('ThrottlingException', 'ProvisionedThroughputExceededException')
+
+
+def parse_rate_limits(spec):
+    """Parse "operation=tps,operation=tps" on top of the defaults"""
+    limits = dict(DEFAULT_RATE_LIMITS)
+    for part in (spec or '').split(','):
+        if '=' in part:
+            operation, rate = part.split('=', 1)
+            limits[operation.strip()] = float(rate)
+    return limits
+
+
+class RateLimited(AdmissionRejected):
+    """Raised when a call can't get a token within its priority's wait budget"""
+
+
+class _OperationBucket:
+    """Token bucket for one operation with a priority-ordered wait queue"""
+
+    def __init__(self, name, rate, burst=None):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.waiters = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.stats = {priority: {'calls': 0, 'rejected': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+                      for priority in PRIORITY_NAMES}
+        self.throttled = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority, max_wait=None):
+        started = time.monotonic()
+        # Always leave room for at least one token, even in tiny buckets
+        reserve = min(self.burst * RESERVE_FRACTIONS.get(priority, 0.0), self.burst - 1)
+        entry = (priority, next(self.counter))
+        with self.cond:
+            heapq.heappush(self.waiters, entry)
+            try:
+                while True:
+                    self._refill()
+                    at_head = self.waiters[0] == entry
+                    if at_head and self.tokens - 1 >= reserve:
+                        self.tokens -= 1
+                        break
+
+                    waited = time.monotonic() - started
+                    if max_wait is not None and waited >= max_wait:
+                        self.stats[priority]['rejected'] += 1
+                        raise RateLimited(max(1.0 / self.rate, max_wait))
+
+                    # Sleep until enough tokens should have accrued, or until the queue moves
+                    timeout = (reserve + 1 - self.tokens) / self.rate if at_head else 0.05
+                    if max_wait is not None:
+                        timeout = min(timeout, max_wait - waited)
+                    self.cond.wait(max(timeout, 0.001))
+            finally:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+                self.cond.notify_all()
+
+            waited = time.monotonic() - started
+            stats = self.stats[priority]
+            stats['calls'] += 1
+            stats['wait_total'] += waited
+            stats['wait_max'] = max(stats['wait_max'], waited)
+
+    def snapshot(self):
+        with self.cond:
+            self._refill()
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self.waiters:
+                queued[PRIORITY_NAMES[priority]] += 1
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'tokens': round(self.tokens, 2),
+                'queued': queued,
+                'throttled': self.throttled,
+                'priorities': {
+                    PRIORITY_NAMES[priority]: {
+                        'calls': stats['calls'],
+                        'rejected': stats['rejected'],
+                        'avg_wait_ms': round(stats['wait_total'] / stats['calls'] * 1000, 1) if stats['calls'] else 0.0,
+                        'max_wait_ms': round(stats['wait_max'] * 1000, 1)
+                    }
+                    for priority, stats in self.stats.items()
+                }
+            }
+
+
+class AwsCallScheduler:
+    """Rate-limits AWS calls per operation and serves waiting callers by priority"""
+
+    def __init__(self, rate_limits, wait_budgets=None):
+        self.buckets = {name: _OperationBucket(name, rate) for name, rate in rate_limits.items()}
+        # Max seconds a priority class may wait for a token (None waits indefinitely)
+        self.wait_budgets = wait_budgets or {}
+
+    def call(self, priority, operation, fn, *args, **kwargs):
+        bucket = self.buckets.get(operation)
+        if bucket is None:
+            return fn(*args, **kwargs)
+        bucket.acquire(priority, self.wait_budgets.get(priority))
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            if code in THROTTLE_ERROR_CODES:
+                with bucket.cond:
+                    bucket.throttled += 1
+            raise
+
+    def wrap(self, client, priority):
+        """A view of a boto3 client whose calls are scheduled at the given priority"""
+        return ScheduledClient(client, self, priority)
+
+    def stats(self):
+        return {name: bucket.snapshot() for name, bucket in self.buckets.items()}
+
+
+class ScheduledClient:
+    """Proxy for a boto3 client that routes every API call through the scheduler"""
+
+    def __init__(self, client, scheduler, priority):
+        self._client = client
+        self._scheduler = scheduler
+        self._priority = priority
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or name.startswith('_') or name in ('get_paginator', 'get_waiter', 'can_paginate'):
+            return attr
+
+        def scheduled(*args, **kwargs):
+            return self._scheduler.call(self._priority, name, attr, *args, **kwargs)
+        return scheduled
+
+    def get_paginator(self, operation_name):
+        return _ScheduledPaginator(self._client.get_paginator(operation_name), self, operation_name)
+
+
+class _ScheduledPaginator:
+    """Paginator that takes a token before fetching each page"""
+
+    def __init__(self, paginator, client, operation_name):
+        self._paginator = paginator
+        self._client = client
+        self._operation_name = operation_name
+
+    def paginate(self, **kwargs):
+        pages = iter(self._paginator.paginate(**kwargs))
+        scheduler = self._client._scheduler
+        while True:
+            try:
+                page = scheduler.call(self._client._priority, self._operation_name, next, pages)
+            except StopIteration:
+                return
+            yield page
@@ -0,0 +1,186 @@
+import importlib
+
+from aws_scheduler import PRIORITY_LIVE
+
+BACKEND_NAMES = ('aws', 'local')
+
+
+class NoFaceError(Exception):
+    """Raised by FaceIndex.search when the image contains no detectable face"""
+
+
+class ObjectStore:
+    """Blob storage for photos and other per-person media, addressed by key"""
+
+    def put(self, key, data, content_type='application/octet-stream'):
+        raise NotImplementedError
+
+    def get(self, key):
+        """Object bytes, or None if the key doesn't exist"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def delete_many(self, keys):
+        """Delete up to 1000 keys; raises if any of them could not be deleted"""
+        raise NotImplementedError
+
+    def list_pages(self, prefix='', page_size=1000):
+        """Yield lists of keys under a prefix, one list per page"""
+        raise NotImplementedError
+
+    def url(self, key, expires_in=3600):
+        """Time-limited URL clients can fetch the object from"""
+        raise NotImplementedError
+
+    def head(self, key):
+        """{'size', 'content_type'} of an object, or None if the key doesn't exist"""
+        raise NotImplementedError
+
+    def upload_target(self, key, content_type, max_bytes, expires_in=900):
+        """Presigned request a client can upload one object with, bypassing the API
+
+        Returns {'method', 'url', 'fields', 'headers'}: a POST sends `fields` as form fields
+        followed by the file as `file`; a PUT sends the bytes with `headers`.
+        """
+        raise NotImplementedError
+
+    def start_multipart(self, key, content_type='application/octet-stream'):
+        """Begin an object uploaded in numbered parts; returns the upload ID"""
+        raise NotImplementedError
+
+    def upload_part(self, key, upload_id, part_number, fileobj, size):
+        """Store one part (1-based) from a seekable file; re-sending a part replaces it"""
+        raise NotImplementedError
+
+    def list_parts(self, key, upload_id):
+        """{part_number: size} of the parts received so far; raises KeyError for unknown uploads"""
+        raise NotImplementedError
+
+    def complete_multipart(self, key, upload_id):
+        """Join parts 1..N into the object; returns its size"""
+        raise NotImplementedError
+
+    def abort_multipart(self, key, upload_id):
+        raise NotImplementedError
+
+
+class PersonStore:
+    """Person records plus the per-tenant roster version and changelog (see roster.RosterLog)"""
+
+    def get(self, person_id):
+        raise NotImplementedError
+
+    def query(self, tenant):
+        """All of a tenant's person records"""
+        raise NotImplementedError
+
+    def add_exemplar(self, person_id, media_id, face_id, cap):
+        """Record an extra face on a person if it still exists and is under the cap; returns success"""
+        raise NotImplementedError
+
+    def remove_exemplar(self, person_id, media_id):
+        raise NotImplementedError
+
+    def claim_media(self, person_id, digest, media_id, phash=None):
+        """Map a photo's content hash to a media ID unless already mapped; returns the existing media ID or None"""
+        raise NotImplementedError
+
+    def release_media(self, person_id, media_id):
+        """Drop a media ID's content and perceptual hashes"""
+        raise NotImplementedError
+
+    # Roster API shared with RosterLog: read, etag, changes_since, recent_person_ids,
+    # get_people, put_person, put_people, update_person, delete_person
+
+
+class FaceIndex:
+    """Searchable index of face embeddings, each tagged with the person it belongs to"""
+
+    def search(self, tenant, image_bytes, threshold=70):
+        """Best matches for the largest face in an image: [{'person_id', 'face_id', 'similarity'}]
+
+        Raises NoFaceError if there is no face to search with.
+        """
+        raise NotImplementedError
+
+    def index(self, tenant, person_id, image_bytes=None, object_key=None):
+        """Add the largest face in an image (given as bytes or a stored object); returns its face_id or None"""
+        raise NotImplementedError
+
+    def check_quality(self, object_key):
+        """None if a stored photo is good enough to index as an exemplar, else the rejection reason"""
+        raise NotImplementedError
+
+    def delete(self, tenant, face_ids):
+        raise NotImplementedError
+
+    def list_pages(self, tenant):
+        """Yield lists of (face_id, person_id), one list per page"""
+        raise NotImplementedError
+
+
+class ReminderStore:
+    """Scheduled reminders; read in full at startup, then written through on every change"""
+
+    def load_all(self):
+        """Every stored reminder, across all tenants"""
+        raise NotImplementedError
+
+    def put(self, reminder):
+        raise NotImplementedError
+
+    def delete(self, tenant_id, reminder_id):
+        raise NotImplementedError
+
+
+class HistoryStore:
+    """Append-only recognition events and per-person daily rollups (see history.RecognitionLog)"""
+
+    def append(self, events, rollups):
+        """Write a batch of events, then add each rollup to the stored one unless its (writer, sequence) was
+        already applied; raises if the events were not written, else returns the rollups that were not applied.
+        After a rollup fails, later rollups for the same day and person are returned unapplied too."""
+        raise NotImplementedError
+
+    def query(self, tenant_id, start_ms, end_ms, person_id=None, limit=100):
+        """A tenant's events in [start, end), optionally for one person, newest first"""
+        raise NotImplementedError
+
+    def rollups(self, tenant_id, start_day, end_day, person_id=None):
+        """Daily rollups for days in [start_day, end_day] inclusive"""
+        raise NotImplementedError
+
+    def expire(self, before_ms, before_day):
+        """Delete events older than before_ms and rollups older than before_day; returns (events, rollups) deleted"""
+        raise NotImplementedError
+
+
+class Backend:
+    """The object, person, reminder, history and face stores an app instance runs against"""
+
+    def __init__(self, name, objects, people, face_indexes, reminders, history, stats=None):
+        self.name = name
+        self.objects = objects
+        self.people = people
+        self.reminders = reminders
+        self.history = history
+        # priority -> FaceIndex, so callers can be scheduled against a shared quota
+        self._face_indexes = face_indexes
+        self._stats = stats
+
+    def faces(self, priority=PRIORITY_LIVE):
+        return self._face_indexes.get(priority) or self._face_indexes[PRIORITY_LIVE]
+
+    def stats(self):
+        return self._stats() if self._stats else {}
+
+
+def create_backend(name, config):
+    """Build the named backend; each implementation module is only imported when selected"""
+    if name not in BACKEND_NAMES:
+        raise ValueError(f"Unknown storage backend {name!r}, expected one of {', '.join(BACKEND_NAMES)}")
+    module = importlib.import_module(f"{name}_backend")
+    return module.create(config)
+
@@ -0,0 +1,55 @@
+import boto3
+import os
+import argparse
+from datetime import datetime
+from dotenv import load_dotenv
+from tenants import DEFAULT_TENANT
+from roster import is_roster_meta
+from reminders import is_reminder_item
+
+# Load environment variables
+load_dotenv()
+
+dynamodb = boto3.resource('dynamodb')
+TABLE_NAME = os.getenv('DYNAMODB_TABLE_NAME', 'alzheimer-persons')
+
+def backfill_owner_keys(dry_run=False):
+    """Give every person item the tenant_id/created_at keys the owner index needs"""
+    
+    table = dynamodb.Table(TABLE_NAME)
+    scanned = 0
+    updated = 0
+    scan_kwargs = {'ProjectionExpression': 'person_id, tenant_id, created_at, updated_at'}
+    
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            scanned += 1
+            if is_roster_meta(item['person_id']) or is_reminder_item(item['person_id']):
+                continue
+            if item.get('tenant_id') and item.get('created_at'):
+                continue
+            
+            tenant_id = item.get('tenant_id') or DEFAULT_TENANT
+            created_at = item.get('created_at') or item.get('updated_at') or datetime.utcnow().isoformat()
+            print(f"{'Would update' if dry_run else 'Updating'} {item['person_id']}: tenant_id={tenant_id}, created_at={created_at}")
+            if not dry_run:
+                table.update_item(
+                    Key={'person_id': item['person_id']},
+                    UpdateExpression='SET tenant_id = if_not_exists(tenant_id, :tenant), created_at = if_not_exists(created_at, :created)',
+                    ConditionExpression='attribute_exists(person_id)',
+                    ExpressionAttributeValues={':tenant': tenant_id, ':created': created_at}
+                )
+            updated += 1
+        
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    print(f"✅ Scanned {scanned} items, {'would update' if dry_run else 'updated'} {updated}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill owner index keys on legacy person items')
+    parser.add_argument('--dry-run', action='store_true', help='Only report the items that would change')
+    args = parser.parse_args()
+    backfill_owner_keys(dry_run=args.dry_run)
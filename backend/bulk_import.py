@@ -0,0 +1,254 @@
+import base64
+import json
+import threading
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from backends import NoFaceError
+from image_pool import ImagePoolBusy
+from media_dedup import content_digest
+from uploads import THUMBNAIL_SIZE, thumbnail_key
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+# New person records written per DynamoDB transaction (limit is 100 actions,
+# one of which is the roster version bump)
+DYNAMODB_BATCH_SIZE = 25
+
+
+def parse_zip_archive(file_obj):
+    """Read a zip of `<person folder>/person.json` + photos into import entries"""
+    people = {}
+    with zipfile.ZipFile(file_obj) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            parts = info.filename.strip('/').split('/')
+            if len(parts) < 2 or parts[0].startswith('__MACOSX'):
+                continue
+            folder, filename = parts[0], parts[-1]
+            if filename.startswith('.'):
+                continue
+            entry = people.setdefault(folder, {'source': folder, 'images': []})
+            if filename == 'person.json':
+                entry.update(json.loads(archive.read(info)))
+            elif filename.lower().endswith(IMAGE_EXTENSIONS):
+                entry['images'].append(archive.read(info))
+    return [people[folder] for folder in sorted(people)]
+
+
+def decode_image(data):
+    """Raw photo bytes from a zip entry or a (data URL) base64 string"""
+    if isinstance(data, str):
+        if ',' in data:
+            data = data.split(',')[1]
+        data = base64.b64decode(data)
+    return data
+
+
+class BulkImporter:
+    """Runs bulk enrollment jobs on a bounded worker pool
+
+    Photos are rendered on the image pool and deduplicated like app uploads: photos for an
+    existing person go through save_photo, and new records are written with the hashes of
+    the photos stored with them.
+    """
+
+    def __init__(self, faces, objects, roster, images, save_photo, dedup, jobs, exemplar_indexer=None, workers=4,
+                 match_threshold=70, image_wait=None):
+        self.faces = faces
+        self.objects = objects
+        self.roster = roster
+        self.images = images
+        self.save_photo = save_photo
+        self.dedup = dedup
+        self.jobs = jobs
+        self.exemplar_indexer = exemplar_indexer
+        self.match_threshold = match_threshold
+        # Longest a photo waits for the image pool, so an import can't hold up the routes sharing it
+        self.image_wait = image_wait
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bulk-import')
+
+    def submit(self, people, tenant):
+        """Create a job for the given entries and start processing it in the background"""
+        job = self.jobs.create('bulk_import', total=len(people), details={'tenant_id': tenant.tenant_id, 'duplicates': 0})
+        thread = threading.Thread(target=self._run_job, args=(job, people, tenant), daemon=True)
+        thread.start()
+        return job
+
+    def _run_job(self, job, people, tenant):
+        job.start()
+        pending_items = []
+        try:
+            futures = {
+                self.executor.submit(self._import_person, job, entry, tenant): index
+                for index, entry in enumerate(people)
+            }
+            for future in as_completed(futures):
+                entry = people[futures[future]]
+                label = entry.get('source') or entry.get('name') or futures[future]
+                try:
+                    result, item, gallery = future.result()
+                except Exception as e:
+                    print(f"[BULK_IMPORT] {job.job_id} item {label} failed: {e}")
+                    job.record_error(label, e)
+                    continue
+
+                if item is None:
+                    job.record_success(result)
+                    self._enqueue_gallery(tenant, result['person_id'], gallery)
+                    continue
+
+                pending_items.append((label, result, item, gallery))
+                if len(pending_items) >= DYNAMODB_BATCH_SIZE:
+                    self._flush(job, pending_items, tenant)
+                    pending_items = []
+
+            self._flush(job, pending_items, tenant)
+            job.finish()
+        except Exception as e:
+            print(f"[BULK_IMPORT] {job.job_id} aborted: {e}")
+            job.finish(error=e)
+        print(f"[BULK_IMPORT] {job.job_id} {job.status}: {job.succeeded} ok, {job.failed} failed")
+
+    def _flush(self, job, pending_items, tenant):
+        """Write new person records (and the roster version bump) in one DynamoDB transaction"""
+        if not pending_items:
+            return
+        try:
+            self.roster.put_people(tenant, [item for _, _, item, _ in pending_items])
+        except Exception as e:
+            for label, _, item, gallery in pending_items:
+                job.record_error(label, e)
+                # A face left indexed would match later imports to a person that doesn't exist
+                self._discard(tenant, item['person_id'], item['face_id'],
+                              [item['face_id']] + [media_id for media_id, _ in gallery])
+            return
+        for _, result, _, gallery in pending_items:
+            job.record_success(result)
+            # Exemplars are tracked on the record, so only index once it exists
+            self._enqueue_gallery(tenant, result['person_id'], gallery)
+
+    def _enqueue_gallery(self, tenant, person_id, gallery):
+        if self.exemplar_indexer:
+            for media_id, s3_key in gallery:
+                self.exemplar_indexer.enqueue(tenant, person_id, media_id, s3_key)
+
+    def _import_person(self, job, entry, tenant):
+        """Index one person and store their photos; returns (result, new item or None, gallery keys)"""
+        name = entry.get('name')
+        relationship = entry.get('relationship')
+        if not name or not relationship:
+            raise ValueError('name and relationship required')
+
+        photos = []
+        busy = None
+        for index, data in enumerate(entry.get('images') or []):
+            try:
+                raw = decode_image(data)
+                photos.append((raw, self.images.render(raw, wait=self.image_wait, thumbnail_size=THUMBNAIL_SIZE)))
+            except ImagePoolBusy as e:
+                busy = e
+                job.note_error(f"{entry.get('source') or name} photo {index + 1}", e)
+            except Exception as e:
+                print(f"[BULK_IMPORT] Skipping unreadable image for {name}: {e}")
+        if not photos:
+            if busy:
+                raise busy
+            raise ValueError('no readable images')
+
+        now = datetime.utcnow().isoformat()
+        fields = {
+            'name': name,
+            'relationship': relationship,
+            'age': entry.get('age'),
+            'notes': entry.get('notes', '')
+        }
+
+        # Dedup against the collection using the first photo with a face
+        existing_person_id = None
+        for _, rendition in photos:
+            try:
+                matches = self.faces.search(tenant, rendition['jpeg'], threshold=self.match_threshold)
+            except NoFaceError:
+                continue  # No face in this photo
+            if matches:
+                existing_person_id = matches[0]['person_id']
+            break
+
+        if existing_person_id:
+            person_info = self.roster.get(existing_person_id) or {'person_id': existing_person_id}
+            self.roster.update_person(tenant, existing_person_id, dict(fields, updated_at=now))
+            # save_photo skips photos the person already has and queues the rest for exemplar indexing
+            duplicates = 0
+            for raw, rendition in photos:
+                _, _, duplicate = self.save_photo(tenant, person_info, raw, rendition)
+                duplicates += duplicate
+            job.increment_detail('duplicates', duplicates)
+            result = {'person_id': existing_person_id, 'updated': True, 'images': len(photos) - duplicates,
+                      'duplicates': duplicates}
+            return result, None, []
+
+        person_id = str(uuid.uuid4())
+        face_id = None
+        face_index = None
+        for index, (_, rendition) in enumerate(photos):
+            face_id = self.faces.index(tenant, person_id, image_bytes=rendition['jpeg'])
+            if face_id:
+                face_index = index
+                break
+        if not face_id:
+            raise ValueError('no face detected in any image')
+
+        # Until the record is written, nothing points at the face or the photos; remove them if this fails
+        media_ids = [face_id]
+        try:
+            # The record doesn't exist yet, so its hashes are collected here and written with it
+            raw, rendition = photos[face_index]
+            person_info = dict(self.dedup.initial_hashes(content_digest(raw), face_id, rendition['phash']),
+                               person_id=person_id)
+            s3_key = self._put_image(tenant, person_id, face_id, rendition)
+            gallery = []
+            duplicates = 0
+            for raw, rendition in photos[:face_index] + photos[face_index + 1:]:
+                digest = content_digest(raw)
+                if self.dedup.find(person_info, digest, rendition['phash']):
+                    duplicates += 1
+                    continue
+                media_id = str(uuid.uuid4())
+                media_ids.append(media_id)
+                person_info['media_hashes'][digest] = media_id
+                person_info['media_phashes'][media_id] = rendition['phash']
+                gallery.append((media_id, self._put_image(tenant, person_id, media_id, rendition)))
+            job.increment_detail('duplicates', duplicates)
+        except Exception:
+            self._discard(tenant, person_id, face_id, media_ids)
+            raise
+
+        item = dict(fields, person_id=person_id, tenant_id=tenant.tenant_id, face_id=face_id, s3_key=s3_key,
+                    media_hashes=person_info['media_hashes'], media_phashes=person_info['media_phashes'],
+                    created_at=now)
+        result = {'person_id': person_id, 'face_id': face_id, 'created': True, 'images': len(photos) - duplicates,
+                  'duplicates': duplicates}
+        return result, item, gallery
+
+    def _discard(self, tenant, person_id, face_id, media_ids):
+        """Remove the face and photos of a new person whose record was never written"""
+        keys = [self._image_key(tenant, person_id, media_id) for media_id in media_ids]
+        keys += [thumbnail_key(tenant, person_id, media_id) for media_id in media_ids]
+        try:
+            self.faces.delete(tenant, [face_id])
+            self.objects.delete_many(keys)
+        except Exception as e:
+            print(f"[BULK_IMPORT] Cleanup of {person_id} failed, cleanup.py reconcile --apply will remove it: {e}")
+
+    def _image_key(self, tenant, person_id, media_id):
+        return f"{tenant.s3_prefix}{person_id}/{media_id}.jpg"
+
+    def _put_image(self, tenant, person_id, media_id, rendition):
+        s3_key = self._image_key(tenant, person_id, media_id)
+        self.objects.put(s3_key, rendition['jpeg'], 'image/jpeg')
+        if rendition.get('thumb'):
+            self.objects.put(thumbnail_key(tenant, person_id, media_id), rendition['thumb'], 'image/jpeg')
+        return s3_key
@@ -1,12 +1,28 @@
 import boto3
+from boto3.dynamodb.conditions import Key
 import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from tenants import TenantRouter, tenant_id_arg, collection_id_for, s3_prefix_for, DEFAULT_TENANT, OWNER_INDEX_NAME
+from roster import ROSTER_META_PREFIX
+from reminders import reminder_item_key, REMINDER_INDEX_NAME, REMINDER_ITEM_TYPE
+from aws_scheduler import AwsCallScheduler, parse_rate_limits, PRIORITY_BACKGROUND
+from reconcile import Reconciler, DELETE_FACES_BATCH
 
 # Load environment variables
 load_dotenv()
 
+# Cleanup runs outside the API process, so it gets its own scheduler capped at a
+# fraction of the account quota to leave headroom for live recognition
+CLEANUP_RATE_FRACTION = float(os.getenv('CLEANUP_RATE_FRACTION', '0.25'))
+cleanup_rate_limits = {
+    operation: rate * CLEANUP_RATE_FRACTION
+    for operation, rate in parse_rate_limits(os.getenv('AWS_RATE_LIMITS')).items()
+}
+
 # AWS clients
-rekognition = boto3.client('rekognition')
+rekognition = AwsCallScheduler(cleanup_rate_limits).wrap(boto3.client('rekognition'), PRIORITY_BACKGROUND)
 s3 = boto3.client('s3')
 dynamodb = boto3.resource('dynamodb')
 
@@ -14,68 +30,230 @@ dynamodb = boto3.resource('dynamodb')
 BUCKET_NAME = os.getenv('S3_BUCKET_NAME', 'alzheimer-camera-faces')
 COLLECTION_ID = os.getenv('REKOGNITION_COLLECTION_ID', 'alzheimer-faces')
 TABLE_NAME = os.getenv('DYNAMODB_TABLE_NAME', 'alzheimer-persons')
+HISTORY_TABLE_NAME = os.getenv('HISTORY_TABLE_NAME', 'alzheimer-recognitions')
+
+def delete_s3_prefix(prefix='', executor=None):
+    """Delete every object under a prefix, one DeleteObjects call per listed page"""
+    s3_paginator = s3.get_paginator('list_objects_v2')
+    deleted = 0
+    futures = []
+    for page in s3_paginator.paginate(Bucket=BUCKET_NAME, Prefix=prefix):
+        if 'Contents' in page:
+            objects = [{'Key': obj['Key']} for obj in page['Contents']]
+            if executor:
+                futures.append(executor.submit(s3.delete_objects, Bucket=BUCKET_NAME, Delete={'Objects': objects}))
+            else:
+                s3.delete_objects(Bucket=BUCKET_NAME, Delete={'Objects': objects})
+            deleted += len(objects)
+    for future in futures:
+        future.result()
+    return deleted
+
+def clear_table(table, key_names, executor, workers):
+    """Delete every item in a table, one parallel scan segment per worker"""
+    
+    def clear_segment(segment):
+        deleted = 0
+        scan_kwargs = {
+            'ProjectionExpression': ', '.join(f"#k{i}" for i in range(len(key_names))),
+            'ExpressionAttributeNames': {f"#k{i}": name for i, name in enumerate(key_names)},
+            'Segment': segment,
+            'TotalSegments': workers
+        }
+        with table.batch_writer() as batch:
+            while True:
+                response = table.scan(**scan_kwargs)
+                for item in response.get('Items', []):
+                    batch.delete_item(Key={name: item[name] for name in key_names})
+                    deleted += 1
+                if 'LastEvaluatedKey' not in response:
+                    return deleted
+                scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    return sum(executor.map(clear_segment, range(workers)))
 
-def clear_all_data():
+def clear_all_data(workers=8):
     """Clear all data from S3, DynamoDB, and Rekognition"""
     
     print("🧹 Starting cleanup...")
     
-    # 1. Clear S3 bucket
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # 1. Clear S3 bucket
+        try:
+            print("Clearing S3 bucket...")
+            deleted = delete_s3_prefix(executor=executor)
+            print(f"✅ Deleted {deleted} objects from S3")
+        except Exception as e:
+            print(f"❌ S3 error: {e}")
+        
+        # 2. Clear DynamoDB tables, one parallel scan segment per worker
+        try:
+            print("Clearing DynamoDB table...")
+            deleted = clear_table(dynamodb.Table(TABLE_NAME), ['person_id'], executor, workers)
+            print(f"✅ Deleted {deleted} items from DynamoDB")
+        except Exception as e:
+            print(f"❌ DynamoDB error: {e}")
+        
+        try:
+            print("Clearing recognition history...")
+            deleted = clear_table(dynamodb.Table(HISTORY_TABLE_NAME), ['tenant_id', 'event_key'], executor, workers)
+            print(f"✅ Deleted {deleted} history items")
+        except Exception as e:
+            print(f"❌ History error: {e}")
+    
+    # 3. Clear Rekognition collection
     try:
-        print("Clearing S3 bucket...")
-        s3_paginator = s3.get_paginator('list_objects_v2')
-        pages = s3_paginator.paginate(Bucket=BUCKET_NAME)
+        print("Clearing Rekognition collection...")
         
-        for page in pages:
-            if 'Contents' in page:
-                objects = [{'Key': obj['Key']} for obj in page['Contents']]
-                s3.delete_objects(Bucket=BUCKET_NAME, Delete={'Objects': objects})
-                print(f"Deleted {len(objects)} objects from S3")
+        # Page through every face and delete in batches of DeleteFaces' maximum
+        deleted = 0
+        face_ids = []
+        paginator = rekognition.get_paginator('list_faces')
+        for page in paginator.paginate(CollectionId=COLLECTION_ID, PaginationConfig={'PageSize': DELETE_FACES_BATCH}):
+            face_ids.extend(face['FaceId'] for face in page.get('Faces', []))
+        for start in range(0, len(face_ids), DELETE_FACES_BATCH):
+            batch = face_ids[start:start + DELETE_FACES_BATCH]
+            rekognition.delete_faces(CollectionId=COLLECTION_ID, FaceIds=batch)
+            deleted += len(batch)
         
-        print("✅ S3 bucket cleared")
+        if deleted:
+            print(f"✅ Deleted {deleted} faces from Rekognition")
+        else:
+            print("✅ No faces to delete from Rekognition")
+            
+    except Exception as e:
+        print(f"❌ Rekognition error: {e}")
+    
+    print("🎉 Cleanup complete! All duplicates removed.")
+
+def clear_tenant_data(tenant_id):
+    """Tear down a single patient/household tenant: its collection, S3 prefix and DynamoDB items"""
+    
+    if tenant_id == DEFAULT_TENANT:
+        print("The default tenant shares the base collection and bucket root; use a full cleanup instead.")
+        return
+    
+    print(f"🧹 Removing tenant {tenant_id}...")
+    
+    # 1. S3 objects under the tenant prefix
+    try:
+        prefix = s3_prefix_for(tenant_id)
+        deleted = delete_s3_prefix(prefix)
+        print(f"✅ Deleted {deleted} objects under {prefix}")
     except Exception as e:
         print(f"❌ S3 error: {e}")
     
-    # 2. Clear DynamoDB table
+    # 2. DynamoDB items in the tenant's partition
     try:
-        print("Clearing DynamoDB table...")
         table = dynamodb.Table(TABLE_NAME)
-        
-        # Scan and delete all items
-        response = table.scan()
-        items = response.get('Items', [])
-        
+        deleted = 0
+        query_kwargs = {
+            'IndexName': OWNER_INDEX_NAME,
+            'KeyConditionExpression': Key('tenant_id').eq(tenant_id),
+            'ProjectionExpression': 'person_id'
+        }
         with table.batch_writer() as batch:
-            for item in items:
-                batch.delete_item(Key={'person_id': item['person_id']})
-        
-        print(f"✅ Deleted {len(items)} items from DynamoDB")
+            while True:
+                response = table.query(**query_kwargs)
+                for item in response.get('Items', []):
+                    batch.delete_item(Key={'person_id': item['person_id']})
+                    deleted += 1
+                if 'LastEvaluatedKey' not in response:
+                    break
+                query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+            meta_key = f"{ROSTER_META_PREFIX}{tenant_id}"
+            meta = table.get_item(Key={'person_id': meta_key}, ConsistentRead=True).get('Item') or {}
+            version = int(meta.get('version', 0))
+            floor = version if 'changes' in meta else int(meta.get('floor', 0))
+            for change_version in range(floor + 1, version + 1):
+                batch.delete_item(Key={'person_id': f"{meta_key}#{change_version}"})
+            batch.delete_item(Key={'person_id': meta_key})
+            
+            # Reminder items live outside the owner index, in their own
+            query_kwargs = {
+                'IndexName': REMINDER_INDEX_NAME,
+                'KeyConditionExpression': Key('item_type').eq(REMINDER_ITEM_TYPE)
+                                          & Key('person_id').begins_with(reminder_item_key(tenant_id, '')),
+                'ProjectionExpression': 'person_id'
+            }
+            while True:
+                response = table.query(**query_kwargs)
+                for item in response.get('Items', []):
+                    batch.delete_item(Key={'person_id': item['person_id']})
+                    deleted += 1
+                if 'LastEvaluatedKey' not in response:
+                    break
+                query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        print(f"✅ Deleted {deleted} items from DynamoDB")
     except Exception as e:
         print(f"❌ DynamoDB error: {e}")
     
-    # 3. Clear Rekognition collection
+    # 3. The tenant's recognition history partition
     try:
-        print("Clearing Rekognition collection...")
-        
-        # List all faces
-        response = rekognition.list_faces(CollectionId=COLLECTION_ID)
-        faces = response.get('Faces', [])
-        
-        if faces:
-            face_ids = [face['FaceId'] for face in faces]
-            rekognition.delete_faces(CollectionId=COLLECTION_ID, FaceIds=face_ids)
-            print(f"✅ Deleted {len(face_ids)} faces from Rekognition")
-        else:
-            print("✅ No faces to delete from Rekognition")
-            
+        history = dynamodb.Table(HISTORY_TABLE_NAME)
+        deleted = 0
+        query_kwargs = {'KeyConditionExpression': Key('tenant_id').eq(tenant_id), 'ProjectionExpression': 'event_key'}
+        with history.batch_writer() as batch:
+            while True:
+                response = history.query(**query_kwargs)
+                for item in response.get('Items', []):
+                    batch.delete_item(Key={'tenant_id': tenant_id, 'event_key': item['event_key']})
+                    deleted += 1
+                if 'LastEvaluatedKey' not in response:
+                    break
+                query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        print(f"✅ Deleted {deleted} history items")
+    except Exception as e:
+        print(f"❌ History error: {e}")
+    
+    # 4. The tenant's whole Rekognition collection
+    try:
+        collection_id = collection_id_for(tenant_id, COLLECTION_ID)
+        rekognition.delete_collection(CollectionId=collection_id)
+        print(f"✅ Deleted Rekognition collection {collection_id}")
+    except rekognition.exceptions.ResourceNotFoundException:
+        print("✅ No Rekognition collection to delete")
     except Exception as e:
         print(f"❌ Rekognition error: {e}")
     
-    print("🎉 Cleanup complete! All duplicates removed.")
+    print(f"🎉 Tenant {tenant_id} removed.")
+
+def reconcile(tenant_id, person_prefix='', apply=False, workers=8):
+    """Find and repair drift between S3, DynamoDB and Rekognition for one tenant"""
+    
+    tenant = TenantRouter(COLLECTION_ID).get(tenant_id)
+    mode = "Repairing" if apply else "Dry run for"
+    print(f"🔍 {mode} tenant {tenant.tenant_id}" + (f" (people matching {person_prefix}*)" if person_prefix else ""))
+    
+    reconciler = Reconciler(
+        rekognition, s3, dynamodb.Table(TABLE_NAME), BUCKET_NAME, tenant,
+        person_prefix=person_prefix, dry_run=not apply, workers=workers
+    )
+    stats = reconciler.run()
+    for name, value in stats.items():
+        print(f"  {name}: {value}")
+    if not apply:
+        print("No changes made; re-run with --apply to repair.")
 
 if __name__ == '__main__':
-    confirm = input("⚠️  This will delete ALL data. Type 'YES' to confirm: ")
-    if confirm == 'YES':
-        clear_all_data()
+    parser = argparse.ArgumentParser(description='Delete or reconcile AlzheimerCamera data')
+    parser.add_argument('--tenant', type=tenant_id_arg, help='Only act on this patient/household ID')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent AWS calls')
+    subparsers = parser.add_subparsers(dest='command')
+    reconcile_parser = subparsers.add_parser('reconcile', help='Repair orphaned faces, objects and items')
+    reconcile_parser.add_argument('--prefix', default='', help='Only check person IDs starting with this prefix')
+    reconcile_parser.add_argument('--apply', action='store_true', help='Make changes (default is a dry run)')
+    args = parser.parse_args()
+    
+    if args.command == 'reconcile':
+        reconcile(args.tenant, args.prefix, args.apply, args.workers)
     else:
-        print("Cleanup cancelled.")
\ No newline at end of file
+        scope = f"tenant {args.tenant}" if args.tenant else "ALL data"
+        confirm = input(f"⚠️  This will delete {scope}. Type 'YES' to confirm: ")
+        if confirm == 'YES':
+            if args.tenant:
+                clear_tenant_data(args.tenant)
+            else:
+                clear_all_data(args.workers)
+        else:
+            print("Cleanup cancelled.")
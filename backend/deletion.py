@@ -0,0 +1,85 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from exemplars import person_face_ids
+
+# Rekognition DeleteFaces accepts at most 4096 IDs; S3 DeleteObjects at most 1000 keys
+DELETE_FACES_BATCH = 4096
+DELETE_OBJECTS_BATCH = 1000
+
+
+class PersonDeleter:
+    """Deletes a person's faces, media and record as a tracked background job"""
+
+    def __init__(self, faces, objects, roster, jobs, workers=2):
+        self.faces = faces
+        self.objects = objects
+        self.roster = roster
+        self.jobs = jobs
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='delete-person')
+        # (tenant_id, person_id) -> running job, so repeated DELETEs share one job
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def submit(self, tenant, person_info):
+        """Start deleting a person, or return the job already doing it"""
+        key = (tenant.tenant_id, person_info['person_id'])
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                return job
+            # Steps: faces, S3 objects, DynamoDB item
+            job = self.jobs.create('delete_person', total=3, details={
+                'tenant_id': tenant.tenant_id,
+                'person_id': person_info['person_id'],
+                'faces_deleted': 0,
+                'objects_deleted': 0
+            })
+            self._active[key] = job
+        self.executor.submit(self._run_job, job, key, tenant, person_info)
+        return job
+
+    def _run_job(self, job, key, tenant, person_info):
+        person_id = person_info['person_id']
+        job.start()
+        try:
+            # The record goes last: if anything fails it is still there to retry the delete against
+            for step, fn in (('faces', self._delete_faces), ('s3', self._delete_objects)):
+                try:
+                    fn(job, tenant, person_info)
+                    job.record_success(step)
+                except Exception as e:
+                    print(f"[DELETE_PERSON] {job.job_id} {step} failed for {person_id}: {e}")
+                    job.record_error(step, e)
+            if job.failed:
+                job.record_error('dynamodb', 'Skipped so the delete can be retried')
+            else:
+                self.roster.delete_person(tenant, person_id)
+                job.record_success('dynamodb')
+            job.finish()
+        except Exception as e:
+            print(f"[DELETE_PERSON] {job.job_id} failed for {person_id}: {e}")
+            job.finish(error=e)
+        finally:
+            with self._lock:
+                self._active.pop(key, None)
+
+    def _delete_faces(self, job, tenant, person_info):
+        """Every face indexed under the person's ExternalImageId, not just the tracked ones"""
+        person_id = person_info['person_id']
+        face_ids = set(person_face_ids(person_info))
+        for page in self.faces.list_pages(tenant):
+            face_ids.update(face_id for face_id, owner in page if owner == person_id)
+
+        face_ids = sorted(face_ids)
+        for start in range(0, len(face_ids), DELETE_FACES_BATCH):
+            batch = face_ids[start:start + DELETE_FACES_BATCH]
+            self.faces.delete(tenant, batch)
+            job.increment_detail('faces_deleted', len(batch))
+
+    def _delete_objects(self, job, tenant, person_info):
+        """Everything under the person's folder: photos, renditions, audio"""
+        prefix = f"{tenant.s3_prefix}{person_info['person_id']}/"
+        for keys in self.objects.list_pages(prefix, page_size=DELETE_OBJECTS_BATCH):
+            self.objects.delete_many(keys)
+            job.increment_detail('objects_deleted', len(keys))
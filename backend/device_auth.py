@@ -0,0 +1,64 @@
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+from tenants import tenant_id_arg
+
+# Long-lived by default: a patient's phone or camera hub shouldn't need re-pairing often
+DEFAULT_TOKEN_TTL = 365 * 24 * 3600
+
+
+class DeviceTokens:
+    """HMAC-signed tokens binding a device to one patient/household tenant"""
+
+    def __init__(self, secret):
+        self.secret = secret.encode()
+
+    def _sign(self, payload):
+        return hmac.new(self.secret, payload.encode(), hashlib.sha256).hexdigest()
+
+    def issue(self, tenant_id, device_id, ttl=DEFAULT_TOKEN_TTL):
+        claims = {'t': tenant_id, 'd': device_id, 'e': int(time.time()) + ttl}
+        payload = base64.urlsafe_b64encode(json.dumps(claims, separators=(',', ':')).encode()).decode().rstrip('=')
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token):
+        """(tenant_id, device_id) for a valid, unexpired token, else None"""
+        try:
+            payload, signature = (token or '').split('.', 1)
+            if not hmac.compare_digest(self._sign(payload), signature):
+                return None
+            claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        except (ValueError, TypeError):
+            return None
+        if claims.get('e', 0) < time.time():
+            return None
+        return claims['t'], claims['d']
+
+
+def token_from_request(request):
+    """Bearer token from the Authorization header, or ?token= for clients that can't set headers"""
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[len('Bearer '):].strip()
+    return request.args.get('token')
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Issue a push-channel token for a device')
+    parser.add_argument('--tenant', default='default', type=tenant_id_arg, help='Patient/household ID the device belongs to')
+    parser.add_argument('--device', required=True, help='Name of the phone or hub, shown in server logs')
+    parser.add_argument('--days', type=int, default=DEFAULT_TOKEN_TTL // 86400, help='Token lifetime in days')
+    args = parser.parse_args()
+
+    secret = os.getenv('DEVICE_TOKEN_SECRET')
+    if not secret:
+        raise SystemExit('Set DEVICE_TOKEN_SECRET (the same value the API server uses) first.')
+    print(DeviceTokens(secret).issue(args.tenant, args.device, ttl=args.days * 86400))
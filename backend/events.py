@@ -0,0 +1,143 @@
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Events kept per tenant for Last-Event-ID resume
+EVENT_BUFFER_SIZE = 500
+# Comment lines sent on idle streams so proxies keep them open and dead clients are noticed
+HEARTBEAT_SECONDS = 15
+# Reconnect delay suggested to clients, in milliseconds
+RETRY_MS = 3000
+
+
+class TooManySubscribers(Exception):
+    """Raised when the push channel is at its connection limit"""
+
+
+def format_sse(event_type, data, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class EventBus:
+    """Per-tenant ring buffers of events with blocking, resumable subscriptions"""
+
+    def __init__(self, buffer_size=EVENT_BUFFER_SIZE, max_subscribers=100, heartbeat=HEARTBEAT_SECONDS):
+        # IDs are "<epoch>-<seq>"; an ID from another server process can't be resumed
+        self.epoch = f"{int(time.time()):x}"
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self._seq = 0
+        self._buffers = {}
+        # Highest seq evicted from each tenant's buffer; resuming from before it would miss events
+        self._evicted = {}
+        self._subscribers = {}
+        self._cond = threading.Condition()
+        self.published = 0
+
+    def publish(self, tenant_id, event_type, data):
+        with self._cond:
+            self._seq += 1
+            event = {
+                'seq': self._seq,
+                'id': f"{self.epoch}-{self._seq}",
+                'type': event_type,
+                'data': dict(data, at=datetime.utcnow().isoformat())
+            }
+            buffer = self._buffers.setdefault(tenant_id, deque())
+            buffer.append(event)
+            if len(buffer) > self.buffer_size:
+                self._evicted[tenant_id] = buffer.popleft()['seq']
+            self.published += 1
+            self._cond.notify_all()
+            return event
+
+    def _resume_point(self, tenant_id, last_event_id):
+        """Seq to replay after, or None if the requested point is no longer available"""
+        epoch, _, seq = (last_event_id or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq < self._evicted.get(tenant_id, 0) or seq > self._seq:
+            return None
+        return seq
+
+    def stream(self, tenant_id, last_event_id=None):
+        """SSE text chunks for a tenant: any missed events after last_event_id, then live ones"""
+        with self._cond:
+            if sum(self._subscribers.values()) >= self.max_subscribers:
+                raise TooManySubscribers('Push channel is at capacity')
+            self._subscribers[tenant_id] = self._subscribers.get(tenant_id, 0) + 1
+            cursor = self._resume_point(tenant_id, last_event_id) if last_event_id else self._seq
+            reset = cursor is None
+            if reset:
+                cursor = self._seq
+        return self._generate(tenant_id, cursor, reset)
+
+    def _generate(self, tenant_id, cursor, reset):
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            if reset:
+                # Too far behind to replay: the client should re-sync the roster in full
+                yield format_sse('reset', {'reason': 'resume_unavailable'}, f"{self.epoch}-{cursor}")
+            while True:
+                with self._cond:
+                    pending = [e for e in self._buffers.get(tenant_id, ()) if e['seq'] > cursor]
+                    if not pending:
+                        self._cond.wait(self.heartbeat)
+                        pending = [e for e in self._buffers.get(tenant_id, ()) if e['seq'] > cursor]
+                if not pending:
+                    yield ': keepalive\n\n'
+                    continue
+                for event in pending:
+                    cursor = event['seq']
+                    yield format_sse(event['type'], event['data'], event['id'])
+        finally:
+            with self._cond:
+                self._subscribers[tenant_id] -= 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                'subscribers': sum(self._subscribers.values()),
+                'published': self.published,
+                'buffered': {tenant_id: len(buffer) for tenant_id, buffer in self._buffers.items()}
+            }
+
+
+class RosterNotifier:
+    """Person store proxy that publishes a `roster` event after every roster write"""
+
+    def __init__(self, people, bus):
+        self._people = people
+        self._bus = bus
+
+    def __getattr__(self, name):
+        return getattr(self._people, name)
+
+    def _notify(self, tenant, version, person_ids, deleted=False):
+        self._bus.publish(tenant.tenant_id, 'roster', {
+            'version': version,
+            'person_ids': list(person_ids),
+            'deleted': deleted
+        })
+        return version
+
+    def put_person(self, tenant, item):
+        return self._notify(tenant, self._people.put_person(tenant, item), [item['person_id']])
+
+    def put_people(self, tenant, items):
+        return self._notify(tenant, self._people.put_people(tenant, items), [item['person_id'] for item in items])
+
+    def update_person(self, tenant, person_id, fields):
+        return self._notify(tenant, self._people.update_person(tenant, person_id, fields), [person_id])
+
+    def delete_person(self, tenant, person_id):
+        return self._notify(tenant, self._people.delete_person(tenant, person_id), [person_id], deleted=True)
@@ -0,0 +1,102 @@
+import queue
+import threading
+
+from tenants import item_tenant
+
+# Quality gates applied to gallery photos before they become extra exemplars
+MIN_FACE_AREA = 0.02       # bounding box area as a fraction of the frame
+MIN_SHARPNESS = 20.0       # Rekognition Quality.Sharpness (0-100)
+MIN_BRIGHTNESS = 20.0      # Rekognition Quality.Brightness (0-100)
+MAX_POSE_DEGREES = 30.0    # max absolute yaw / pitch
+
+
+def check_face_quality(face_details):
+    """Return None if detect_faces output is usable as an exemplar, else the rejection reason"""
+    if len(face_details) != 1:
+        return f'expected exactly one face, found {len(face_details)}'
+    face = face_details[0]
+
+    box = face.get('BoundingBox', {})
+    if box.get('Width', 0) * box.get('Height', 0) < MIN_FACE_AREA:
+        return 'face too small'
+
+    quality = face.get('Quality', {})
+    if quality.get('Sharpness', 0) < MIN_SHARPNESS:
+        return 'too blurry'
+    if quality.get('Brightness', 0) < MIN_BRIGHTNESS:
+        return 'too dark'
+
+    pose = face.get('Pose', {})
+    if abs(pose.get('Yaw', 0)) > MAX_POSE_DEGREES or abs(pose.get('Pitch', 0)) > MAX_POSE_DEGREES:
+        return 'face not frontal'
+    return None
+
+
+class ExemplarIndexer:
+    """Background worker that indexes good gallery photos as additional faces for a person"""
+
+    def __init__(self, faces, people, max_exemplars=8, queue_size=1000):
+        self.faces = faces
+        self.people = people
+        self.max_exemplars = max_exemplars
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self._worker, name='exemplar-indexer', daemon=True)
+        self.thread.start()
+
+    def enqueue(self, tenant, person_id, media_id, s3_key):
+        """Schedule a stored gallery photo for quality checks and indexing"""
+        try:
+            self.queue.put_nowait((tenant, person_id, media_id, s3_key))
+        except queue.Full:
+            print(f"[EXEMPLAR] Queue full, skipping {s3_key}")
+
+    def _worker(self):
+        while True:
+            tenant, person_id, media_id, s3_key = self.queue.get()
+            try:
+                self.index_exemplar(tenant, person_id, media_id, s3_key)
+            except Exception as e:
+                print(f"[EXEMPLAR] Error indexing {s3_key}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def index_exemplar(self, tenant, person_id, media_id, s3_key):
+        """Index one photo if it passes quality checks and the person is under the cap"""
+        item = self.people.get(person_id)
+        if not item or item_tenant(item) != tenant.tenant_id:
+            return None
+        exemplars = item.get('exemplars') or {}
+        if media_id in exemplars or len(exemplars) >= self.max_exemplars:
+            return None
+
+        reason = self.faces.check_quality(s3_key)
+        if reason:
+            print(f"[EXEMPLAR] Rejected {s3_key}: {reason}")
+            return None
+
+        face_id = self.faces.index(tenant, person_id, object_key=s3_key)
+        if not face_id:
+            return None
+
+        try:
+            added = self.people.add_exemplar(person_id, media_id, face_id, self.max_exemplars)
+        except Exception as e:
+            print(f"[EXEMPLAR] Error recording face for {s3_key}: {e}")
+            added = False
+        if not added:
+            # Person deleted or cap reached concurrently - don't leave an untracked face behind
+            print(f"[EXEMPLAR] Discarding face for {s3_key}")
+            self.faces.delete(tenant, [face_id])
+            return None
+
+        print(f"[EXEMPLAR] Indexed {s3_key} as face {face_id}")
+        return face_id
+
+
+def person_face_ids(person_info):
+    """All Rekognition face IDs tracked on a person record"""
+    face_ids = []
+    if person_info.get('face_id'):
+        face_ids.append(person_info['face_id'])
+    face_ids.extend((person_info.get('exemplars') or {}).values())
+    return face_ids
@@ -0,0 +1,326 @@
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+# Buffered recognitions are written at least this often, or sooner once a batch fills
+HISTORY_FLUSH_SECONDS = 2.0
+# DynamoDB batch writes take 25 items per request
+HISTORY_BATCH_SIZE = 25
+# Recognitions held while the store is unreachable; beyond this the oldest are dropped
+HISTORY_MAX_BUFFER = 10000
+# How often expired events and rollups are swept (the DynamoDB store leaves it to TTL)
+HISTORY_EXPIRE_SECONDS = 3600
+# Recognitions of one person further apart than this start a new visit
+VISIT_GAP_SECONDS = 600
+# Most events read to build a visit list; longer ranges are reported as truncated
+VISIT_QUERY_LIMIT = 5000
+# Width of the similarity histogram buckets kept in rollups
+SIMILARITY_BIN = 5
+# DynamoDB history table: partition per tenant, sort key "e#<ts>#<event_id>" for events and
+# "r#<day>#<person_id>" for rollups; the person index serves "visits by person"
+HISTORY_PERSON_INDEX = 'tenant_person-event_key-index'
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def day_of(ts_ms):
+    return datetime.fromtimestamp(ts_ms / 1000, timezone.utc).strftime('%Y-%m-%d')
+
+
+def event_key(ts_ms, event_id=''):
+    return f"e#{ts_ms:013d}#{event_id}"
+
+
+def rollup_key(day, person_id=''):
+    return f"r#{day}#{person_id}"
+
+
+def parse_time(value, default_ms):
+    """Epoch milliseconds from an ISO 8601 timestamp or epoch seconds; raises ValueError"""
+    if value in (None, ''):
+        return default_ms
+    try:
+        return int(float(value) * 1000)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def new_event(tenant_id, matched, person_id=None, similarity=None, **details):
+    """A recognition event; IDs sort by time so stores can range-scan them"""
+    ts = now_ms()
+    event = {
+        'event_id': f"{ts:013d}-{uuid.uuid4().hex[:8]}",
+        'tenant_id': tenant_id,
+        'ts': ts,
+        'at': datetime.fromtimestamp(ts / 1000, timezone.utc).isoformat(),
+        'matched': matched,
+        'person_id': person_id,
+        'similarity': round(similarity, 2) if similarity is not None else None
+    }
+    event.update({key: value for key, value in details.items() if value is not None})
+    return event
+
+
+def similarity_bin(similarity):
+    return f"b{int(min(similarity, 100) // SIMILARITY_BIN * SIMILARITY_BIN)}"
+
+
+def rollup(events, writer=None, sequence=None):
+    """Per (tenant, day, person) counts and similarity sums for a batch; unmatched faces roll up under person ''
+
+    writer and sequence identify the batch, so a store can tell a retried rollup from a new one.
+    """
+    rollups = {}
+    for event in events:
+        key = (event['tenant_id'], day_of(event['ts']), event.get('person_id') or '')
+        entry = rollups.get(key)
+        if entry is None:
+            entry = rollups[key] = {
+                'tenant_id': key[0], 'day': key[1], 'person_id': key[2],
+                'count': 0, 'similarity_sum': 0.0, 'similarity_sq': 0.0, 'bins': {},
+                'first_at': event['at'], 'last_at': event['at'], 'writer': writer, 'sequence': sequence
+            }
+        entry['count'] += 1
+        entry['first_at'] = min(entry['first_at'], event['at'])
+        entry['last_at'] = max(entry['last_at'], event['at'])
+        similarity = event.get('similarity')
+        if similarity is not None:
+            entry['similarity_sum'] += similarity
+            entry['similarity_sq'] += similarity * similarity
+            bucket = similarity_bin(similarity)
+            entry['bins'][bucket] = entry['bins'].get(bucket, 0) + 1
+    return list(rollups.values())
+
+
+def _percentile(bins, fraction):
+    """Lower edge of the histogram bucket holding the given fraction of the samples"""
+    total = sum(bins.values())
+    seen = 0
+    for bucket in sorted(bins, key=lambda name: int(name[1:])):
+        seen += bins[bucket]
+        if seen >= fraction * total:
+            return int(bucket[1:])
+    return None
+
+
+def group_visits(events, gap_seconds=VISIT_GAP_SECONDS):
+    """Collapse a person's back-to-back recognitions (ascending by time) into visits"""
+    visits = []
+    open_visits = {}
+    for event in events:
+        person_id = event.get('person_id')
+        if not person_id:
+            continue
+        visit = open_visits.get(person_id)
+        if visit is None or event['ts'] - visit['_last_ts'] > gap_seconds * 1000:
+            visit = open_visits[person_id] = {
+                'person_id': person_id, 'name': event.get('name'), 'start': event['at'], 'end': event['at'],
+                'recognitions': 0, 'max_similarity': None, '_last_ts': event['ts']
+            }
+            visits.append(visit)
+        visit['end'] = event['at']
+        visit['_last_ts'] = event['ts']
+        visit['recognitions'] += 1
+        if event.get('similarity') is not None:
+            visit['max_similarity'] = max(visit['max_similarity'] or 0, event['similarity'])
+    for visit in visits:
+        del visit['_last_ts']
+    return visits
+
+
+class RecognitionLog:
+    """Append-only recognition history, buffered in memory and written to a HistoryStore in batches
+
+    record() only appends to a deque, so the request path never waits on the store.
+    Each flush also folds the batch into per-person daily rollups, which outlive the
+    raw events and back the confidence statistics. A rollup carries this log's writer ID
+    and the flush's sequence number, and stores apply each (writer, sequence) once, so a
+    rollup that failed is retried as it was rather than recomputed into a later batch.
+    """
+
+    def __init__(self, store, raw_days=90, rollup_days=730, flush_interval=HISTORY_FLUSH_SECONDS,
+                 batch_size=HISTORY_BATCH_SIZE, max_buffer=HISTORY_MAX_BUFFER):
+        self.store = store
+        self.raw_days = raw_days
+        self.rollup_days = rollup_days
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self._pending = deque()
+        self._writing = []
+        # Rollups the store did not apply, retried ahead of newer ones for the same day and person
+        self._unapplied = []
+        self.writer_id = uuid.uuid4().hex[:12]
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._last_expire = 0.0
+        self._thread = None
+        self.counters = {'recorded': 0, 'written': 0, 'batches': 0, 'write_errors': 0, 'dropped': 0,
+                         'rollup_errors': 0, 'dropped_rollups': 0, 'expired_events': 0, 'expired_rollups': 0}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='recognition-log', daemon=True)
+            self._thread.start()
+
+    def record(self, event):
+        with self._lock:
+            self._pending.append(event)
+            self.counters['recorded'] += 1
+            while len(self._pending) > self.max_buffer:
+                self._pending.popleft()
+                self.counters['dropped'] += 1
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write everything buffered; events that could not be written go back to the front of the
+        buffer, and rollups that could not be applied are kept for the next flush"""
+        with self._flush_lock:
+            with self._lock:
+                self._writing = list(self._pending)
+                self._pending.clear()
+                retry, self._unapplied = self._unapplied, []
+            if not self._writing and not retry:
+                return 0
+            self._sequence += 1
+            rollups = retry + rollup(self._writing, self.writer_id, self._sequence)
+            try:
+                unapplied = self.store.append(self._writing, rollups)
+            except Exception as e:
+                # No rollup of this batch was applied, so its events are rolled up again when retried
+                print(f"[HISTORY] Writing {len(self._writing)} events failed, will retry: {e}")
+                with self._lock:
+                    self._pending.extendleft(reversed(self._writing))
+                    self._unapplied = retry + self._unapplied
+                    self.counters['write_errors'] += 1
+                    while len(self._pending) > self.max_buffer:
+                        self._pending.popleft()
+                        self.counters['dropped'] += 1
+                    self._writing = []
+                return 0
+            with self._lock:
+                written = len(self._writing)
+                self.counters['written'] += written
+                self.counters['batches'] += 1
+                if unapplied:
+                    print(f"[HISTORY] {len(unapplied)} rollups failed, will retry")
+                    self.counters['rollup_errors'] += 1
+                    self._unapplied = unapplied + self._unapplied
+                    while len(self._unapplied) > self.max_buffer:
+                        self._unapplied.pop(0)
+                        self.counters['dropped_rollups'] += 1
+                self._writing = []
+            return written
+
+    def expire(self):
+        """Drop raw events and rollups past their retention"""
+        cutoff = now_ms() - self.raw_days * 86400 * 1000
+        rollup_cutoff = day_of(now_ms() - self.rollup_days * 86400 * 1000)
+        events, rollups = self.store.expire(cutoff, rollup_cutoff)
+        with self._lock:
+            self.counters['expired_events'] += events
+            self.counters['expired_rollups'] += rollups
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            if time.monotonic() - self._last_expire >= HISTORY_EXPIRE_SECONDS:
+                self._last_expire = time.monotonic()
+                try:
+                    self.expire()
+                except Exception as e:
+                    print(f"[HISTORY] Expiry failed: {e}")
+
+    def _unwritten(self, tenant_id, start_ms, end_ms, person_id=None):
+        with self._lock:
+            buffered = list(self._writing) + list(self._pending)
+        return [
+            event for event in buffered
+            if event['tenant_id'] == tenant_id and start_ms <= event['ts'] < end_ms
+            and (person_id is None or event.get('person_id') == person_id)
+        ]
+
+    def events(self, tenant_id, start_ms, end_ms, person_id=None, limit=100):
+        """Recognitions in [start, end), newest first, including those not yet written"""
+        stored = self.store.query(tenant_id, start_ms, end_ms, person_id=person_id, limit=limit)
+        seen = {event['event_id'] for event in stored}
+        merged = stored + [event for event in self._unwritten(tenant_id, start_ms, end_ms, person_id)
+                           if event['event_id'] not in seen]
+        merged.sort(key=lambda event: event['event_id'], reverse=True)
+        return merged[:limit]
+
+    def visits(self, tenant_id, start_ms, end_ms, person_id=None):
+        """Visits (runs of recognitions of one person) in [start, end), newest first"""
+        events = self.events(tenant_id, start_ms, end_ms, person_id=person_id, limit=VISIT_QUERY_LIMIT)
+        visits = group_visits(list(reversed(events)))
+        return sorted(visits, key=lambda visit: visit['start'], reverse=True), len(events) >= VISIT_QUERY_LIMIT
+
+    def confidence_stats(self, tenant_id, start_ms, end_ms, person_id=None, threshold=None):
+        """Per-person match counts and similarity distribution over the days in [start, end)"""
+        start_day, end_day = day_of(start_ms), day_of(end_ms - 1)
+        rollups = self.store.rollups(tenant_id, start_day, end_day, person_id=person_id)
+        unwritten = [event for event in self._unwritten(tenant_id, 0, math.inf, person_id)
+                     if start_day <= day_of(event['ts']) <= end_day]
+        with self._lock:
+            unapplied = [entry for entry in self._unapplied
+                         if entry['tenant_id'] == tenant_id and start_day <= entry['day'] <= end_day
+                         and (person_id is None or entry['person_id'] == person_id)]
+        people = {}
+        for entry in rollups + unapplied + rollup(unwritten):
+            totals = people.setdefault(entry['person_id'], {
+                'count': 0, 'similarity_sum': 0.0, 'similarity_sq': 0.0, 'bins': {}, 'days': set(),
+                'first_at': entry['first_at'], 'last_at': entry['last_at']
+            })
+            totals['count'] += entry['count']
+            totals['similarity_sum'] += entry['similarity_sum']
+            totals['similarity_sq'] += entry['similarity_sq']
+            totals['days'].add(entry['day'])
+            totals['first_at'] = min(totals['first_at'], entry['first_at'])
+            totals['last_at'] = max(totals['last_at'], entry['last_at'])
+            for bucket, count in entry['bins'].items():
+                totals['bins'][bucket] = totals['bins'].get(bucket, 0) + count
+
+        result = {}
+        for pid, totals in people.items():
+            scored = sum(totals['bins'].values())
+            stats = {
+                'recognitions': totals['count'],
+                'days_seen': len(totals['days']),
+                'first_at': totals['first_at'],
+                'last_at': totals['last_at']
+            }
+            if scored:
+                mean = totals['similarity_sum'] / scored
+                stats.update({
+                    'mean_similarity': round(mean, 2),
+                    'stddev_similarity': round(math.sqrt(max(totals['similarity_sq'] / scored - mean * mean, 0.0)), 2),
+                    'p05_similarity': _percentile(totals['bins'], 0.05),
+                    'p50_similarity': _percentile(totals['bins'], 0.5),
+                    'histogram': dict(sorted(totals['bins'].items(), key=lambda item: int(item[0][1:])))
+                })
+                if threshold is not None:
+                    # Matches this close to the threshold would be lost by raising it a little
+                    near = sum(count for bucket, count in totals['bins'].items()
+                               if int(bucket[1:]) < threshold + SIMILARITY_BIN)
+                    stats['near_threshold_share'] = round(near / scored, 3)
+            result[pid or 'unmatched'] = stats
+        return result
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, buffered=len(self._pending))
@@ -0,0 +1,198 @@
+import io
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+
+from PIL import Image, ImageOps
+
+from media_dedup import perceptual_hash
+
+# Room left after the input in each shared block for the encoded output; larger outputs are pickled back
+OUTPUT_HEADROOM = 256 * 1024
+# Window over which pool utilization is reported
+UTILIZATION_WINDOW_SECONDS = 60
+
+
+class ImagePoolBusy(Exception):
+    """The pool's queue stayed full for longer than the caller would wait"""
+
+    def __init__(self, retry_after):
+        super().__init__('Image processing busy, retry later')
+        self.retry_after = retry_after
+
+
+def render_photo(data, max_dimension=None, exif_transpose=False, thumbnail_size=None, quality=None):
+    """Decode a photo and re-encode it as JPEG, with its dHash and an optional thumbnail
+
+    Returns {'jpeg', 'phash', 'thumb', 'width', 'height'}. Runs in a pool worker, or inline
+    when the pool is disabled.
+    """
+    image = Image.open(io.BytesIO(data))
+    if exif_transpose:
+        image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if max_dimension:
+        image.thumbnail((max_dimension, max_dimension))
+    buffer = io.BytesIO()
+    if quality:
+        image.save(buffer, format='JPEG', quality=quality)
+    else:
+        image.save(buffer, format='JPEG')
+    thumb = None
+    if thumbnail_size:
+        small = image.copy()
+        small.thumbnail((thumbnail_size, thumbnail_size))
+        thumb_buffer = io.BytesIO()
+        small.save(thumb_buffer, format='JPEG', quality=80)
+        thumb = thumb_buffer.getvalue()
+    return {
+        'jpeg': buffer.getvalue(),
+        'phash': perceptual_hash(image),
+        'thumb': thumb,
+        'width': image.width,
+        'height': image.height
+    }
+
+
+def _render_shared(name, length, options):
+    """Worker side: read the photo from a shared block, write the renditions back after it"""
+    started = time.perf_counter()
+    block = shared_memory.SharedMemory(name=name)
+    # Attaching registers the block with the resource tracker the parent shares; the parent unlinks it
+    resource_tracker.unregister(block._name, 'shared_memory')
+    try:
+        # PIL reads through a BytesIO, which would copy a memoryview anyway
+        result = render_photo(bytes(block.buf[:length]), **options)
+        offset = length
+        for field in ('jpeg', 'thumb'):
+            data = result[field]
+            if data is not None and offset + len(data) <= block.size:
+                block.buf[offset:offset + len(data)] = data
+                result[field] = (offset, len(data))
+                offset += len(data)
+    finally:
+        block.close()
+    result['cpu_seconds'] = time.perf_counter() - started
+    return result
+
+
+class ImagePool:
+    """Process pool for CPU-bound photo work: decode, resize, re-encode, hash, thumbnail
+
+    PIL holds the GIL while it works, so a few large uploads processed on request threads
+    stall every other request, /recognize included. Here they run in worker processes
+    that /recognize never uses. Photos go in and renditions come back through one shared
+    memory block per call rather than being pickled through the pool's pipes. That saves
+    the pickling and the pipe writes only; each side still copies the bytes into and out of
+    the block once, since the renditions must outlive it. The queue is bounded: callers
+    wait for a slot, up to their own timeout.
+    """
+
+    def __init__(self, workers=2, max_queue=32):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._slots = threading.BoundedSemaphore(workers + max_queue) if workers else None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._recent = deque()
+        self.counters = {'processed': 0, 'failed': 0, 'rejected': 0, 'inline': 0, 'shared_bytes': 0,
+                         'pickled_outputs': 0, 'cpu_seconds': 0.0}
+
+    def start(self):
+        """Fork the workers now, before the app starts threads: a later fork would copy locks they hold
+
+        spawn/forkserver would avoid that but re-import app.py in every worker.
+        """
+        if not self.workers or self._executor is not None:
+            return
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'))
+        for future in [self._executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def render(self, data, wait=None, **options):
+        """render_photo() in a worker process; raises ImagePoolBusy if no slot frees up within `wait` seconds"""
+        if self._executor is None:
+            with self._lock:
+                self.counters['inline'] += 1
+            return render_photo(data, **options)
+        if not self._slots.acquire(timeout=wait):
+            with self._lock:
+                self.counters['rejected'] += 1
+            raise ImagePoolBusy(self._retry_after())
+        with self._lock:
+            self._in_flight += 1
+        block = shared_memory.SharedMemory(create=True, size=2 * len(data) + OUTPUT_HEADROOM)
+        try:
+            block.buf[:len(data)] = data
+            try:
+                result = self._executor.submit(_render_shared, block.name, len(data), options).result()
+            except BrokenProcessPool as e:
+                # A worker died (e.g. out of memory on a huge image); finish this and later photos inline
+                print(f"[IMAGES] Worker pool broke, processing inline from now on: {e}")
+                self._executor = None
+                result = None
+            pickled = 0
+            for field in ('jpeg', 'thumb') if result else ():
+                if isinstance(result[field], tuple):
+                    offset, length = result[field]
+                    result[field] = bytes(block.buf[offset:offset + length])
+                elif result[field] is not None:
+                    pickled += 1
+        except Exception:
+            with self._lock:
+                self.counters['failed'] += 1
+            raise
+        finally:
+            block.close()
+            block.unlink()
+            self._slots.release()
+            with self._lock:
+                self._in_flight -= 1
+
+        if result is None:
+            return self.render(data, **options)
+        cpu_seconds = result.pop('cpu_seconds')
+        with self._lock:
+            self.counters['processed'] += 1
+            self.counters['shared_bytes'] += len(data)
+            self.counters['pickled_outputs'] += pickled
+            self.counters['cpu_seconds'] += cpu_seconds
+            now = time.monotonic()
+            self._prune(now)
+            self._recent.append((now, cpu_seconds))
+        return result
+
+    def _prune(self, now):
+        """Drop costs older than the utilization window; callers hold the lock"""
+        while self._recent and now - self._recent[0][0] > UTILIZATION_WINDOW_SECONDS:
+            self._recent.popleft()
+
+    def _retry_after(self):
+        """Rough time for the queue ahead to drain, from recent per-photo cost"""
+        with self._lock:
+            self._prune(time.monotonic())
+            recent = [cost for _, cost in self._recent]
+        per_photo = sum(recent) / len(recent) if recent else 0.5
+        return max(1.0, per_photo * (self.max_queue + self.workers) / max(self.workers, 1))
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            busy = sum(cost for _, cost in self._recent)
+            return dict(
+                self.counters,
+                cpu_seconds=round(self.counters['cpu_seconds'], 2),
+                workers=self.workers if self._executor else 0,
+                max_queue=self.max_queue,
+                in_flight=self._in_flight,
+                queued=max(0, self._in_flight - self.workers),
+                utilization=round(busy / (UTILIZATION_WINDOW_SECONDS * self.workers), 3) if self._executor else None
+            )
@@ -0,0 +1,131 @@
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Finished jobs are kept around this long so clients can read the final status
+JOB_RETENTION_SECONDS = 3600
+# Cap on per-item error entries stored on a single job
+MAX_JOB_ERRORS = 500
+
+
+class Job:
+    """Progress record for a background job"""
+
+    def __init__(self, kind, total=0, details=None):
+        self.job_id = str(uuid.uuid4())
+        self.kind = kind
+        self.status = 'queued'
+        self.total = total
+        self.processed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.errors = []
+        self.results = []
+        self.details = details or {}
+        self.created_at = datetime.utcnow().isoformat()
+        self.updated_at = self.created_at
+        self.finished_at = None
+        self._finished_monotonic = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.status = 'running'
+            self.updated_at = datetime.utcnow().isoformat()
+
+    def set_total(self, total):
+        with self._lock:
+            self.total = total
+            self.updated_at = datetime.utcnow().isoformat()
+
+    def record_success(self, result=None):
+        with self._lock:
+            self.processed += 1
+            self.succeeded += 1
+            if result is not None:
+                self.results.append(result)
+            self.updated_at = datetime.utcnow().isoformat()
+
+    def record_error(self, item, error):
+        with self._lock:
+            self.processed += 1
+            self.failed += 1
+            if len(self.errors) < MAX_JOB_ERRORS:
+                self.errors.append({'item': item, 'error': str(error)})
+            self.updated_at = datetime.utcnow().isoformat()
+
+    def note_error(self, item, error):
+        """List an error that didn't fail its item, e.g. one skipped photo of a person"""
+        with self._lock:
+            if len(self.errors) < MAX_JOB_ERRORS:
+                self.errors.append({'item': item, 'error': str(error)})
+            self.updated_at = datetime.utcnow().isoformat()
+
+    def increment_detail(self, key, amount=1):
+        with self._lock:
+            self.details[key] = self.details.get(key, 0) + amount
+            self.updated_at = datetime.utcnow().isoformat()
+
+    def finish(self, error=None):
+        with self._lock:
+            if error is not None:
+                self.status = 'failed'
+                self.details['error'] = str(error)
+            elif self.failed and not self.succeeded:
+                self.status = 'failed'
+            elif self.failed:
+                self.status = 'completed_with_errors'
+            else:
+                self.status = 'completed'
+            self.finished_at = datetime.utcnow().isoformat()
+            self.updated_at = self.finished_at
+            self._finished_monotonic = time.monotonic()
+
+    def is_expired(self, now):
+        return (self._finished_monotonic is not None
+                and now - self._finished_monotonic > JOB_RETENTION_SECONDS)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'job_id': self.job_id,
+                'kind': self.kind,
+                'status': self.status,
+                'total': self.total,
+                'processed': self.processed,
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'progress': round(self.processed / self.total, 3) if self.total else None,
+                'errors': list(self.errors),
+                'results': list(self.results),
+                'details': dict(self.details),
+                'created_at': self.created_at,
+                'updated_at': self.updated_at,
+                'finished_at': self.finished_at
+            }
+
+
+class JobRegistry:
+    """Thread-safe, in-process store of jobs keyed by job_id"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, kind, total=0, details=None):
+        job = Job(kind, total=total, details=details)
+        with self._lock:
+            self._prune()
+            self._jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self._jobs.items() if job.is_expired(now)]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,655 @@
+import hashlib
+import hmac
+import importlib
+import io
+import json
+import os
+import secrets
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import quote
+
+import numpy as np
+from PIL import Image
+
+from backends import ObjectStore, PersonStore, FaceIndex, ReminderStore, HistoryStore, Backend, NoFaceError
+from roster import RosterLog, CHANGELOG_LIMIT
+from exemplars import MIN_FACE_AREA
+from aws_scheduler import PRIORITY_LIVE
+
+# Page size for face listings, matching Rekognition's ListFaces maximum
+LIST_FACES_PAGE = 4096
+
+
+def _connect(path):
+    db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    db.execute('PRAGMA journal_mode=WAL')
+    return db
+
+
+class LocalObjectStore(ObjectStore):
+    """Content-addressed blobs on disk with a SQLite key -> digest map"""
+
+    def __init__(self, root, public_url, secret):
+        self.root = root
+        self.blob_dir = os.path.join(root, 'blobs')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.multipart_dir = os.path.join(root, 'multipart')
+        os.makedirs(self.multipart_dir, exist_ok=True)
+        self.public_url = public_url.rstrip('/')
+        self.secret = secret.encode()
+        self.db = _connect(os.path.join(root, 'objects.sqlite'))
+        self.db.execute('CREATE TABLE IF NOT EXISTS objects (key TEXT PRIMARY KEY, digest TEXT, content_type TEXT, size INTEGER)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS objects_digest ON objects (digest)')
+        self.db.commit()
+        self.lock = threading.Lock()
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _release(self, digest):
+        """Remove a blob once no key points at it (caller holds the lock)"""
+        if digest and not self.db.execute('SELECT 1 FROM objects WHERE digest = ? LIMIT 1', (digest,)).fetchone():
+            try:
+                os.remove(self._blob_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def put(self, key, data, content_type='application/octet-stream'):
+        tmp_path = os.path.join(self.blob_dir, f"{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        self._store(key, tmp_path, hashlib.sha256(data).hexdigest(), len(data), content_type)
+
+    def _store(self, key, tmp_path, digest, size, content_type):
+        """Move a written temp file into the blob store under its digest and point the key at it"""
+        path = self._blob_path(digest)
+        with self.lock:
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            row = self.db.execute('SELECT digest FROM objects WHERE key = ?', (key,)).fetchone()
+            self.db.execute('INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?)', (key, digest, content_type, size))
+            self.db.commit()
+            if row and row[0] != digest:
+                self._release(row[0])
+
+    def _upload_dir(self, key, upload_id):
+        """Directory holding an upload's parts; raises KeyError unless it was started for this key"""
+        if not upload_id.isalnum():
+            raise KeyError(upload_id)
+        path = os.path.join(self.multipart_dir, upload_id)
+        try:
+            with open(os.path.join(path, 'upload.json')) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise KeyError(upload_id)
+        if meta['key'] != key:
+            raise KeyError(upload_id)
+        return path, meta
+
+    def start_multipart(self, key, content_type='application/octet-stream'):
+        upload_id = uuid.uuid4().hex
+        path = os.path.join(self.multipart_dir, upload_id)
+        os.makedirs(path)
+        with open(os.path.join(path, 'upload.json'), 'w') as f:
+            json.dump({'key': key, 'content_type': content_type}, f)
+        return upload_id
+
+    def upload_part(self, key, upload_id, part_number, fileobj, size):
+        path, _ = self._upload_dir(key, upload_id)
+        tmp_path = os.path.join(path, f"{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(fileobj, f)
+        os.replace(tmp_path, os.path.join(path, f"part-{part_number:05d}"))
+
+    def list_parts(self, key, upload_id):
+        path, _ = self._upload_dir(key, upload_id)
+        return {
+            int(name[5:]): os.path.getsize(os.path.join(path, name))
+            for name in os.listdir(path) if name.startswith('part-')
+        }
+
+    def complete_multipart(self, key, upload_id):
+        path, meta = self._upload_dir(key, upload_id)
+        parts = sorted(self.list_parts(key, upload_id))
+        tmp_path = os.path.join(self.blob_dir, f"{uuid.uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        size = 0
+        with open(tmp_path, 'wb') as out:
+            for part_number in parts:
+                with open(os.path.join(path, f"part-{part_number:05d}"), 'rb') as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(block)
+                        out.write(block)
+                        size += len(block)
+        self._store(key, tmp_path, digest.hexdigest(), size, meta['content_type'])
+        shutil.rmtree(path, ignore_errors=True)
+        return size
+
+    def abort_multipart(self, key, upload_id):
+        try:
+            path, _ = self._upload_dir(key, upload_id)
+        except KeyError:
+            return
+        shutil.rmtree(path, ignore_errors=True)
+
+    def open(self, key):
+        """(blob path, content type) for a key, or None"""
+        with self.lock:
+            row = self.db.execute('SELECT digest, content_type FROM objects WHERE key = ?', (key,)).fetchone()
+        if not row:
+            return None
+        return self._blob_path(row[0]), row[1]
+
+    def get(self, key):
+        found = self.open(key)
+        if not found:
+            return None
+        with open(found[0], 'rb') as f:
+            return f.read()
+
+    def delete(self, key):
+        self.delete_many([key])
+
+    def delete_many(self, keys):
+        with self.lock:
+            digests = set()
+            for key in keys:
+                row = self.db.execute('SELECT digest FROM objects WHERE key = ?', (key,)).fetchone()
+                if row:
+                    digests.add(row[0])
+                    self.db.execute('DELETE FROM objects WHERE key = ?', (key,))
+            self.db.commit()
+            for digest in digests:
+                self._release(digest)
+
+    def list_pages(self, prefix='', page_size=1000):
+        last = None
+        while True:
+            with self.lock:
+                if last is None:
+                    rows = self.db.execute(
+                        'SELECT key FROM objects WHERE substr(key, 1, ?) = ? ORDER BY key LIMIT ?',
+                        (len(prefix), prefix, page_size)
+                    ).fetchall()
+                else:
+                    rows = self.db.execute(
+                        'SELECT key FROM objects WHERE substr(key, 1, ?) = ? AND key > ? ORDER BY key LIMIT ?',
+                        (len(prefix), prefix, last, page_size)
+                    ).fetchall()
+            if not rows:
+                return
+            yield [row[0] for row in rows]
+            last = rows[-1][0]
+
+    def _signature(self, key, expires, method='GET'):
+        message = f"{key}:{expires}" if method == 'GET' else f"{method}:{key}:{expires}"
+        return hmac.new(self.secret, message.encode(), hashlib.sha256).hexdigest()
+
+    def url(self, key, expires_in=3600):
+        expires = int(time.time()) + expires_in
+        return f"{self.public_url}/local-objects/{quote(key)}?expires={expires}&signature={self._signature(key, expires)}"
+
+    def verify(self, key, expires, signature, method='GET'):
+        """Check a URL produced by url() or upload_target() hasn't expired or been tampered with"""
+        try:
+            expires = int(expires)
+        except (TypeError, ValueError):
+            return False
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self._signature(key, expires, method), signature or '')
+
+    def head(self, key):
+        with self.lock:
+            row = self.db.execute('SELECT size, content_type FROM objects WHERE key = ?', (key,)).fetchone()
+        return {'size': row[0], 'content_type': row[1]} if row else None
+
+    def upload_target(self, key, content_type, max_bytes, expires_in=900):
+        # Served by the API's /local-objects route, which checks the signature and max_bytes
+        expires = int(time.time()) + expires_in
+        return {
+            'method': 'PUT',
+            'url': f"{self.public_url}/local-objects/{quote(key)}?expires={expires}&signature={self._signature(key, expires, 'PUT')}",
+            'fields': {},
+            'headers': {'Content-Type': content_type}
+        }
+
+
+class LocalPersonStore(RosterLog, PersonStore):
+    """Person records and the roster changelog in SQLite; every write is one local transaction"""
+
+    def __init__(self, path):
+        self.db = _connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS people (person_id TEXT PRIMARY KEY, tenant_id TEXT, created_at TEXT, item TEXT);
+            CREATE INDEX IF NOT EXISTS people_owner ON people (tenant_id, created_at);
+            CREATE TABLE IF NOT EXISTS roster (tenant_id TEXT PRIMARY KEY, version INTEGER, floor INTEGER);
+            CREATE TABLE IF NOT EXISTS roster_changes (
+                tenant_id TEXT, person_id TEXT, version INTEGER, deleted INTEGER,
+                PRIMARY KEY (tenant_id, person_id)
+            );
+        ''')
+        self.db.commit()
+        self.lock = threading.RLock()
+
+    def _load(self, person_id):
+        row = self.db.execute('SELECT item FROM people WHERE person_id = ?', (person_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, item):
+        self.db.execute(
+            'INSERT OR REPLACE INTO people VALUES (?, ?, ?, ?)',
+            (item['person_id'], item.get('tenant_id'), item.get('created_at'), json.dumps(item, default=str))
+        )
+
+    def get(self, person_id):
+        with self.lock:
+            return self._load(person_id)
+
+    def query(self, tenant):
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT item FROM people WHERE tenant_id = ? ORDER BY created_at', (tenant.tenant_id,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_people(self, person_ids):
+        people = {}
+        with self.lock:
+            for person_id in person_ids:
+                item = self._load(person_id)
+                if item:
+                    people[person_id] = item
+        return people
+
+    def read(self, tenant):
+        with self.lock:
+            row = self.db.execute('SELECT version, floor FROM roster WHERE tenant_id = ?', (tenant.tenant_id,)).fetchone()
+        return {
+            'tenant': tenant,
+            'version': row[0] if row else 0,
+            'floor': row[1] if row else 0,
+            'exists': bool(row)
+        }
+
+    def _changes(self, meta, first_version):
+        # One row per person, so versions whose changes were all superseded have no row
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT person_id, version, deleted FROM roster_changes WHERE tenant_id = ? AND version >= ? AND version <= ? '
+                'ORDER BY version', (meta['tenant'].tenant_id, first_version, meta['version'])
+            ).fetchall()
+        changes = {}
+        for person_id, version, deleted in rows:
+            changes.setdefault(version, {'version': version, 'changes': []})['changes'].append(
+                {'person_id': person_id, 'deleted': bool(deleted)})
+        return list(changes.values())
+
+    def _bump(self, tenant, changed, deleted=False):
+        """Advance the tenant's roster version and log the changed person IDs (caller holds the lock)"""
+        row = self.db.execute('SELECT version, floor FROM roster WHERE tenant_id = ?', (tenant.tenant_id,)).fetchone()
+        version, floor = (row[0] + 1, row[1]) if row else (1, 0)
+        for person_id in changed:
+            self.db.execute('INSERT OR REPLACE INTO roster_changes VALUES (?, ?, ?, ?)',
+                            (tenant.tenant_id, person_id, version, int(deleted)))
+        if version - CHANGELOG_LIMIT > floor:
+            floor = version - CHANGELOG_LIMIT
+            self.db.execute('DELETE FROM roster_changes WHERE tenant_id = ? AND version <= ?', (tenant.tenant_id, floor))
+        self.db.execute('INSERT OR REPLACE INTO roster VALUES (?, ?, ?)', (tenant.tenant_id, version, floor))
+        return version
+
+    def put_people(self, tenant, items):
+        with self.lock, self.db:
+            version = self._bump(tenant, [item['person_id'] for item in items])
+            for item in items:
+                self._save(dict(item, roster_version=version))
+        return version
+
+    def update_person(self, tenant, person_id, fields):
+        with self.lock, self.db:
+            item = self._load(person_id)
+            if item is None:
+                raise LookupError(f"Person {person_id} not found")
+            version = self._bump(tenant, [person_id])
+            item.update(fields, roster_version=version)
+            self._save(item)
+        return version
+
+    def delete_person(self, tenant, person_id):
+        with self.lock, self.db:
+            version = self._bump(tenant, [person_id], deleted=True)
+            self.db.execute('DELETE FROM people WHERE person_id = ?', (person_id,))
+        return version
+
+    def add_exemplar(self, person_id, media_id, face_id, cap):
+        with self.lock, self.db:
+            item = self._load(person_id)
+            if item is None:
+                return False
+            exemplars = item.setdefault('exemplars', {})
+            if len(exemplars) >= cap:
+                return False
+            exemplars[media_id] = face_id
+            self._save(item)
+        return True
+
+    def remove_exemplar(self, person_id, media_id):
+        with self.lock, self.db:
+            item = self._load(person_id)
+            if item and media_id in (item.get('exemplars') or {}):
+                del item['exemplars'][media_id]
+                self._save(item)
+
+    def claim_media(self, person_id, digest, media_id, phash=None):
+        with self.lock, self.db:
+            item = self._load(person_id)
+            if item is None:
+                raise LookupError(f"Person {person_id} not found")
+            hashes = item.setdefault('media_hashes', {})
+            if digest in hashes:
+                return hashes[digest]
+            hashes[digest] = media_id
+            if phash:
+                item.setdefault('media_phashes', {})[media_id] = phash
+            self._save(item)
+        return None
+
+    def release_media(self, person_id, media_id):
+        with self.lock, self.db:
+            item = self._load(person_id)
+            if item is None:
+                return
+            hashes = item.get('media_hashes') or {}
+            item['media_hashes'] = {digest: mapped for digest, mapped in hashes.items() if mapped != media_id}
+            (item.get('media_phashes') or {}).pop(media_id, None)
+            self._save(item)
+
+
+class LocalReminderStore(ReminderStore):
+    """Reminders as JSON rows in SQLite"""
+
+    def __init__(self, path):
+        self.db = _connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS reminders (tenant_id TEXT, reminder_id TEXT, item TEXT, PRIMARY KEY (tenant_id, reminder_id))')
+        self.db.commit()
+        self.lock = threading.Lock()
+
+    def load_all(self):
+        with self.lock:
+            rows = self.db.execute('SELECT item FROM reminders').fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def put(self, reminder):
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO reminders VALUES (?, ?, ?)',
+                            (reminder['tenant_id'], reminder['reminder_id'], json.dumps(reminder)))
+
+    def delete(self, tenant_id, reminder_id):
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM reminders WHERE tenant_id = ? AND reminder_id = ?', (tenant_id, reminder_id))
+
+
+class LocalHistoryStore(HistoryStore):
+    """Recognition events and daily rollups in SQLite, indexed by time and by person"""
+
+    def __init__(self, path):
+        self.db = _connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS events (event_id TEXT PRIMARY KEY, tenant_id TEXT, ts INTEGER, person_id TEXT, item TEXT);
+            CREATE INDEX IF NOT EXISTS events_time ON events (tenant_id, ts);
+            CREATE INDEX IF NOT EXISTS events_person ON events (tenant_id, person_id, ts);
+            CREATE TABLE IF NOT EXISTS rollups (
+                tenant_id TEXT, day TEXT, person_id TEXT, item TEXT, PRIMARY KEY (tenant_id, day, person_id)
+            );
+        ''')
+        self.db.commit()
+        self.lock = threading.Lock()
+
+    def append(self, events, rollups):
+        with self.lock, self.db:
+            self.db.executemany('INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?, ?)', [
+                (event['event_id'], event['tenant_id'], event['ts'], event.get('person_id'), json.dumps(event))
+                for event in events
+            ])
+            for entry in rollups:
+                key = (entry['tenant_id'], entry['day'], entry['person_id'])
+                writer, sequence = entry['writer'], entry['sequence']
+                row = self.db.execute('SELECT item FROM rollups WHERE tenant_id = ? AND day = ? AND person_id = ?', key).fetchone()
+                if row:
+                    stored = json.loads(row[0])
+                    if stored.setdefault('applied', {}).get(writer, 0) >= sequence:
+                        continue
+                    for field in ('count', 'similarity_sum', 'similarity_sq'):
+                        stored[field] += entry[field]
+                    for bucket, count in entry['bins'].items():
+                        stored['bins'][bucket] = stored['bins'].get(bucket, 0) + count
+                    stored['first_at'] = min(stored['first_at'], entry['first_at'])
+                    stored['last_at'] = max(stored['last_at'], entry['last_at'])
+                else:
+                    stored = {field: value for field, value in entry.items() if field not in ('writer', 'sequence')}
+                    stored['applied'] = {}
+                # Same (writer, sequence) bookkeeping as the DynamoDB store, so a retried rollup counts once
+                stored['applied'][writer] = sequence
+                self.db.execute('INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?)', key + (json.dumps(stored),))
+        return []
+
+    def query(self, tenant_id, start_ms, end_ms, person_id=None, limit=100):
+        sql = 'SELECT item FROM events WHERE tenant_id = ? AND ts >= ? AND ts < ?'
+        params = [tenant_id, start_ms, end_ms]
+        if person_id is not None:
+            sql += ' AND person_id = ?'
+            params.append(person_id)
+        with self.lock:
+            rows = self.db.execute(sql + ' ORDER BY ts DESC, event_id DESC LIMIT ?', params + [limit]).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def rollups(self, tenant_id, start_day, end_day, person_id=None):
+        sql = 'SELECT item FROM rollups WHERE tenant_id = ? AND day >= ? AND day <= ?'
+        params = [tenant_id, start_day, end_day]
+        if person_id is not None:
+            sql += ' AND person_id = ?'
+            params.append(person_id)
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def expire(self, before_ms, before_day):
+        with self.lock, self.db:
+            events = self.db.execute('DELETE FROM events WHERE ts < ?', (before_ms,)).rowcount
+            rollups = self.db.execute('DELETE FROM rollups WHERE day < ?', (before_day,)).rowcount
+        return events, rollups
+
+
+class _TenantFaces:
+    """In-memory unit-vector matrix for one tenant; rows grow by doubling"""
+
+    def __init__(self, dimensions):
+        self.face_ids = []
+        self.person_ids = []
+        self.matrix = np.zeros((16, dimensions), dtype=np.float32)
+
+    def add(self, face_id, person_id, vector):
+        count = len(self.face_ids)
+        if count == len(self.matrix):
+            self.matrix = np.concatenate([self.matrix, np.zeros_like(self.matrix)])
+        self.matrix[count] = vector
+        self.face_ids.append(face_id)
+        self.person_ids.append(person_id)
+
+    def remove(self, face_ids):
+        keep = [i for i, face_id in enumerate(self.face_ids) if face_id not in face_ids]
+        self.matrix[:len(keep)] = self.matrix[keep]
+        self.face_ids = [self.face_ids[i] for i in keep]
+        self.person_ids = [self.person_ids[i] for i in keep]
+
+    def best(self, vector):
+        count = len(self.face_ids)
+        if not count:
+            return None
+        scores = self.matrix[:count] @ vector
+        index = int(np.argmax(scores))
+        return index, float(scores[index])
+
+
+class LocalFaceIndex(FaceIndex):
+    """Cosine-similarity search over embedder vectors, persisted in SQLite and served from memory"""
+
+    def __init__(self, path, objects, embedder):
+        self.objects = objects
+        self.embedder = embedder
+        # Embedders calibrated differently from Rekognition's similarity scale set their own cut-off
+        self.match_threshold = getattr(embedder, 'match_threshold', None)
+        self.db = _connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS faces (face_id TEXT PRIMARY KEY, tenant_id TEXT, person_id TEXT, embedding BLOB)')
+        self.db.commit()
+        self.lock = threading.RLock()
+        self.tenants = {}
+        self.searches = 0
+        for face_id, tenant_id, person_id, blob in self.db.execute('SELECT face_id, tenant_id, person_id, embedding FROM faces'):
+            vector = np.frombuffer(blob, dtype=np.float32)
+            self._tenant_faces(tenant_id, len(vector)).add(face_id, person_id, vector)
+
+    def _tenant_faces(self, tenant_id, dimensions):
+        faces = self.tenants.get(tenant_id)
+        if faces is None:
+            faces = self.tenants[tenant_id] = _TenantFaces(dimensions)
+        return faces
+
+    def _largest_face(self, image_bytes):
+        faces = self.embedder.embed(image_bytes)
+        if not faces:
+            return None
+        vector, _ = max(faces, key=lambda face: face[1][2] * face[1][3])
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def search(self, tenant, image_bytes, threshold=70):
+        vector = self._largest_face(image_bytes)
+        if vector is None:
+            raise NoFaceError('No face detected in the image')
+        with self.lock:
+            self.searches += 1
+            faces = self.tenants.get(tenant.tenant_id)
+            best = faces.best(vector) if faces else None
+            if best is None:
+                return []
+            index, score = best
+            similarity = max(score, 0.0) * 100
+            if similarity < (self.match_threshold or threshold):
+                return []
+            return [{'person_id': faces.person_ids[index], 'face_id': faces.face_ids[index], 'similarity': similarity}]
+
+    def index(self, tenant, person_id, image_bytes=None, object_key=None):
+        if object_key:
+            image_bytes = self.objects.get(object_key)
+            if image_bytes is None:
+                return None
+        vector = self._largest_face(image_bytes)
+        if vector is None:
+            return None
+        face_id = str(uuid.uuid4())
+        with self.lock:
+            self.db.execute('INSERT INTO faces VALUES (?, ?, ?, ?)', (face_id, tenant.tenant_id, person_id, vector.tobytes()))
+            self.db.commit()
+            self._tenant_faces(tenant.tenant_id, len(vector)).add(face_id, person_id, vector)
+        return face_id
+
+    def check_quality(self, object_key):
+        image_bytes = self.objects.get(object_key)
+        if image_bytes is None:
+            return 'photo missing'
+        faces = self.embedder.embed(image_bytes)
+        if len(faces) != 1:
+            return f'expected exactly one face, found {len(faces)}'
+        _, (_, _, width, height) = faces[0]
+        if width * height < MIN_FACE_AREA:
+            return 'face too small'
+        return None
+
+    def delete(self, tenant, face_ids):
+        face_ids = set(face_ids)
+        if not face_ids:
+            return
+        with self.lock:
+            self.db.executemany('DELETE FROM faces WHERE face_id = ?', [(face_id,) for face_id in face_ids])
+            self.db.commit()
+            faces = self.tenants.get(tenant.tenant_id)
+            if faces:
+                faces.remove(face_ids)
+
+    def list_pages(self, tenant):
+        with self.lock:
+            faces = self.tenants.get(tenant.tenant_id)
+            entries = list(zip(faces.face_ids, faces.person_ids)) if faces else []
+        for start in range(0, len(entries), LIST_FACES_PAGE):
+            yield entries[start:start + LIST_FACES_PAGE]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'faces': {tenant_id: len(faces.face_ids) for tenant_id, faces in self.tenants.items()},
+                'searches': self.searches
+            }
+
+
+class FaceRecognitionEmbedder:
+    """dlib's 128-d face encodings via the optional `face_recognition` package"""
+
+    # dlib's recommended 0.6 Euclidean distance for unit-length encodings, as percent cosine
+    match_threshold = 82
+
+    def __init__(self):
+        try:
+            self.face_recognition = importlib.import_module('face_recognition')
+        except ImportError:
+            raise RuntimeError('The local backend needs an embedder: pip install face_recognition, '
+                               'or set LOCAL_EMBEDDER=module:factory')
+
+    def embed(self, image_bytes):
+        """[(vector, (left, top, width, height) as fractions of the frame)] for each face"""
+        image = np.array(Image.open(io.BytesIO(image_bytes)).convert('RGB'))
+        frame_height, frame_width = image.shape[:2]
+        locations = self.face_recognition.face_locations(image)
+        encodings = self.face_recognition.face_encodings(image, locations)
+        return [
+            (encoding, (left / frame_width, top / frame_height,
+                        (right - left) / frame_width, (bottom - top) / frame_height))
+            for encoding, (top, right, bottom, left) in zip(encodings, locations)
+        ]
+
+
+def load_embedder(spec):
+    """`module:factory` returning an object with embed(image_bytes); empty uses face_recognition"""
+    if not spec:
+        return FaceRecognitionEmbedder()
+    module_name, _, factory = spec.partition(':')
+    return getattr(importlib.import_module(module_name), factory or 'create_embedder')()
+
+
+def create(config):
+    """Files, SQLite and an in-process vector index under LOCAL_DATA_DIR; no network access needed"""
+    root = config['local_dir']
+    os.makedirs(root, exist_ok=True)
+    secret = config.get('media_secret')
+    if not secret:
+        secret = secrets.token_hex(32)
+        print("[LOCAL] LOCAL_MEDIA_SECRET not set; media URLs won't survive a restart")
+
+    objects = LocalObjectStore(root, config['public_url'], secret)
+    faces = LocalFaceIndex(os.path.join(root, 'faces.sqlite'), objects, load_embedder(config.get('embedder')))
+    return Backend(
+        'local',
+        objects=objects,
+        people=LocalPersonStore(os.path.join(root, 'people.sqlite')),
+        face_indexes={PRIORITY_LIVE: faces},
+        reminders=LocalReminderStore(os.path.join(root, 'reminders.sqlite')),
+        history=LocalHistoryStore(os.path.join(root, 'history.sqlite')),
+        stats=lambda: {'local_index': faces.stats()}
+    )
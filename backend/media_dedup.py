@@ -0,0 +1,57 @@
+import hashlib
+
+from admission import frame_fingerprint
+
+
+def content_digest(data):
+    """SHA-256 of the uploaded bytes, the exact-duplicate key"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def perceptual_hash(image):
+    """dHash of a PIL image as 16 hex digits; re-encodes and resizes of a photo land within a few bits"""
+    return f"{frame_fingerprint(image):016x}"
+
+
+def hash_distance(a, b):
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+class MediaDeduplicator:
+    """Per-person index of uploaded photo hashes, kept on the person record"""
+
+    def __init__(self, people, perceptual_distance=None):
+        self.people = people
+        # Max dHash bit distance treated as the same photo; None only dedups exact copies
+        self.perceptual_distance = perceptual_distance
+        self.duplicates = 0
+
+    def find(self, person_info, digest, phash=None):
+        """Media ID the person already has for this photo, or None"""
+        media_id = (person_info.get('media_hashes') or {}).get(digest)
+        if media_id is None and phash and self.perceptual_distance is not None:
+            for existing_id, existing_hash in (person_info.get('media_phashes') or {}).items():
+                if hash_distance(phash, existing_hash) <= self.perceptual_distance:
+                    media_id = existing_id
+                    break
+        if media_id is not None:
+            self.duplicates += 1
+        return media_id
+
+    def claim(self, person_id, digest, media_id, phash=None):
+        """Reserve the digest for a new media ID; returns the winner's media ID if another upload got there first"""
+        existing = self.people.claim_media(person_id, digest, media_id, phash)
+        if existing is not None:
+            self.duplicates += 1
+        return existing
+
+    def release(self, person_id, media_id):
+        """Forget the hashes of a deleted (or never stored) photo"""
+        self.people.release_media(person_id, media_id)
+
+    @staticmethod
+    def initial_hashes(digest, media_id, phash=None):
+        """Hash attributes for a record created together with its first photo"""
+        fields = {'media_hashes': {digest: media_id}}
+        fields['media_phashes'] = {media_id: phash} if phash else {}
+        return fields
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from admission import SingleFlight
+
+# Folder for synthesized phrase segments, inside a tenant's prefix or a person's folder
+PHRASE_CACHE_PREFIX = 'tts-cache/'
+
+# Layer III bitrates (kbps) by bitrate index, for MPEG-1 and for MPEG-2/2.5
+_BITRATES = {
+    3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def announcement_segments(name, relationship, age, tenant_folder='', person_folder=''):
+    """The recognition announcement split at its reusable parts, as (cache folder, text) pairs
+
+    Names change per person; relationship and age phrases repeat across people, so
+    after a warm-up a new person only needs the "This is <name>," segment synthesized.
+    The name segment is cached in the person's folder so deleting them removes it; the
+    shared phrases live in the tenant's prefix and go with the tenant.
+    """
+    return [(person_folder, f"This is {name},"), (tenant_folder, f"your {relationship},"), (tenant_folder, f"age {age}.")]
+
+
+def _strip_tags(data):
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        data = data[10 + size + footer:]
+    if len(data) >= 128 and data[-128:-125] == b'TAG':
+        data = data[:-128]
+    return data
+
+
+def mp3_frames(data):
+    """MPEG Layer III audio frames of an MP3 file, without ID3 tags or a Xing/Info header frame
+
+    Returns (frames bytes, (version, sample rate, channel mode)); raises ValueError on
+    anything that isn't a plain Layer III stream, since such files can't be stitched.
+    """
+    data = _strip_tags(data)
+    frames = []
+    stream_format = None
+    pos = 0
+    while pos + 4 <= len(data):
+        b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+        if data[pos] != 0xFF or b1 & 0xE0 != 0xE0:
+            raise ValueError(f"Lost MP3 frame sync at byte {pos}")
+        version = (b1 >> 3) & 3
+        layer = (b1 >> 1) & 3
+        bitrate_index = b2 >> 4
+        rate_index = (b2 >> 2) & 3
+        if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            raise ValueError('Only constant-format MPEG Layer III streams can be stitched')
+        sample_rate = _SAMPLE_RATES[version][rate_index]
+        bitrate = _BITRATES[3 if version == 3 else 2][bitrate_index] * 1000
+        length = (144 if version == 3 else 72) * bitrate // sample_rate + ((b2 >> 1) & 1)
+        frame = data[pos:pos + length]
+        pos += length
+        if len(frame) < length:
+            break  # Truncated trailing frame
+
+        frame_format = (version, sample_rate, b3 >> 6)
+        if stream_format is None:
+            stream_format = frame_format
+            # A leading Xing/Info/VBRI frame holds the file's frame count; it would be wrong once stitched
+            if b'Xing' in frame[:64] or b'Info' in frame[:64] or frame[36:40] == b'VBRI':
+                continue
+        elif frame_format != stream_format:
+            raise ValueError('MP3 stream changes format mid-file')
+        frames.append(frame)
+    if not frames:
+        raise ValueError('No MP3 frames found')
+    return b''.join(frames), stream_format
+
+
+class PhraseAudioCache:
+    """Synthesized phrase segments cached in memory and in the object store, stitched frame by frame"""
+
+    def __init__(self, synthesize, objects, voice_config, memory_items=512):
+        # synthesize(text, profile) -> MP3 bytes or None; every segment must use the same voice settings
+        self.synthesize = synthesize
+        self.objects = objects
+        self.voice_digest = hashlib.sha256(json.dumps(voice_config, sort_keys=True).encode()).hexdigest()[:12]
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # Concurrent requests for one unseen segment (e.g. a new person in view of two cameras) synthesize it once
+        self._flight = SingleFlight()
+        self.counters = {'memory_hits': 0, 'store_hits': 0, 'synthesized': 0, 'stitched': 0, 'fallbacks': 0}
+
+    def _key(self, folder, text, profile):
+        digest = hashlib.sha256(text.encode()).hexdigest()[:24]
+        return f"{folder}{PHRASE_CACHE_PREFIX}{self.voice_digest}/{profile.name}/{digest}.mp3"
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _remember(self, key, segment):
+        with self._lock:
+            self._memory[key] = segment
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _load(self, key, text, profile):
+        stored = self.objects.get(key)
+        if stored:
+            self._count('store_hits')
+            segment = mp3_frames(stored)
+        else:
+            audio = self.synthesize(text, profile)
+            if not audio:
+                return None
+            segment = mp3_frames(audio)
+            self._count('synthesized')
+            self.objects.put(key, segment[0], profile.content_type)
+        self._remember(key, segment)
+        return segment
+
+    def segment(self, folder, text, profile):
+        """(frames, format) for one phrase in an audio profile, or None if it couldn't be synthesized"""
+        key = self._key(folder, text, profile)
+        with self._lock:
+            segment = self._memory.get(key)
+            if segment is not None:
+                self._memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return segment
+        segment, _ = self._flight.do(key, lambda: self._load(key, text, profile))
+        return segment
+
+    def stitch(self, phrases, profile):
+        """MP3 bytes for the (cache folder, text) phrases spoken in order, or None if any segment is unavailable"""
+        try:
+            segments = [self.segment(folder, text, profile) for folder, text in phrases]
+            if any(segment is None for segment in segments):
+                raise ValueError('Segment synthesis failed')
+            if len({stream_format for _, stream_format in segments}) != 1:
+                raise ValueError('Segments were synthesized in different formats')
+        except Exception as e:
+            print(f"[TTS] Phrase stitching unavailable, synthesizing in full: {e}")
+            self._count('fallbacks')
+            return None
+        self._count('stitched')
+        return b''.join(frames for frames, _ in segments)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, memory_items=len(self._memory))
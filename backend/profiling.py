@@ -0,0 +1,252 @@
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+
+# Request header that forces a profile; its value must be the profiling token
+PROFILE_HEADER = 'X-Profile'
+# Modes: deterministic cProfile, or a stack sampler whose overhead doesn't grow with call count
+PROFILE_MODES = ('cprofile', 'sample')
+# Stack sampling period in seconds
+SAMPLE_INTERVAL = 0.005
+# Functions listed in each profile's metadata, by cumulative time
+SUMMARY_FUNCTIONS = 15
+# Profile names are generated here; anything else asked for by name is refused
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]{8}T[0-9]{6}-[a-z_]+-[0-9a-f]{12}$')
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """One background thread sampling the stacks of the threads registered with it
+
+    Sampled requests cost one dict lookup per tick, and requests that aren't sampled
+    cost nothing, so it can stay enabled at a low rate in production.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stacks = {}
+        self._thread = None
+
+    def start(self, thread_id):
+        with self._lock:
+            self._stacks[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id):
+        """Collapsed stacks ("outer;inner" -> samples) recorded for a thread"""
+        with self._lock:
+            return self._stacks.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._stacks:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, stacks in self._stacks.items():
+                    frame = frames.get(thread_id)
+                    names = []
+                    while frame is not None:
+                        names.append(_frame_name(frame))
+                        frame = frame.f_back
+                    if names:
+                        stacks[';'.join(reversed(names))] += 1
+
+
+class RequestProfiler:
+    """Profiles a sample of requests, or those sent with the profiling header, into a directory
+
+    Each profile is a data file (pstats dump for cProfile, collapsed stacks for the
+    sampler, both readable by snakeviz/speedscope) and a JSON file of request metadata.
+    """
+
+    def __init__(self, directory, sample_rate=0.0, token=None, mode='sample', max_profiles=200,
+                 min_duration=0.0):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}, expected one of {', '.join(PROFILE_MODES)}")
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.token = token
+        self.mode = mode
+        self.max_profiles = max_profiles
+        # Sampled requests faster than this are dropped instead of written; forced ones are always kept
+        self.min_duration = min_duration
+        self.sampler = StackSampler()
+        # cProfile hooks the interpreter, and only one can be active at a time on 3.12+
+        self._cprofile_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.counters = {'profiled': 0, 'written': 0, 'skipped_busy': 0, 'denied': 0}
+        os.makedirs(directory, exist_ok=True)
+        # Stored profile IDs, oldest first, read from disk once so pruning doesn't list the directory
+        stored = [name[:-len('.json')] for name in os.listdir(directory) if name.endswith('.json')]
+        self._stored = deque(sorted((profile_id for profile_id in stored if PROFILE_ID_PATTERN.match(profile_id)),
+                                    key=lambda profile_id: os.path.getmtime(os.path.join(directory, profile_id + '.json'))))
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or bool(self.token)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _forced(self, request):
+        """Whether the request carries the profiling header with the right token"""
+        value = request.headers.get(PROFILE_HEADER)
+        if not value:
+            return False
+        if self.authorized(value):
+            return True
+        self._count('denied')
+        return False
+
+    def start(self, request):
+        """Begin profiling this request if it's forced or sampled; returns a handle for finish() or None"""
+        forced = self._forced(request)
+        if not forced and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            return None
+        mode = request.headers.get('X-Profile-Mode', self.mode) if forced else self.mode
+        if mode not in PROFILE_MODES:
+            mode = self.mode
+        handle = {
+            'id': f"{datetime.utcnow():%Y%m%dT%H%M%S}-{mode}-{uuid.uuid4().hex[:12]}",
+            'mode': mode,
+            'forced': forced,
+            'started': time.perf_counter(),
+            'started_at': datetime.utcnow().isoformat()
+        }
+        if mode == 'cprofile':
+            if not self._cprofile_lock.acquire(blocking=False):
+                self._count('skipped_busy')
+                return None
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler (a debugger, coverage) already owns the hook
+                self._cprofile_lock.release()
+                self._count('skipped_busy')
+                return None
+            handle['profile'] = profile
+        else:
+            handle['thread_id'] = threading.get_ident()
+            self.sampler.start(handle['thread_id'])
+        self._count('profiled')
+        return handle
+
+    def finish(self, handle, metadata):
+        """Stop profiling and write the profile with the request metadata; returns the profile ID or None"""
+        duration = time.perf_counter() - handle['started']
+        if handle['mode'] == 'cprofile':
+            profile = handle['profile']
+            profile.disable()
+            self._cprofile_lock.release()
+        else:
+            stacks = self.sampler.stop(handle['thread_id'])
+        if not handle['forced'] and duration < self.min_duration:
+            return None
+
+        metadata = dict(metadata, id=handle['id'], mode=handle['mode'], forced=handle['forced'],
+                        started_at=handle['started_at'], duration_ms=round(duration * 1000, 1))
+        base = os.path.join(self.directory, handle['id'])
+        if handle['mode'] == 'cprofile':
+            profile.dump_stats(base + '.prof')
+            metadata['top'] = self._summarize_cprofile(profile)
+        else:
+            with open(base + '.txt', 'w') as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+            metadata['samples'] = sum(stacks.values())
+            metadata['top'] = self._summarize_stacks(stacks)
+        with open(base + '.json', 'w') as f:
+            json.dump(metadata, f, indent=2, default=str)
+        self._count('written')
+        self._prune(handle['id'])
+        return handle['id']
+
+    def _summarize_cprofile(self, profile):
+        stats = pstats.Stats(profile, stream=io.StringIO())
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:SUMMARY_FUNCTIONS]
+        return [
+            {'function': f"{name} ({os.path.basename(filename)}:{line})", 'calls': calls,
+             'self_ms': round(self_time * 1000, 2), 'cumulative_ms': round(cumulative * 1000, 2)}
+            for (filename, line, name), (_, calls, self_time, cumulative, _) in rows
+        ]
+
+    def _summarize_stacks(self, stacks):
+        """Share of samples each function appears in, like cumulative time"""
+        total = sum(stacks.values())
+        inclusive = Counter()
+        for stack, count in stacks.items():
+            for name in set(stack.split(';')):
+                inclusive[name] += count
+        return [
+            {'function': name, 'samples': count, 'share': round(count / total, 3)}
+            for name, count in inclusive.most_common(SUMMARY_FUNCTIONS)
+        ]
+
+    def _prune(self, profile_id):
+        """Record a written profile and delete the oldest ones beyond max_profiles"""
+        with self._lock:
+            self._stored.append(profile_id)
+            stale = [self._stored.popleft() for _ in range(len(self._stored) - self.max_profiles)]
+        for stale_id in stale:
+            for path in self._files(stale_id):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _files(self, profile_id):
+        base = os.path.join(self.directory, profile_id)
+        return [base + suffix for suffix in ('.json', '.prof', '.txt') if os.path.exists(base + suffix)]
+
+    def list(self):
+        """Metadata of the stored profiles, newest first"""
+        profiles = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(profiles, key=lambda profile: profile['started_at'], reverse=True)
+
+    def data_path(self, profile_id):
+        """Path of a profile's data file, or None if there is no such profile"""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        for suffix in ('.prof', '.txt'):
+            path = os.path.join(self.directory, profile_id + suffix)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def authorized(self, token):
+        """Whether a supplied token grants access to the stored profiles"""
+        # compare_digest refuses non-ASCII str, which a client can put in the header
+        return bool(self.token and token) and hmac.compare_digest(token.encode(), self.token.encode())
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, sample_rate=self.sample_rate, mode=self.mode)
@@ -0,0 +1,290 @@
+import os
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from boto3.dynamodb.conditions import Key
+from tenants import OWNER_INDEX_NAME, DEFAULT_TENANT
+from roster import RosterLog
+from reminders import REMINDER_AUDIO_FOLDER
+from phrase_audio import PHRASE_CACHE_PREFIX
+
+# Rekognition DeleteFaces accepts at most 4096 IDs; S3 DeleteObjects at most 1000 keys
+DELETE_FACES_BATCH = 4096
+DELETE_OBJECTS_BATCH = 1000
+# Rows pulled from the spill database per membership check
+LOOKUP_CHUNK = 500
+# Top-level S3 prefixes that don't hold per-person media for the default tenant
+RESERVED_S3_PREFIXES = ('tenants/',)
+# Folders inside every tenant's prefix that aren't person folders
+TENANT_SHARED_PREFIXES = (f"{REMINDER_AUDIO_FOLDER}/", PHRASE_CACHE_PREFIX)
+
+
+class _SpillStore:
+    """Disk-backed ID sets so memory stays flat no matter how large the stores are"""
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(prefix='reconcile-', suffix='.sqlite')
+        os.close(fd)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute('CREATE TABLE faces (face_id TEXT PRIMARY KEY, person_id TEXT)')
+        self.db.execute('CREATE TABLE people (person_id TEXT PRIMARY KEY)')
+
+    def add_faces(self, faces):
+        self.db.executemany('INSERT OR IGNORE INTO faces VALUES (?, ?)', faces)
+
+    def add_people(self, person_ids):
+        self.db.executemany('INSERT OR IGNORE INTO people VALUES (?)', [(pid,) for pid in person_ids])
+
+    def _existing(self, table, column, values):
+        found = set()
+        values = list(values)
+        for start in range(0, len(values), LOOKUP_CHUNK):
+            chunk = values[start:start + LOOKUP_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.db.execute(f'SELECT {column} FROM {table} WHERE {column} IN ({placeholders})', chunk)
+            found.update(row[0] for row in rows)
+        return found
+
+    def existing_faces(self, face_ids):
+        return self._existing('faces', 'face_id', face_ids)
+
+    def existing_people(self, person_ids):
+        return self._existing('people', 'person_id', person_ids)
+
+    def iter_faces(self, chunk_size=LOOKUP_CHUNK):
+        last = ''
+        while True:
+            rows = self.db.execute(
+                'SELECT face_id, person_id FROM faces WHERE face_id > ? ORDER BY face_id LIMIT ?',
+                (last, chunk_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield rows
+            last = rows[-1][0]
+
+    def close(self):
+        self.db.close()
+        os.remove(self.path)
+
+
+class Reconciler:
+    """Cross-checks S3, DynamoDB and the Rekognition collection for one tenant and repairs drift"""
+
+    def __init__(self, rekognition, s3, table, bucket_name, tenant,
+                 person_prefix='', dry_run=True, workers=8):
+        self.rekognition = rekognition
+        self.s3 = s3
+        self.table = table
+        self.roster = RosterLog(table)
+        self.bucket_name = bucket_name
+        self.tenant = tenant
+        self.person_prefix = person_prefix or ''
+        self.dry_run = dry_run
+        self.workers = workers
+        self.stats = {
+            'faces_scanned': 0,
+            'items_scanned': 0,
+            's3_objects_scanned': 0,
+            'orphan_faces': 0,
+            'orphan_s3_objects': 0,
+            'items_missing_face': 0,
+            'items_repaired': 0,
+            'items_unrepairable': 0,
+            'stale_exemplars': 0,
+            'errors': 0
+        }
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def run(self):
+        store = _SpillStore()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='reconcile')
+        self._pending = set()
+        try:
+            self._load_faces(store)
+            self._check_items(store, executor)
+            self._drain()
+            self._delete_orphan_faces(store, executor)
+            self._delete_orphan_objects(store, executor)
+            self._drain()
+        finally:
+            executor.shutdown(wait=True)
+            store.close()
+        return self.stats
+
+    # Bounded submission keeps at most a couple of batches per worker in memory
+    def _submit(self, executor, fn, *args):
+        while len(self._pending) >= self.workers * 2:
+            done, self._pending = wait(self._pending, return_when=FIRST_COMPLETED)
+            self._collect(done)
+        self._pending.add(executor.submit(fn, *args))
+
+    def _drain(self):
+        self._collect(wait(self._pending).done)
+        self._pending = set()
+
+    def _collect(self, futures):
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                self._count('errors')
+                print(f"❌ {e}")
+
+    def _confirm_missing(self, person_ids):
+        """Re-check orphan candidates against the table itself (owner index lag, un-backfilled items)"""
+        found = self.roster.get_people(sorted(person_ids))
+        return set(person_ids) - set(found)
+
+    def _in_scope(self, person_id):
+        return person_id.startswith(self.person_prefix)
+
+    def _load_faces(self, store):
+        paginator = self.rekognition.get_paginator('list_faces')
+        for page in paginator.paginate(CollectionId=self.tenant.collection_id, PaginationConfig={'PageSize': 4096}):
+            faces = [(face['FaceId'], face.get('ExternalImageId', '')) for face in page.get('Faces', [])]
+            store.add_faces(faces)
+            self._count('faces_scanned', len(faces))
+        store.db.commit()
+        print(f"Indexed {self.stats['faces_scanned']} faces from {self.tenant.collection_id}")
+
+    def _iter_item_pages(self):
+        query_kwargs = {
+            'IndexName': OWNER_INDEX_NAME,
+            'KeyConditionExpression': Key('tenant_id').eq(self.tenant.tenant_id),
+            'ProjectionExpression': 'person_id, face_id, exemplars, s3_key'
+        }
+        while True:
+            response = self.table.query(**query_kwargs)
+            yield response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                return
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def _check_items(self, store, executor):
+        for items in self._iter_item_pages():
+            items = [item for item in items if self._in_scope(item['person_id'])]
+            self._count('items_scanned', len(items))
+            store.add_people(item['person_id'] for item in items)
+
+            referenced = set()
+            for item in items:
+                if item.get('face_id'):
+                    referenced.add(item['face_id'])
+                referenced.update((item.get('exemplars') or {}).values())
+            live_faces = store.existing_faces(referenced)
+
+            for item in items:
+                exemplars = item.get('exemplars') or {}
+                stale = [media_id for media_id, face_id in exemplars.items() if face_id not in live_faces]
+                face_missing = item.get('face_id') not in live_faces
+                if stale or face_missing:
+                    self._submit(executor, self._repair_item, item, live_faces, stale, face_missing)
+        store.db.commit()
+
+    def _repair_item(self, item, live_faces, stale, face_missing):
+        person_id = item['person_id']
+        self._count('stale_exemplars', len(stale))
+        if stale:
+            print(f"{'Would drop' if self.dry_run else 'Dropping'} {len(stale)} stale exemplars on {person_id}")
+            if not self.dry_run:
+                self.table.update_item(
+                    Key={'person_id': person_id},
+                    UpdateExpression='REMOVE ' + ', '.join(f'exemplars.#m{i}' for i in range(len(stale))),
+                    ExpressionAttributeNames={f'#m{i}': media_id for i, media_id in enumerate(stale)}
+                )
+        if not face_missing:
+            return
+
+        self._count('items_missing_face')
+        exemplars = item.get('exemplars') or {}
+        promotable = [(media_id, face_id) for media_id, face_id in exemplars.items() if face_id in live_faces]
+        if promotable:
+            media_id, face_id = promotable[0]
+            print(f"{'Would promote' if self.dry_run else 'Promoting'} exemplar {face_id} to primary face of {person_id}")
+            if not self.dry_run:
+                self.table.update_item(
+                    Key={'person_id': person_id},
+                    UpdateExpression='SET face_id = :face_id REMOVE exemplars.#m',
+                    ExpressionAttributeNames={'#m': media_id},
+                    ExpressionAttributeValues={':face_id': face_id}
+                )
+            self._count('items_repaired')
+            return
+
+        if not item.get('s3_key'):
+            print(f"⚠️  {person_id} has no face and no profile photo to re-index")
+            self._count('items_unrepairable')
+            return
+
+        print(f"{'Would re-index' if self.dry_run else 'Re-indexing'} {person_id} from {item['s3_key']}")
+        if self.dry_run:
+            self._count('items_repaired')
+            return
+        response = self.rekognition.index_faces(
+            CollectionId=self.tenant.collection_id,
+            Image={'S3Object': {'Bucket': self.bucket_name, 'Name': item['s3_key']}},
+            ExternalImageId=person_id,
+            MaxFaces=1
+        )
+        if not response['FaceRecords']:
+            print(f"⚠️  No face found in {item['s3_key']} for {person_id}")
+            self._count('items_unrepairable')
+            return
+        self.table.update_item(
+            Key={'person_id': person_id},
+            UpdateExpression='SET face_id = :face_id',
+            ExpressionAttributeValues={':face_id': response['FaceRecords'][0]['Face']['FaceId']}
+        )
+        self._count('items_repaired')
+
+    def _delete_orphan_faces(self, store, executor):
+        batch = []
+        for rows in store.iter_faces():
+            rows = [(face_id, person_id) for face_id, person_id in rows if self._in_scope(person_id)]
+            candidates = {person_id for _, person_id in rows} - store.existing_people({person_id for _, person_id in rows})
+            missing = self._confirm_missing(candidates) if candidates else set()
+            batch.extend(face_id for face_id, person_id in rows if person_id in missing)
+            while len(batch) >= DELETE_FACES_BATCH:
+                self._submit(executor, self._delete_faces, batch[:DELETE_FACES_BATCH])
+                batch = batch[DELETE_FACES_BATCH:]
+        if batch:
+            self._submit(executor, self._delete_faces, batch)
+
+    def _delete_faces(self, face_ids):
+        self._count('orphan_faces', len(face_ids))
+        print(f"{'Would delete' if self.dry_run else 'Deleting'} {len(face_ids)} orphan faces")
+        if not self.dry_run:
+            self.rekognition.delete_faces(CollectionId=self.tenant.collection_id, FaceIds=face_ids)
+
+    def _delete_orphan_objects(self, store, executor):
+        prefix = self.tenant.s3_prefix + self.person_prefix
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            keys = []
+            for obj in page.get('Contents', []):
+                relative = obj['Key'][len(self.tenant.s3_prefix):]
+                if self.tenant.tenant_id == DEFAULT_TENANT and relative.startswith(RESERVED_S3_PREFIXES):
+                    continue
+                if relative.startswith(TENANT_SHARED_PREFIXES):
+                    continue
+                keys.append((obj['Key'], relative.split('/', 1)[0]))
+            self._count('s3_objects_scanned', len(keys))
+
+            candidates = {person_id for _, person_id in keys} - store.existing_people({person_id for _, person_id in keys})
+            missing = self._confirm_missing(candidates) if candidates else set()
+            orphans = [key for key, person_id in keys if person_id in missing]
+            for start in range(0, len(orphans), DELETE_OBJECTS_BATCH):
+                self._submit(executor, self._delete_objects, orphans[start:start + DELETE_OBJECTS_BATCH])
+
+    def _delete_objects(self, keys):
+        self._count('orphan_s3_objects', len(keys))
+        print(f"{'Would delete' if self.dry_run else 'Deleting'} {len(keys)} orphan S3 objects")
+        if not self.dry_run:
+            self.s3.delete_objects(Bucket=self.bucket_name, Delete={'Objects': [{'Key': key} for key in keys]})
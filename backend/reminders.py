@@ -1,28 +1,298 @@
-from flask import jsonify
-import boto3
-from datetime import datetime, timedelta
-import os
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.getenv('DYNAMODB_TABLE_NAME', 'alzheimer-persons'))
+# DynamoDB key prefix for reminder items; like the roster meta item they have no
+# created_at, so they never show up in the owner index
+REMINDER_ITEM_PREFIX = '__reminder__#'
+# Reminder items carry item_type, so this sparse index on the person table holds only them
+REMINDER_INDEX_NAME = 'item_type-person_id-index'
+REMINDER_ITEM_TYPE = 'reminder'
+# Folder (under the tenant's prefix) holding pre-rendered reminder audio
+REMINDER_AUDIO_FOLDER = 'reminders'
+# Days between occurrences for repeating reminders
+REPEAT_DAYS = {'daily': 1, 'weekly': 7}
+# Audio is rendered this long before a reminder is due
+PRERENDER_LEAD_SECONDS = 600
+# Reminders missed by less than this (e.g. across a restart) are still delivered, marked late
+LATE_GRACE_SECONDS = 900
+# Deliveries this far behind schedule are flagged late
+LATE_THRESHOLD_SECONDS = 60
+# How long delivery waits for audio that is still rendering before sending text only
+RENDER_WAIT_SECONDS = 10
 
-@app.route('/reminders', methods=['GET'])
-def get_reminders():
-    """Get all people as reminders"""
+_FIRE = 'fire'
+_RENDER = 'render'
+
+
+def reminder_item_key(tenant_id, reminder_id):
+    return f"{REMINDER_ITEM_PREFIX}{tenant_id}#{reminder_id}"
+
+
+def is_reminder_item(person_id):
+    return person_id.startswith(REMINDER_ITEM_PREFIX)
+
+
+def _zone(name):
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone: {name}")
+
+
+def fire_time(reminder):
+    """Epoch seconds of a reminder's next occurrence; fire_at is wall-clock time in its zone"""
+    wall = datetime.fromisoformat(reminder['fire_at'])
+    return wall.replace(tzinfo=_zone(reminder['timezone'])).timestamp()
+
+
+def advance(reminder, after):
+    """Copy of a repeating reminder moved to its first occurrence after `after`, or None for one-shots"""
+    days = REPEAT_DAYS.get(reminder.get('repeat'))
+    if not days:
+        return None
+    wall = datetime.fromisoformat(reminder['fire_at'])
+    # Step in wall-clock time so "9:00 daily" stays at 9:00 across DST changes
+    nxt = dict(reminder)
+    while True:
+        wall += timedelta(days=days)
+        nxt['fire_at'] = wall.isoformat()
+        if fire_time(nxt) > after:
+            return nxt
+
+
+def new_reminder(tenant_id, text, fire_at, tz='UTC', repeat=None, person_id=None):
+    """Validated reminder record; fire_at is ISO 8601, either local to `tz` or with an offset"""
+    text = (text or '').strip()
+    if not text:
+        raise ValueError('Reminder text is required')
+    if repeat not in (None, *REPEAT_DAYS):
+        raise ValueError(f"repeat must be one of {', '.join(REPEAT_DAYS)}")
+    zone = _zone(tz)
     try:
-        response = table.scan()
-        people = response.get('Items', [])
-        
-        reminders = []
-        for person in people:
-            reminders.append({
-                'name': person.get('name'),
-                'relationship': person.get('relationship'),
-                'age': person.get('age'),
-                'notes': person.get('notes'),
-                'added_date': person.get('created_at')
-            })
-        
-        return jsonify({'reminders': reminders})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        wall = datetime.fromisoformat(fire_at)
+    except (TypeError, ValueError):
+        raise ValueError('fire_at must be an ISO 8601 date and time')
+    if wall.tzinfo is not None:
+        wall = wall.astimezone(zone).replace(tzinfo=None)
+    return {
+        'reminder_id': str(uuid.uuid4()),
+        'tenant_id': tenant_id,
+        'text': text,
+        'person_id': person_id,
+        'fire_at': wall.isoformat(timespec='seconds'),
+        'timezone': tz,
+        'repeat': repeat,
+        'added_at': datetime.now(timezone.utc).isoformat()
+    }
+
+
+class ReminderScheduler:
+    """Min-heap of pending reminder occurrences driven by a single timer thread
+
+    Every reminder is held in memory and written through to the store, so the
+    store is only read once at startup. Heap entries are never removed in place;
+    an entry is skipped when its reminder was cancelled or rescheduled since.
+    """
+
+    def __init__(self, store, render, deliver, prerender_lead=PRERENDER_LEAD_SECONDS,
+                 late_grace=LATE_GRACE_SECONDS, render_workers=2, deliver_workers=4):
+        self.store = store
+        # render(reminder) -> stored audio key or None; deliver(reminder, audio_key, late)
+        self.render = render
+        self.deliver = deliver
+        self.prerender_lead = prerender_lead
+        self.late_grace = late_grace
+        self._reminders = {}
+        self._by_tenant = {}
+        self._heap = []
+        self._stale = 0
+        self._seq = itertools.count()
+        self._audio = {}
+        self._cond = threading.Condition()
+        # TTS calls can take seconds; keep them off the delivery path
+        self._render_pool = ThreadPoolExecutor(max_workers=render_workers, thread_name_prefix='reminder-render')
+        self._deliver_pool = ThreadPoolExecutor(max_workers=deliver_workers, thread_name_prefix='reminder-deliver')
+        self._thread = None
+        self.counters = {'fired': 0, 'late': 0, 'missed': 0, 'rendered': 0, 'render_failures': 0, 'delivery_failures': 0}
+        self._lag_total = 0.0
+        self._lag_max = 0.0
+
+    def start(self):
+        """Load stored reminders and start the timer thread"""
+        now = time.time()
+        loaded = 0
+        for reminder in self.store.load_all():
+            reminder = self._catch_up(reminder, now)
+            if reminder:
+                with self._cond:
+                    self._add(reminder)
+                loaded += 1
+        print(f"[REMINDERS] Loaded {loaded} pending reminders")
+        self._thread = threading.Thread(target=self._run, name='reminder-timer', daemon=True)
+        self._thread.start()
+
+    def _catch_up(self, reminder, now):
+        """Skip occurrences missed beyond the grace period while the server was down"""
+        if fire_time(reminder) >= now - self.late_grace:
+            return reminder
+        self.counters['missed'] += 1
+        nxt = advance(reminder, now)
+        if nxt:
+            print(f"[REMINDERS] Missed {reminder['reminder_id']} at {reminder['fire_at']}, next at {nxt['fire_at']}")
+            self.store.put(nxt)
+        else:
+            print(f"[REMINDERS] Missed one-off {reminder['reminder_id']} at {reminder['fire_at']}, dropping")
+            self.store.delete(reminder['tenant_id'], reminder['reminder_id'])
+        return nxt
+
+    def _push(self, due, kind, reminder):
+        heapq.heappush(self._heap, (due, next(self._seq), kind, reminder['reminder_id'], reminder['fire_at']))
+
+    def _add(self, reminder):
+        """Track a reminder and queue its render and fire entries (caller holds the lock)"""
+        reminder_id = reminder['reminder_id']
+        self._reminders[reminder_id] = reminder
+        self._by_tenant.setdefault(reminder['tenant_id'], set()).add(reminder_id)
+        due = fire_time(reminder)
+        if reminder_id not in self._audio:
+            self._push(due - self.prerender_lead, _RENDER, reminder)
+        self._push(due, _FIRE, reminder)
+        if self._heap[0][3] == reminder_id:
+            self._cond.notify()
+
+    def _current(self, entry):
+        """The reminder a heap entry was queued for, or None if it has changed since"""
+        reminder = self._reminders.get(entry[3])
+        if reminder is None or reminder['fire_at'] != entry[4]:
+            return None
+        return reminder
+
+    def _compact(self):
+        """Rebuild the heap without stale entries once they make up most of it"""
+        if self._stale > len(self._heap) // 2 and self._stale > 64:
+            self._heap = [entry for entry in self._heap if self._current(entry)]
+            heapq.heapify(self._heap)
+            self._stale = 0
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.time():
+                    self._cond.wait(self._heap[0][0] - time.time() if self._heap else None)
+                entry = heapq.heappop(self._heap)
+                reminder = self._current(entry)
+                if reminder is None:
+                    self._stale = max(0, self._stale - 1)
+                    continue
+                audio = self._render_async(reminder)
+                if entry[2] == _RENDER:
+                    continue
+                nxt = advance(reminder, time.time())
+                if nxt:
+                    self._add(nxt)
+                else:
+                    self._remove(reminder)
+                self._compact()
+            self._deliver_pool.submit(self._fire, reminder, nxt, entry[0], audio)
+
+    def _render_async(self, reminder):
+        """Start rendering a reminder's audio unless it already is (caller holds the lock)"""
+        future = self._audio.get(reminder['reminder_id'])
+        if future is None:
+            future = self._render_pool.submit(self._render, reminder)
+            self._audio[reminder['reminder_id']] = future
+        return future
+
+    def _render(self, reminder):
+        try:
+            audio_key = self.render(reminder)
+        except Exception as e:
+            print(f"[REMINDERS] Render failed for {reminder['reminder_id']}: {e}")
+            audio_key = None
+        with self._cond:
+            self.counters['rendered' if audio_key else 'render_failures'] += 1
+            if not audio_key:
+                # Let the fire entry try again rather than caching the failure
+                self._audio.pop(reminder['reminder_id'], None)
+        return audio_key
+
+    def _fire(self, reminder, nxt, due, audio):
+        lag = max(0.0, time.time() - due)
+        late = lag > LATE_THRESHOLD_SECONDS
+        try:
+            audio_key = audio.result(timeout=RENDER_WAIT_SECONDS)
+        except Exception:
+            audio_key = None
+        try:
+            self.deliver(reminder, audio_key, late)
+        except Exception as e:
+            print(f"[REMINDERS] Delivery failed for {reminder['reminder_id']}: {e}")
+            with self._cond:
+                self.counters['delivery_failures'] += 1
+        with self._cond:
+            self.counters['fired'] += 1
+            self.counters['late'] += int(late)
+            self._lag_total += lag
+            self._lag_max = max(self._lag_max, lag)
+            # Skip the write if the reminder was cancelled or replaced meanwhile
+            if nxt and self._reminders.get(nxt['reminder_id']) is not nxt:
+                return
+        if nxt:
+            self.store.put(nxt)
+        else:
+            self.store.delete(reminder['tenant_id'], reminder['reminder_id'])
+
+    def _remove(self, reminder):
+        """Forget a reminder (caller holds the lock); its heap entries go stale"""
+        reminder_id = reminder['reminder_id']
+        self._reminders.pop(reminder_id, None)
+        self._audio.pop(reminder_id, None)
+        tenant_ids = self._by_tenant.get(reminder['tenant_id'])
+        if tenant_ids:
+            tenant_ids.discard(reminder_id)
+            if not tenant_ids:
+                del self._by_tenant[reminder['tenant_id']]
+
+    def add(self, reminder):
+        """Persist and schedule a reminder from new_reminder(); returns the stored record"""
+        if fire_time(reminder) < time.time() - self.late_grace:
+            reminder = advance(reminder, time.time())
+            if reminder is None:
+                raise ValueError('fire_at is in the past')
+        self.store.put(reminder)
+        with self._cond:
+            self._add(reminder)
+        return reminder
+
+    def cancel(self, tenant_id, reminder_id):
+        with self._cond:
+            reminder = self._reminders.get(reminder_id)
+            if not reminder or reminder['tenant_id'] != tenant_id:
+                return False
+            self._remove(reminder)
+            self._stale += 2
+        self.store.delete(tenant_id, reminder_id)
+        return True
+
+    def list(self, tenant_id):
+        """A tenant's pending reminders, soonest first"""
+        with self._cond:
+            reminders = [self._reminders[reminder_id] for reminder_id in self._by_tenant.get(tenant_id, ())]
+        return sorted(reminders, key=fire_time)
+
+    def stats(self):
+        with self._cond:
+            fired = self.counters['fired']
+            return dict(
+                self.counters,
+                pending=len(self._reminders),
+                heap_size=len(self._heap),
+                avg_lag_ms=round(self._lag_total / fired * 1000, 1) if fired else 0.0,
+                max_lag_ms=round(self._lag_max * 1000, 1)
+            )
@@ -0,0 +1,179 @@
+import random
+import time
+
+# Per-tenant meta item holding only the roster version, plus one changelog item
+# per version under "<meta key>#<version>"; none has created_at, so they never
+# show up in the owner index
+ROSTER_META_PREFIX = '__roster__#'
+# Changelog versions kept per tenant; older `since` values get a full response
+CHANGELOG_LIMIT = 1000
+# Full responses re-read this many recent changes with strong consistency to
+# cover owner-index replication lag
+RECENT_OVERLAY = 25
+MAX_COMMIT_ATTEMPTS = 6
+# DynamoDB BatchGetItem accepts at most 100 keys per call
+BATCH_GET_SIZE = 100
+
+
+class RosterBusyError(Exception):
+    """Raised when a roster write keeps losing the version race"""
+
+
+def is_roster_meta(person_id):
+    return person_id.startswith(ROSTER_META_PREFIX)
+
+
+class RosterLog:
+    """Versioned changelog of a tenant's roster, written atomically with the person items"""
+
+    def __init__(self, table):
+        self.table = table
+        self.client = table.meta.client
+
+    def meta_key(self, tenant):
+        return {'person_id': f"{ROSTER_META_PREFIX}{tenant.tenant_id}"}
+
+    def change_key(self, tenant, version):
+        return {'person_id': f"{ROSTER_META_PREFIX}{tenant.tenant_id}#{version}"}
+
+    def etag(self, tenant, version):
+        return f"roster-{tenant.tenant_id}-{version}"
+
+    def read(self, tenant):
+        """Current version and changelog floor for a tenant (strongly consistent)"""
+        item = self.table.get_item(Key=self.meta_key(tenant), ConsistentRead=True).get('Item') or {}
+        version = int(item.get('version', 0))
+        return {
+            'tenant': tenant,
+            'version': version,
+            # A meta item still holding the old inline changelog has no change items yet
+            'floor': version if 'changes' in item else int(item.get('floor', 0)),
+            'exists': bool(item)
+        }
+
+    def _changes(self, meta, first_version):
+        """Change items for versions first_version..version, oldest first; None if one is gone"""
+        keys = [self.change_key(meta['tenant'], v) for v in range(first_version, meta['version'] + 1)]
+        found = self.get_people([key['person_id'] for key in keys])
+        if len(found) < len(keys):
+            return None
+        return [found[key['person_id']] for key in keys]
+
+    def changes_since(self, meta, since):
+        """(changed ids, deleted ids) after `since`, or None if the changelog no longer covers it"""
+        if since < meta['floor'] or since > meta['version']:
+            return None
+        changes = self._changes(meta, since + 1)
+        if changes is None:
+            return None
+        # A newer change to a person supersedes older ones
+        latest = {}
+        for change in changes:
+            for entry in change['changes']:
+                latest.pop(entry['person_id'], None)
+                latest[entry['person_id']] = bool(entry.get('deleted'))
+        changed = [person_id for person_id, deleted in latest.items() if not deleted]
+        deleted = [person_id for person_id, deleted in latest.items() if deleted]
+        return changed, deleted
+
+    def recent_person_ids(self, meta, limit=RECENT_OVERLAY):
+        person_ids = []
+        changes = self._changes(meta, max(meta['floor'] + 1, meta['version'] - limit + 1)) or []
+        for change in reversed(changes):
+            for entry in change['changes']:
+                if entry['person_id'] not in person_ids:
+                    person_ids.append(entry['person_id'])
+        return person_ids[:limit]
+
+    def get_people(self, person_ids):
+        """Strongly consistent batch read of person items, keyed by person_id"""
+        people = {}
+        table_name = self.table.name
+        for start in range(0, len(person_ids), BATCH_GET_SIZE):
+            request = {table_name: {
+                'Keys': [{'person_id': pid} for pid in person_ids[start:start + BATCH_GET_SIZE]],
+                'ConsistentRead': True
+            }}
+            while request:
+                response = self.client.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(table_name, []):
+                    people[item['person_id']] = item
+                request = response.get('UnprocessedKeys') or None
+        return people
+
+    def put_person(self, tenant, item):
+        return self.put_people(tenant, [item])
+
+    def put_people(self, tenant, items):
+        """Create or replace person items in one transaction"""
+        def build(item):
+            return lambda version: {'Put': {
+                'TableName': self.table.name,
+                'Item': dict(item, roster_version=version)
+            }}
+        return self._commit(tenant, [(item['person_id'], build(item), False) for item in items])
+
+    def update_person(self, tenant, person_id, fields):
+        """SET the given attributes on an existing person item"""
+        def build(version):
+            names, values, assignments = {}, {':roster_version': version}, []
+            for i, (field, value) in enumerate(fields.items()):
+                names[f'#f{i}'] = field
+                values[f':f{i}'] = value
+                assignments.append(f'#f{i} = :f{i}')
+            assignments.append('roster_version = :roster_version')
+            return {'Update': {
+                'TableName': self.table.name,
+                'Key': {'person_id': person_id},
+                'UpdateExpression': 'SET ' + ', '.join(assignments),
+                'ConditionExpression': 'attribute_exists(person_id)',
+                'ExpressionAttributeNames': names,
+                'ExpressionAttributeValues': values
+            }}
+        return self._commit(tenant, [(person_id, build, False)])
+
+    def delete_person(self, tenant, person_id):
+        """Delete a person item and leave a tombstone in the changelog"""
+        def build(version):
+            return {'Delete': {'TableName': self.table.name, 'Key': {'person_id': person_id}}}
+        return self._commit(tenant, [(person_id, build, True)])
+
+    def _commit(self, tenant, writes):
+        """Apply item writes, the version bump and its change item atomically, retrying on concurrent bumps"""
+        for attempt in range(MAX_COMMIT_ATTEMPTS):
+            meta = self.read(tenant)
+            version = meta['version'] + 1
+            floor = max(meta['floor'], version - CHANGELOG_LIMIT)
+
+            meta_update = {
+                'TableName': self.table.name,
+                'Key': self.meta_key(tenant),
+                'UpdateExpression': 'SET version = :version, floor = :floor REMOVE changes',
+                'ExpressionAttributeValues': {':version': version, ':floor': floor}
+            }
+            if meta['exists']:
+                meta_update['ConditionExpression'] = 'version = :expected'
+                meta_update['ExpressionAttributeValues'][':expected'] = meta['version']
+            else:
+                meta_update['ConditionExpression'] = 'attribute_not_exists(person_id)'
+            change_put = {'Put': {
+                'TableName': self.table.name,
+                'Item': dict(self.change_key(tenant, version), version=version, changes=[
+                    {'person_id': person_id, 'deleted': deleted} for person_id, _, deleted in writes
+                ])
+            }}
+
+            transact_items = [{'Update': meta_update}, change_put] + [build(version) for _, build, _ in writes]
+            if floor > meta['floor'] and floor > 0:
+                # The version that just fell below the floor
+                transact_items.append({'Delete': {'TableName': self.table.name, 'Key': self.change_key(tenant, floor)}})
+            try:
+                self.client.transact_write_items(TransactItems=transact_items)
+                return version
+            except self.client.exceptions.TransactionCanceledException as e:
+                reasons = e.response.get('CancellationReasons', [])
+                lost_race = bool(reasons) and reasons[0].get('Code') in ('ConditionalCheckFailed', 'TransactionConflict')
+                if not lost_race:
+                    raise
+                time.sleep(random.uniform(0, 0.05 * (2 ** attempt)))
+        raise RosterBusyError('Roster is busy, please retry')
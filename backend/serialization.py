@@ -0,0 +1,176 @@
+import gzip
+import hashlib
+
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+# Optional encoders, used when installed (pip install orjson msgpack cbor2 brotli)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+CBOR_MIMETYPE = 'application/cbor'
+# Response bodies smaller than this aren't worth a compression pass
+COMPRESS_MIN_BYTES = 1024
+# Fast settings: most of the size win for a fraction of the CPU of the maximum levels
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+# Bodies that compress well; audio, images and profiles are sent as they are
+COMPRESSIBLE_MIMETYPES = (JSON_MIMETYPE, MSGPACK_MIMETYPE, CBOR_MIMETYPE, 'text/plain', 'text/csv')
+
+
+def body_mimetypes():
+    """Response encodings this process can produce, JSON first so it wins ties"""
+    mimetypes = [JSON_MIMETYPE]
+    if msgpack:
+        mimetypes.append(MSGPACK_MIMETYPE)
+    if cbor2:
+        mimetypes.append(CBOR_MIMETYPE)
+    return mimetypes
+
+
+def content_encodings():
+    return ['br', 'gzip'] if brotli else ['gzip']
+
+
+def negotiate_mimetype(req):
+    return req.accept_mimetypes.best_match(body_mimetypes(), default=JSON_MIMETYPE)
+
+
+def negotiate_encoding(req):
+    """'br', 'gzip' or None (identity) from the request's Accept-Encoding"""
+    return req.accept_encodings.best_match(content_encodings())
+
+
+def parse_fields(value):
+    """Field tree from "name,person.name,capture": {'name': {}, 'person': {'name': {}}, 'capture': {}}"""
+    tree = {}
+    for path in (value or '').split(','):
+        node = tree
+        for part in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(part, {})
+    return tree
+
+
+def select(value, tree):
+    """Keep only the fields in the tree; an empty subtree keeps the whole value"""
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [select(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: select(value[key], subtree) if subtree else value[key]
+                for key, subtree in tree.items() if key in value}
+    return value
+
+
+def apply_fields(payload, tree):
+    """Sparse fieldset for a response body
+
+    On responses holding lists (reminders, media, history) the fields pick from each
+    list item and the envelope (version, cursors) is left alone; other responses are
+    filtered directly. Error bodies are never filtered.
+    """
+    if not tree or not isinstance(payload, dict) or 'error' in payload:
+        return payload
+    if any(isinstance(value, list) for value in payload.values()):
+        return {key: select(value, tree) if isinstance(value, list) else value for key, value in payload.items()}
+    return select(payload, tree)
+
+
+def representation_etag(etag, req):
+    """Entity tag for the variant this request gets, so caches never serve one variant for another"""
+    fields = req.args.get('fields')
+    variant = (
+        ','.join(sorted(filter(None, (path.strip() for path in fields.split(','))))) if fields else '',
+        negotiate_mimetype(req),
+        negotiate_encoding(req) or '',
+        # A delta and the full roster share a version but not a body
+        req.args.get('since', '')
+    )
+    if variant == ('', JSON_MIMETYPE, '', ''):
+        return etag
+    return f"{etag}-{hashlib.sha1('|'.join(variant).encode()).hexdigest()[:8]}"
+
+
+class ResponseSerializer(DefaultJSONProvider):
+    """JSON provider behind every jsonify() call: ?fields= selection, then JSON, MessagePack or CBOR
+
+    Key order is kept as the route built it rather than sorted, and orjson does the
+    encoding when it's installed; both cut serialization time on the list endpoints.
+    """
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson and not kwargs:
+            try:
+                return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def _json_bytes(self, obj):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return (self.dumps(obj, indent=2) + '\n').encode()
+        if orjson:
+            try:
+                return orjson.dumps(obj, default=self.default,
+                                    option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+            except TypeError:
+                pass
+        return (self.dumps(obj, separators=(',', ':')) + '\n').encode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        mimetype = JSON_MIMETYPE
+        if has_request_context():
+            obj = apply_fields(obj, parse_fields(request.args.get('fields')))
+            mimetype = negotiate_mimetype(request)
+
+        if mimetype == MSGPACK_MIMETYPE:
+            body = msgpack.packb(obj, default=self.default)
+        elif mimetype == CBOR_MIMETYPE:
+            body = cbor2.dumps(obj, default=lambda encoder, value: encoder.encode(self.default(value)))
+        else:
+            body = self._json_bytes(obj)
+        response = self._app.response_class(body, mimetype=mimetype)
+        if len(body_mimetypes()) > 1:
+            response.vary.add('Accept')
+        return response
+
+
+def compress_response(response, req):
+    """gzip or brotli a serialized body when the client accepts it; streams and files are left alone"""
+    if (response.direct_passthrough or response.is_streamed or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers or not 200 <= response.status_code < 300):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(req)
+    body = response.get_data()
+    if not encoding or len(body) < COMPRESS_MIN_BYTES:
+        return response
+    if encoding == 'br':
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -1,6 +1,62 @@
 import boto3
 import os
+import time
+import argparse
 from dotenv import load_dotenv
+from tenants import collection_id_for, tenant_id_arg, OWNER_INDEX_NAME
+from history import HISTORY_PERSON_INDEX
+from reminders import REMINDER_INDEX_NAME, REMINDER_ITEM_PREFIX, REMINDER_ITEM_TYPE
+from aws_backend import UPLOAD_TAG
+
+# Owner index: roster reads query one tenant's items ordered by creation time
+OWNER_INDEX_ATTRIBUTES = [
+    {'AttributeName': 'tenant_id', 'AttributeType': 'S'},
+    {'AttributeName': 'created_at', 'AttributeType': 'S'}
+]
+OWNER_INDEX = {
+    'IndexName': OWNER_INDEX_NAME,
+    'KeySchema': [
+        {'AttributeName': 'tenant_id', 'KeyType': 'HASH'},
+        {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+    ],
+    'Projection': {'ProjectionType': 'ALL'}
+}
+
+# Reminder index: sparse, only reminder items have item_type, so loading them at startup is a query
+REMINDER_INDEX_ATTRIBUTES = [
+    {'AttributeName': 'item_type', 'AttributeType': 'S'},
+    {'AttributeName': 'person_id', 'AttributeType': 'S'}
+]
+REMINDER_INDEX = {
+    'IndexName': REMINDER_INDEX_NAME,
+    'KeySchema': [
+        {'AttributeName': 'item_type', 'KeyType': 'HASH'},
+        {'AttributeName': 'person_id', 'KeyType': 'RANGE'}
+    ],
+    'Projection': {'ProjectionType': 'ALL'}
+}
+
+# Recognition history: events and rollups per tenant ordered by time, plus a per-person index
+HISTORY_TABLE = {
+    'KeySchema': [
+        {'AttributeName': 'tenant_id', 'KeyType': 'HASH'},
+        {'AttributeName': 'event_key', 'KeyType': 'RANGE'}
+    ],
+    'AttributeDefinitions': [
+        {'AttributeName': 'tenant_id', 'AttributeType': 'S'},
+        {'AttributeName': 'event_key', 'AttributeType': 'S'},
+        {'AttributeName': 'tenant_person', 'AttributeType': 'S'}
+    ],
+    'GlobalSecondaryIndexes': [{
+        'IndexName': HISTORY_PERSON_INDEX,
+        'KeySchema': [
+            {'AttributeName': 'tenant_person', 'KeyType': 'HASH'},
+            {'AttributeName': 'event_key', 'KeyType': 'RANGE'}
+        ],
+        'Projection': {'ProjectionType': 'ALL'}
+    }],
+    'BillingMode': 'PAY_PER_REQUEST'
+}
 
 # Load environment variables
 load_dotenv()
@@ -45,7 +101,8 @@ def setup_aws_resources():
         table = dynamodb.create_table(
             TableName=table_name,
             KeySchema=[{'AttributeName': 'person_id', 'KeyType': 'HASH'}],
-            AttributeDefinitions=[{'AttributeName': 'person_id', 'AttributeType': 'S'}],
+            AttributeDefinitions=OWNER_INDEX_ATTRIBUTES + REMINDER_INDEX_ATTRIBUTES,
+            GlobalSecondaryIndexes=[OWNER_INDEX, REMINDER_INDEX],
             BillingMode='PAY_PER_REQUEST'
         )
         table.wait_until_exists()
@@ -53,8 +110,171 @@ def setup_aws_resources():
     except Exception as e:
         if "ResourceInUseException" in str(e):
             print(f"Table {table_name} already exists")
+            add_owner_index()
+            add_reminder_index()
         else:
             print(f"Error creating table: {e}")
+    
+    setup_history_table()
+    setup_direct_uploads()
+
+def setup_history_table():
+    """Create the recognition history table with TTL-based retention"""
+    
+    dynamodb_client = boto3.client('dynamodb')
+    table_name = os.getenv('HISTORY_TABLE_NAME', 'alzheimer-recognitions')
+    
+    try:
+        dynamodb_client.create_table(TableName=table_name, **HISTORY_TABLE)
+        dynamodb_client.get_waiter('table_exists').wait(TableName=table_name)
+        print(f"Created DynamoDB table: {table_name}")
+    except dynamodb_client.exceptions.ResourceInUseException:
+        print(f"Table {table_name} already exists")
+    
+    # Expired events and rollups are deleted by DynamoDB at no cost
+    try:
+        dynamodb_client.update_time_to_live(
+            TableName=table_name,
+            TimeToLiveSpecification={'Enabled': True, 'AttributeName': 'expires_at'}
+        )
+        print(f"Enabled TTL on {table_name}.expires_at")
+    except Exception as e:
+        if "already enabled" in str(e):
+            print(f"TTL already enabled on {table_name}")
+        else:
+            print(f"Error enabling TTL: {e}")
+
+def setup_direct_uploads():
+    """Let the phone upload gallery photos straight to the bucket, and expire uploads never completed"""
+    
+    s3 = boto3.client('s3')
+    bucket_name = os.getenv('S3_BUCKET_NAME', 'alzheimer-camera-faces')
+    
+    # Browsers (the Expo web build) need CORS for presigned POSTs; native apps don't
+    try:
+        s3.put_bucket_cors(Bucket=bucket_name, CORSConfiguration={'CORSRules': [{
+            'AllowedMethods': ['POST', 'PUT'],
+            'AllowedOrigins': ['*'],
+            'AllowedHeaders': ['*'],
+            'MaxAgeSeconds': 3600
+        }]})
+        print(f"Enabled upload CORS on {bucket_name}")
+    except Exception as e:
+        print(f"Error setting bucket CORS: {e}")
+    
+    # Processed uploads are deleted right away; these only catch abandoned photos and video parts
+    try:
+        s3.put_bucket_lifecycle_configuration(Bucket=bucket_name, LifecycleConfiguration={'Rules': [{
+            'ID': 'expire-pending-uploads',
+            'Filter': {'Tag': {'Key': UPLOAD_TAG[0], 'Value': UPLOAD_TAG[1]}},
+            'Status': 'Enabled',
+            'Expiration': {'Days': 1}
+        }, {
+            'ID': 'abort-stale-multipart-uploads',
+            'Filter': {'Prefix': ''},
+            'Status': 'Enabled',
+            'AbortIncompleteMultipartUpload': {'DaysAfterInitiation': 7}
+        }]})
+        print(f"Pending uploads in {bucket_name} expire after a day, unfinished videos after a week")
+    except Exception as e:
+        print(f"Error setting bucket lifecycle: {e}")
+
+def add_owner_index():
+    """Migrate an existing table by adding the owner GSI (run backfill_owner.py afterwards)"""
+    
+    dynamodb_client = boto3.client('dynamodb')
+    table_name = os.getenv('DYNAMODB_TABLE_NAME', 'alzheimer-persons')
+    
+    description = dynamodb_client.describe_table(TableName=table_name)['Table']
+    existing = [index['IndexName'] for index in description.get('GlobalSecondaryIndexes', [])]
+    if OWNER_INDEX_NAME in existing:
+        print(f"Index {OWNER_INDEX_NAME} already exists")
+        return
+    
+    dynamodb_client.update_table(
+        TableName=table_name,
+        AttributeDefinitions=OWNER_INDEX_ATTRIBUTES,
+        GlobalSecondaryIndexUpdates=[{'Create': OWNER_INDEX}]
+    )
+    print(f"Creating index {OWNER_INDEX_NAME} on {table_name} (backfills in the background)...")
+    dynamodb_client.get_waiter('table_exists').wait(TableName=table_name)
+    print(f"Index {OWNER_INDEX_NAME} requested")
+
+def wait_for_indexes(dynamodb_client, table_name):
+    """DynamoDB creates one index at a time per table; wait for any still being built"""
+    while True:
+        description = dynamodb_client.describe_table(TableName=table_name)['Table']
+        if all(index['IndexStatus'] == 'ACTIVE' for index in description.get('GlobalSecondaryIndexes', [])):
+            return description
+        print(f"Waiting for indexes on {table_name} to finish building...")
+        time.sleep(15)
+
+def add_reminder_index():
+    """Migrate an existing table by adding the reminder GSI and tagging existing reminder items for it"""
+    
+    dynamodb_client = boto3.client('dynamodb')
+    table_name = os.getenv('DYNAMODB_TABLE_NAME', 'alzheimer-persons')
+    
+    description = wait_for_indexes(dynamodb_client, table_name)
+    existing = [index['IndexName'] for index in description.get('GlobalSecondaryIndexes', [])]
+    if REMINDER_INDEX_NAME in existing:
+        print(f"Index {REMINDER_INDEX_NAME} already exists")
+    else:
+        dynamodb_client.update_table(
+            TableName=table_name,
+            AttributeDefinitions=REMINDER_INDEX_ATTRIBUTES,
+            GlobalSecondaryIndexUpdates=[{'Create': REMINDER_INDEX}]
+        )
+        print(f"Creating index {REMINDER_INDEX_NAME} on {table_name} (backfills in the background)...")
+    
+    # Reminders written before the index lack item_type; a one-off scan tags them
+    table = boto3.resource('dynamodb').Table(table_name)
+    scan_kwargs = {
+        'FilterExpression': 'begins_with(person_id, :prefix) AND attribute_not_exists(item_type)',
+        'ExpressionAttributeValues': {':prefix': REMINDER_ITEM_PREFIX},
+        'ProjectionExpression': 'person_id'
+    }
+    tagged = 0
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            table.update_item(
+                Key={'person_id': item['person_id']},
+                UpdateExpression='SET item_type = :type',
+                ExpressionAttributeValues={':type': REMINDER_ITEM_TYPE}
+            )
+            tagged += 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    print(f"Tagged {tagged} existing reminders for {REMINDER_INDEX_NAME}")
+
+def setup_tenant(tenant_id):
+    """Provision the Rekognition collection for a patient/household tenant"""
+    
+    rekognition = boto3.client('rekognition')
+    base_collection_id = os.getenv('REKOGNITION_COLLECTION_ID', 'alzheimer-faces')
+    collection_id = collection_id_for(tenant_id, base_collection_id)
+    
+    # S3 (tenants/<id>/ prefix) and DynamoDB (tenant_id attribute) are shared and need no setup
+    try:
+        rekognition.create_collection(CollectionId=collection_id)
+        print(f"Created Rekognition collection for tenant {tenant_id}: {collection_id}")
+    except rekognition.exceptions.ResourceAlreadyExistsException:
+        print(f"Collection {collection_id} already exists")
 
 if __name__ == '__main__':
-    setup_aws_resources()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Provision AWS resources for AlzheimerCamera')
+    parser.add_argument('--tenant', type=tenant_id_arg, help='Provision only the resources for this patient/household ID')
+    parser.add_argument('--migrate', action='store_true', help='Add the owner and reminder indexes, history table and direct upload settings to an existing deployment')
+    args = parser.parse_args()
+    
+    if args.migrate:
+        add_owner_index()
+        add_reminder_index()
+        setup_history_table()
+        setup_direct_uploads()
+    elif args.tenant:
+        setup_tenant(args.tenant)
+    else:
+        setup_aws_resources()
\ No newline at end of file
@@ -0,0 +1,60 @@
+import argparse
+import re
+from collections import namedtuple
+
+DEFAULT_TENANT = 'default'
+TENANT_HEADER = 'X-Tenant-ID'
+# Tenant IDs become part of Rekognition collection IDs and S3 keys, so no dots ("tenants/../")
+# and nothing that reads as an option or hidden name
+TENANT_ID_PATTERN = re.compile(r'[A-Za-z0-9][A-Za-z0-9_\-]{0,63}')
+# DynamoDB GSI partitioning person items by owner, newest last
+OWNER_INDEX_NAME = 'tenant_id-created_at-index'
+
+Tenant = namedtuple('Tenant', ['tenant_id', 'collection_id', 's3_prefix'])
+
+
+def collection_id_for(tenant_id, base_collection_id):
+    """Rekognition collection holding a tenant's faces"""
+    if tenant_id == DEFAULT_TENANT:
+        return base_collection_id
+    return f"{base_collection_id}-{tenant_id}"
+
+
+def s3_prefix_for(tenant_id):
+    """S3 key prefix under which a tenant's media lives"""
+    if tenant_id == DEFAULT_TENANT:
+        return ''
+    return f"tenants/{tenant_id}/"
+
+
+def tenant_id_arg(value):
+    """argparse type for --tenant options, so scripts never act on a prefix like tenants/../"""
+    if not TENANT_ID_PATTERN.fullmatch(value):
+        raise argparse.ArgumentTypeError(f"invalid tenant ID {value!r}")
+    return value
+
+
+def item_tenant(item):
+    """Tenant owning a DynamoDB person item (records created before tenancy belong to the default tenant)"""
+    return item.get('tenant_id', DEFAULT_TENANT)
+
+
+class TenantRouter:
+    """Maps a patient/household ID to its collection, S3 prefix and DynamoDB partition"""
+
+    def __init__(self, base_collection_id):
+        self.base_collection_id = base_collection_id
+
+    def get(self, tenant_id=None):
+        tenant_id = tenant_id or DEFAULT_TENANT
+        if not TENANT_ID_PATTERN.fullmatch(tenant_id):
+            raise ValueError(f"Invalid tenant ID: {tenant_id}")
+        return Tenant(
+            tenant_id=tenant_id,
+            collection_id=collection_id_for(tenant_id, self.base_collection_id),
+            s3_prefix=s3_prefix_for(tenant_id)
+        )
+
+    def from_request(self, request):
+        """Tenant named by the X-Tenant-ID header or ?tenant= query parameter"""
+        return self.get(request.headers.get(TENANT_HEADER) or request.args.get('tenant'))
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from admission import (AdmissionGate, AdmissionRejected, SingleFlight, capture_hints, frame_fingerprint,
+                       retry_after_header)
+
+
+def test_single_flight_runs_once_for_concurrent_callers():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def search():
+        calls.append(1)
+        release.wait(1)
+        return 'Ann'
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do('frame', search))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while flight.shared < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert sorted(results) == [('Ann', False)] + [('Ann', True)] * 3
+
+
+def test_single_flight_shares_the_error_and_forgets_the_key():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        release.wait(1)
+        raise RuntimeError('throttled')
+
+    def call():
+        try:
+            flight.do('frame', failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(1)
+    waiter = threading.Thread(target=call)
+    waiter.start()
+    while not flight.shared:
+        time.sleep(0.001)
+    release.set()
+    leader.join()
+    waiter.join()
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert flight.do('frame', lambda: 'Ann') == ('Ann', False)
+
+
+def test_gate_sheds_when_the_queue_is_full():
+    gate = AdmissionGate(max_in_flight=1, max_queue=0, max_wait=0.5)
+    with gate.admit():
+        with pytest.raises(AdmissionRejected) as rejected:
+            with gate.admit():
+                pass
+    assert rejected.value.retry_after >= 0.5
+    assert (gate.stats()['admitted'], gate.stats()['shed']) == (1, 1)
+    assert capture_hints(gate)['frame_interval_ms'] == 2000
+
+
+def test_gate_sheds_a_request_that_waits_too_long():
+    gate = AdmissionGate(max_in_flight=1, max_queue=4, max_wait=0.02)
+    with gate.admit():
+        with pytest.raises(AdmissionRejected):
+            with gate.admit():
+                pass
+        assert gate.stats()['waiting'] == 0
+
+
+def test_gate_admits_a_waiter_when_a_slot_frees():
+    gate = AdmissionGate(max_in_flight=1, max_queue=4, max_wait=1)
+    admitted = []
+
+    def waiter():
+        with gate.admit():
+            admitted.append(True)
+
+    with gate.admit():
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        while not gate.stats()['waiting']:
+            time.sleep(0.001)
+    thread.join()
+    assert admitted and gate.stats()['shed'] == 0
+
+
+def test_capture_hints_relax_when_idle_and_follow_latency():
+    gate = AdmissionGate(max_in_flight=4, max_queue=4, max_wait=0.5, target_latency=1.0)
+    assert capture_hints(gate) == {'frame_interval_ms': 200, 'max_dimension': 1280, 'jpeg_quality': 85}
+    gate.avg_latency = 1.2
+    assert capture_hints(gate) == {'frame_interval_ms': 1200, 'max_dimension': 640, 'jpeg_quality': 70}
+    assert capture_hints(gate, retry_after=3)['frame_interval_ms'] == 3000
+
+
+def test_near_identical_frames_share_a_fingerprint():
+    # Brightness rises left to right
+    frame = Image.linear_gradient('L').rotate(90).resize((64, 48)).convert('RGB')
+    brighter = frame.point(lambda value: min(255, value + 3))
+    assert frame_fingerprint(frame) == frame_fingerprint(brighter)
+    assert frame_fingerprint(frame) != frame_fingerprint(frame.transpose(Image.FLIP_LEFT_RIGHT))
+
+
+def test_retry_after_header_rounds_up_to_whole_seconds():
+    assert retry_after_header(0.2) == '1'
+    assert retry_after_header(2.1) == '3'
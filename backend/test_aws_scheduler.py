@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+import aws_backend
+from aws_scheduler import (AwsCallScheduler, RateLimited, _OperationBucket, parse_rate_limits,
+                           PRIORITY_LIVE, PRIORITY_ENROLLMENT, PRIORITY_BACKGROUND)
+
+# Slow enough that no token refills during a test
+TRICKLE = 0.001
+
+
+class ThrottlingError(Exception):
+    response = {'Error': {'Code': 'ThrottlingException'}}
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = []
+
+    def search_faces_by_image(self, **kwargs):
+        self.calls.append(kwargs)
+        return {'FaceMatches': []}
+
+    def get_paginator(self, operation_name):
+        return self
+
+    def paginate(self, **kwargs):
+        return iter([{'page': 1}, {'page': 2}])
+
+
+def test_parse_rate_limits_overrides_defaults():
+    limits = parse_rate_limits('search_faces_by_image=50, detect_labels=2,bogus')
+    assert limits['search_faces_by_image'] == 50.0
+    assert limits['detect_labels'] == 2.0
+    assert limits['index_faces'] == 5
+    assert 'bogus' not in limits
+
+
+def test_burst_then_reject():
+    bucket = _OperationBucket('op', TRICKLE, burst=3)
+    for _ in range(3):
+        bucket.acquire(PRIORITY_LIVE, max_wait=0)
+    with pytest.raises(RateLimited):
+        bucket.acquire(PRIORITY_LIVE, max_wait=0.02)
+    stats = bucket.snapshot()['priorities']['live']
+    assert (stats['calls'], stats['rejected']) == (3, 1)
+
+
+def test_lower_priorities_leave_a_reserve():
+    bucket = _OperationBucket('op', TRICKLE, burst=10)
+    for _ in range(5):
+        bucket.acquire(PRIORITY_BACKGROUND, max_wait=0)
+    with pytest.raises(RateLimited):
+        bucket.acquire(PRIORITY_BACKGROUND, max_wait=0)
+    for _ in range(3):
+        bucket.acquire(PRIORITY_ENROLLMENT, max_wait=0)
+    with pytest.raises(RateLimited):
+        bucket.acquire(PRIORITY_ENROLLMENT, max_wait=0)
+    for _ in range(2):
+        bucket.acquire(PRIORITY_LIVE, max_wait=0)
+
+
+def test_tiny_bucket_still_serves_background():
+    bucket = _OperationBucket('op', TRICKLE, burst=1)
+    bucket.acquire(PRIORITY_BACKGROUND, max_wait=0)
+
+
+def test_tokens_refill_at_the_rate():
+    bucket = _OperationBucket('op', 50, burst=1)
+    bucket.acquire(PRIORITY_LIVE)
+    started = time.monotonic()
+    bucket.acquire(PRIORITY_LIVE, max_wait=1)
+    assert 0.01 <= time.monotonic() - started < 0.5
+
+
+def test_scheduled_client_takes_a_token_per_call():
+    scheduler = AwsCallScheduler({'search_faces_by_image': TRICKLE}, wait_budgets={PRIORITY_LIVE: 0})
+    scheduler.buckets['search_faces_by_image'].burst = scheduler.buckets['search_faces_by_image'].tokens = 2
+    client = FakeClient()
+    live = scheduler.wrap(client, PRIORITY_LIVE)
+    live.search_faces_by_image(CollectionId='c')
+    live.search_faces_by_image(CollectionId='c')
+    with pytest.raises(RateLimited):
+        live.search_faces_by_image(CollectionId='c')
+    assert len(client.calls) == 2
+
+
+def test_unscheduled_operations_pass_through():
+    scheduler = AwsCallScheduler({})
+    assert list(scheduler.wrap(FakeClient(), PRIORITY_LIVE).get_paginator('list_faces').paginate()) == [{'page': 1}, {'page': 2}]
+
+
+def test_throttling_errors_are_counted():
+    scheduler = AwsCallScheduler({'op': 100})
+
+    def throttled():
+        raise ThrottlingError()
+    with pytest.raises(ThrottlingError):
+        scheduler.call(PRIORITY_LIVE, 'op', throttled)
+    assert scheduler.stats()['op']['throttled'] == 1
+
+
+def test_every_priority_gives_up_after_its_wait_budget():
+    scheduler = AwsCallScheduler({'search_faces_by_image': TRICKLE},
+                                 wait_budgets={PRIORITY_ENROLLMENT: 0.02, PRIORITY_BACKGROUND: 0.02})
+    scheduler.buckets['search_faces_by_image'].tokens = 0
+    for priority in (PRIORITY_ENROLLMENT, PRIORITY_BACKGROUND):
+        with pytest.raises(RateLimited):
+            scheduler.wrap(FakeClient(), priority).search_faces_by_image(CollectionId='c')
+
+
+def test_aws_backend_bounds_every_priority(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    backend = aws_backend.create({'bucket_name': 'b', 'table_name': 't', 'history_table_name': 'h',
+                                  'history_raw_days': 90, 'history_rollup_days': 730, 'rate_limits': {},
+                                  'live_wait': 0.5, 'enrollment_wait': 10, 'background_wait': 60})
+    budgets = backend.faces(PRIORITY_LIVE).rekognition._scheduler.wait_budgets
+    assert budgets == {PRIORITY_LIVE: 0.5, PRIORITY_ENROLLMENT: 10, PRIORITY_BACKGROUND: 60}
@@ -0,0 +1,189 @@
+import io
+import json
+import zipfile
+from types import SimpleNamespace
+
+from backends import NoFaceError
+from bulk_import import BulkImporter, parse_zip_archive
+from image_pool import ImagePoolBusy
+from jobs import JobRegistry
+from media_dedup import MediaDeduplicator
+
+TENANT = SimpleNamespace(tenant_id='t1', s3_prefix='tenants/t1/')
+
+
+class FakeImages:
+    def __init__(self):
+        self.waits = []
+
+    def render(self, data, thumbnail_size=None, wait=None):
+        self.waits.append(wait)
+        if data.startswith(b'busy'):
+            raise ImagePoolBusy(retry_after=3)
+        if data == b'broken':
+            raise ValueError('cannot identify image file')
+        return {'jpeg': b'jpeg:' + data, 'thumb': b'thumb:' + data, 'phash': f"{len(data):016x}"}
+
+
+class FakeFaces:
+    def __init__(self, known=None):
+        self.known = known or {}
+        self.indexed = {}
+        self.deleted = []
+
+    def search(self, tenant, image_bytes, threshold=70):
+        if b'noface' in image_bytes:
+            raise NoFaceError('no face')
+        person_id = self.known.get(image_bytes)
+        return [{'person_id': person_id, 'face_id': 'f-old', 'similarity': 99.0}] if person_id else []
+
+    def index(self, tenant, person_id, image_bytes=None, object_key=None):
+        if b'noface' in image_bytes:
+            return None
+        face_id = f"face-{len(self.indexed)}"
+        self.indexed[face_id] = person_id
+        return face_id
+
+    def delete(self, tenant, face_ids):
+        self.deleted.extend(face_ids)
+
+
+class FakeObjects:
+    def __init__(self, fail_on=None):
+        self.items = {}
+        self.fail_on = fail_on
+
+    def put(self, key, data, content_type):
+        if self.fail_on and self.fail_on in key and len(self.items) >= 2:
+            raise IOError('S3 unavailable')
+        self.items[key] = data
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.items.pop(key, None)
+
+
+class FakeRoster:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.people = {}
+        self.updates = []
+
+    def put_people(self, tenant, items):
+        if self.fail:
+            raise RuntimeError('TransactionCanceled')
+        self.people.update((item['person_id'], item) for item in items)
+
+    def get(self, person_id):
+        return self.people.get(person_id)
+
+    def update_person(self, tenant, person_id, fields):
+        self.updates.append((person_id, fields))
+
+
+def importer(faces=None, objects=None, roster=None, saved=None):
+    def save_photo(tenant, person_info, raw, rendition):
+        saved.append((person_info['person_id'], raw))
+        return None, None, False
+    return BulkImporter(faces or FakeFaces(), objects or FakeObjects(), roster or FakeRoster(), FakeImages(),
+                        save_photo, MediaDeduplicator(None), JobRegistry(), workers=2, image_wait=5)
+
+
+def run(bulk, people):
+    job = bulk.jobs.create('bulk_import', total=len(people), details={'duplicates': 0})
+    bulk._run_job(job, people, TENANT)
+    return job
+
+
+def zip_of(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def test_parse_zip_archive_groups_photos_by_folder():
+    archive = zip_of({
+        'ann/person.json': json.dumps({'name': 'Ann', 'relationship': 'daughter'}),
+        'ann/1.JPG': b'a1',
+        'ann/2.png': b'a2',
+        'ann/.DS_Store': b'x',
+        'ann/notes.txt': b'x',
+        'bob/photos/1.jpg': b'b1',
+        '__MACOSX/ann/._1.JPG': b'x',
+        'loose.jpg': b'x',
+    })
+    assert parse_zip_archive(archive) == [
+        {'source': 'ann', 'images': [b'a1', b'a2'], 'name': 'Ann', 'relationship': 'daughter'},
+        {'source': 'bob', 'images': [b'b1']},
+    ]
+
+
+def test_job_counts_each_failed_entry():
+    bulk = importer()
+    job = run(bulk, [
+        {'name': 'Ann', 'relationship': 'daughter', 'images': [b'ann', b'broken']},
+        {'name': 'Bob', 'images': [b'bob']},
+        {'name': 'Cy', 'relationship': 'son', 'images': [b'broken']},
+        {'name': 'Di', 'relationship': 'niece', 'images': [b'noface']},
+    ])
+    status = job.to_dict()
+    assert (status['status'], status['succeeded'], status['failed']) == ('completed_with_errors', 1, 3)
+    assert sorted(error['error'] for error in status['errors']) == [
+        'name and relationship required', 'no face detected in any image', 'no readable images'
+    ]
+
+
+def test_existing_person_is_updated_through_save_photo():
+    saved = []
+    faces = FakeFaces(known={b'jpeg:ann': 'p-ann'})
+    bulk = importer(faces=faces, saved=saved)
+    job = run(bulk, [{'name': 'Ann', 'relationship': 'daughter', 'images': [b'ann', b'ann2']}])
+    assert job.to_dict()['results'][0]['updated']
+    assert saved == [('p-ann', b'ann'), ('p-ann', b'ann2')]
+    assert faces.indexed == {}
+
+
+def test_new_person_dedups_photos_within_the_album():
+    roster = FakeRoster()
+    bulk = importer(roster=roster)
+    job = run(bulk, [{'name': 'Ann', 'relationship': 'daughter', 'images': [b'ann', b'ann', b'ann-2']}])
+    assert job.to_dict()['details']['duplicates'] == 1
+    item = next(iter(roster.people.values()))
+    assert len(item['media_hashes']) == 2
+    assert len(bulk.objects.items) == 4  # Two photos and their thumbnails
+
+
+def test_failed_record_write_removes_faces_and_photos():
+    faces, objects = FakeFaces(), FakeObjects()
+    bulk = importer(faces=faces, objects=objects, roster=FakeRoster(fail=True))
+    job = run(bulk, [
+        {'name': 'Ann', 'relationship': 'daughter', 'images': [b'ann', b'ann-2']},
+        {'name': 'Bob', 'relationship': 'son', 'images': [b'bob']},
+    ])
+    assert job.to_dict()['failed'] == 2
+    assert sorted(faces.deleted) == sorted(faces.indexed)
+    assert objects.items == {}
+
+
+def test_failed_photo_upload_removes_the_indexed_face():
+    faces, objects = FakeFaces(), FakeObjects(fail_on='tenants/t1/')
+    bulk = importer(faces=faces, objects=objects)
+    job = run(bulk, [{'name': 'Ann', 'relationship': 'daughter', 'images': [b'ann', b'ann-2', b'ann-33']}])
+    assert job.to_dict()['failed'] == 1
+    assert faces.deleted == list(faces.indexed)
+    assert objects.items == {}
+
+
+def test_photos_wait_a_bounded_time_for_the_image_pool():
+    bulk = importer()
+    job = run(bulk, [
+        {'source': 'ann', 'name': 'Ann', 'relationship': 'daughter', 'images': [b'busy', b'ann']},
+        {'source': 'bob', 'name': 'Bob', 'relationship': 'son', 'images': [b'busy-2']},
+    ])
+    status = job.to_dict()
+    assert set(bulk.images.waits) == {5}
+    assert (status['succeeded'], status['failed']) == (1, 1)
+    assert sorted(error['item'] for error in status['errors']) == ['ann photo 1', 'bob', 'bob photo 1']
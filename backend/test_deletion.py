@@ -0,0 +1,82 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from deletion import PersonDeleter
+from jobs import JobRegistry
+
+TENANT = SimpleNamespace(tenant_id='t1', s3_prefix='tenants/t1/')
+PERSON = {'person_id': 'p1', 'face_id': 'f1', 'exemplars': {'m1': 'f2'}}
+
+
+class FakeFaces:
+    def __init__(self, calls, fail=False):
+        self.calls = calls
+        self.fail = fail
+
+    def list_pages(self, tenant):
+        yield [('f1', 'p1'), ('f3', 'p1'), ('f9', 'p2')]
+
+    def delete(self, tenant, face_ids):
+        if self.fail:
+            raise RuntimeError('RateLimited')
+        self.calls.append(('faces', face_ids))
+
+
+class FakeObjects:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def list_pages(self, prefix, page_size=None):
+        yield [prefix + 'f1.jpg', prefix + 'thumbs/f1.jpg']
+
+    def delete_many(self, keys):
+        self.calls.append(('objects', keys))
+
+
+class FakeRoster:
+    def __init__(self, calls, release=None):
+        self.calls = calls
+        self.release = release
+
+    def delete_person(self, tenant, person_id):
+        if self.release:
+            self.release.wait(1)
+        self.calls.append(('dynamodb', person_id))
+
+
+def delete(faces_fail=False):
+    calls = []
+    deleter = PersonDeleter(FakeFaces(calls, fail=faces_fail), FakeObjects(calls), FakeRoster(calls), JobRegistry())
+    job = deleter.submit(TENANT, PERSON)
+    deleter.executor.shutdown(wait=True)
+    return job.to_dict(), calls
+
+
+def test_faces_then_objects_then_the_record():
+    status, calls = delete()
+    assert calls == [
+        ('faces', ['f1', 'f2', 'f3']),
+        ('objects', ['tenants/t1/p1/f1.jpg', 'tenants/t1/p1/thumbs/f1.jpg']),
+        ('dynamodb', 'p1'),
+    ]
+    assert (status['status'], status['succeeded'], status['failed']) == ('completed', 3, 0)
+    assert (status['details']['faces_deleted'], status['details']['objects_deleted']) == (3, 2)
+
+
+def test_record_is_kept_when_a_step_fails():
+    status, calls = delete(faces_fail=True)
+    assert [step for step, _ in calls] == ['objects']
+    assert (status['succeeded'], status['failed']) == (1, 2)
+    assert [error['item'] for error in status['errors']] == ['faces', 'dynamodb']
+
+
+def test_repeated_deletes_share_one_job():
+    calls, release = [], threading.Event()
+    deleter = PersonDeleter(FakeFaces(calls), FakeObjects(calls), FakeRoster(calls, release), JobRegistry())
+    first = deleter.submit(TENANT, PERSON)
+    assert deleter.submit(TENANT, PERSON) is first
+    release.set()
+    while deleter._active:
+        time.sleep(0.001)
+    assert deleter.submit(TENANT, PERSON) is not first
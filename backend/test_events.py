@@ -0,0 +1,88 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from events import EventBus, RosterNotifier, TooManySubscribers, RETRY_MS
+
+TENANT = SimpleNamespace(tenant_id='t1')
+
+
+def parse(chunk):
+    """(id, event type, data) of one SSE chunk"""
+    fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+    return fields.get('id'), fields['event'], json.loads(fields['data'])
+
+
+def read(stream, count):
+    """The next `count` events of a stream, after the retry line"""
+    assert next(stream) == f"retry: {RETRY_MS}\n\n"
+    return [parse(next(stream)) for _ in range(count)]
+
+
+def test_resume_replays_only_missed_events_of_the_tenant():
+    bus = EventBus()
+    first = bus.publish('t1', 'roster', {'version': 1})
+    bus.publish('t2', 'roster', {'version': 1})
+    bus.publish('t1', 'roster', {'version': 2})
+    bus.publish('t1', 'reminder', {'text': 'Pills'})
+    events = read(bus.stream('t1', first['id']), 2)
+    assert [(event_type, data.get('version')) for _, event_type, data in events] == [('roster', 2), ('reminder', None)]
+    assert events[-1][0] == f"{bus.epoch}-4"
+
+
+def test_evicted_resume_point_gets_a_reset():
+    bus = EventBus(buffer_size=2)
+    first = bus.publish('t1', 'roster', {'version': 1})
+    for version in (2, 3, 4):
+        bus.publish('t1', 'roster', {'version': version})
+    stream = bus.stream('t1', first['id'])
+    [(event_id, event_type, data)] = read(stream, 1)
+    assert (event_id, event_type, data) == (f"{bus.epoch}-4", 'reset', {'reason': 'resume_unavailable'})
+    bus.publish('t1', 'roster', {'version': 5})
+    assert parse(next(stream))[2]['version'] == 5
+
+
+@pytest.mark.parametrize('last_event_id', ['0-1', 'garbage', 'EPOCH-99'])
+def test_unknown_resume_point_gets_a_reset(last_event_id):
+    bus = EventBus()
+    bus.publish('t1', 'roster', {'version': 1})
+    stream = bus.stream('t1', last_event_id.replace('EPOCH', bus.epoch))
+    assert read(stream, 1)[0][1] == 'reset'
+
+
+def test_idle_stream_sends_keepalives_and_counts_subscribers():
+    bus = EventBus(heartbeat=0.01, max_subscribers=1)
+    stream = bus.stream('t1')
+    next(stream)
+    assert next(stream) == ': keepalive\n\n'
+    with pytest.raises(TooManySubscribers):
+        bus.stream('t2')
+    stream.close()
+    assert bus.stats()['subscribers'] == 0
+
+
+class FakePeople:
+    version = 0
+
+    def _bump(self, *args):
+        self.version += 1
+        return self.version
+
+    put_person = put_people = update_person = delete_person = _bump
+
+    def get(self, person_id):
+        return {'person_id': person_id}
+
+
+def test_roster_notifier_publishes_every_write():
+    bus = EventBus()
+    people = RosterNotifier(FakePeople(), bus)
+    people.put_people(TENANT, [{'person_id': 'p1'}, {'person_id': 'p2'}])
+    people.delete_person(TENANT, 'p2')
+    assert people.get('p1') == {'person_id': 'p1'}
+    events = read(bus.stream('t1', f"{bus.epoch}-0"), 2)
+    assert [data for _, _, data in events] == [
+        {'version': 1, 'person_ids': ['p1', 'p2'], 'deleted': False, 'at': events[0][2]['at']},
+        {'version': 2, 'person_ids': ['p2'], 'deleted': True, 'at': events[1][2]['at']},
+    ]
@@ -0,0 +1,123 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from aws_backend import DynamoHistoryStore
+from history import RecognitionLog, day_of, group_visits, new_event, now_ms, rollup
+from setup_aws import HISTORY_TABLE
+
+DAY = 86400 * 1000
+# Yesterday's midnight, so stored rollups are within retention
+BASE = now_ms() // DAY * DAY - DAY
+
+
+def event(person_id, similarity, ts, tenant_id='t1'):
+    ts += BASE
+    return dict(new_event(tenant_id, person_id is not None, person_id, similarity), ts=ts,
+                at=f"{day_of(ts)}T00:00:{ts // 1000 % 60:02d}+00:00")
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        table = boto3.resource('dynamodb').create_table(TableName='history', **HISTORY_TABLE)
+        yield DynamoHistoryStore(table, raw_days=90, rollup_days=730)
+
+
+def test_rollup_groups_by_tenant_day_and_person():
+    entries = rollup([event('p1', 92.5, 1000), event('p1', 81.0, 2000), event(None, None, 3000),
+                      event('p1', 99.0, DAY)], writer='w1', sequence=4)
+    by_key = {(entry['day'], entry['person_id']): entry for entry in entries}
+    first = by_key[(day_of(BASE), 'p1')]
+    assert (first['count'], first['similarity_sum'], first['bins']) == (2, 173.5, {'b90': 1, 'b80': 1})
+    assert (first['writer'], first['sequence']) == ('w1', 4)
+    assert by_key[(day_of(BASE), '')]['count'] == 1
+    assert by_key[(day_of(BASE + DAY), 'p1')]['bins'] == {'b95': 1}
+
+
+def test_group_visits_splits_on_gaps():
+    events = [event('p1', 90, 0), event('p2', 90, 1000), event('p1', 95, 60 * 1000), event('p1', 80, 30 * 60 * 1000)]
+    visits = group_visits(events)
+    assert [(visit['person_id'], visit['recognitions'], visit['max_similarity']) for visit in visits] == [
+        ('p1', 2, 95), ('p2', 1, 90), ('p1', 1, 80)
+    ]
+
+
+def stored_counts(store):
+    return {entry['person_id']: entry['count'] for entry in store.rollups('t1', day_of(BASE), day_of(BASE))}
+
+
+def test_retried_rollup_is_applied_once(store):
+    entries = rollup([event('p1', 90, 1000)], writer='w1', sequence=1)
+    assert store.append([], entries) == []
+    assert store.append([], entries) == []
+    assert stored_counts(store) == {'p1': 1}
+    assert store.append([], rollup([event('p1', 90, 2000)], writer='w2', sequence=1)) == []
+    assert stored_counts(store) == {'p1': 2}
+
+
+def test_newer_rollups_wait_behind_a_failed_one(store, monkeypatch):
+    add_rollup = store._add_rollup
+    failures = {f"r#{day_of(BASE)}#p1"}
+
+    def flaky(key, entry):
+        if key['event_key'] in failures:
+            failures.discard(key['event_key'])
+            raise RuntimeError('ProvisionedThroughputExceeded')
+        add_rollup(key, entry)
+    monkeypatch.setattr(store, '_add_rollup', flaky)
+
+    first = rollup([event('p1', 90, 1000)], writer='w1', sequence=1)
+    second = rollup([event('p1', 90, 2000), event('p2', 90, 2000)], writer='w1', sequence=2)
+    unapplied = store.append([], first + second)
+    assert [(entry['person_id'], entry['sequence']) for entry in unapplied] == [('p1', 1), ('p1', 2)]
+    assert stored_counts(store) == {'p2': 1}
+    assert store.append([], unapplied) == []
+    assert stored_counts(store) == {'p1': 2, 'p2': 1}
+
+
+class FlakyStore:
+    def __init__(self, fail_appends=0):
+        self.fail_appends = fail_appends
+        self.events = []
+        self.rollups = []
+        self.unapply = False
+
+    def append(self, events, rollups):
+        if self.fail_appends:
+            self.fail_appends -= 1
+            raise RuntimeError('unreachable')
+        self.events.extend(events)
+        if self.unapply:
+            self.unapply = False
+            return rollups
+        self.rollups.extend(rollups)
+        return []
+
+
+def test_failed_write_keeps_events_buffered():
+    store = FlakyStore(fail_appends=1)
+    log = RecognitionLog(store)
+    log.record(event('p1', 90, 1000))
+    assert log.flush() == 0
+    assert log.stats()['write_errors'] == 1
+    log.record(event('p2', 90, 2000))
+    assert log.flush() == 2
+    assert [e['person_id'] for e in store.events] == ['p1', 'p2']
+    assert sorted(entry['person_id'] for entry in store.rollups) == ['p1', 'p2']
+
+
+def test_unapplied_rollups_are_retried_unchanged():
+    store = FlakyStore()
+    store.unapply = True
+    log = RecognitionLog(store)
+    log.record(event('p1', 90, 1000))
+    log.flush()
+    assert store.rollups == [] and log.stats()['rollup_errors'] == 1
+    log.record(event('p1', 90, 2000))
+    log.flush()
+    assert [(entry['count'], entry['sequence']) for entry in store.rollups] == [(1, 1), (1, 2)]
+    assert len(store.events) == 2
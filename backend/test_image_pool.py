@@ -0,0 +1,77 @@
+import io
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image
+
+import image_pool
+from image_pool import ImagePool, ImagePoolBusy, render_photo
+
+
+def photo(size=(640, 480), format='JPEG'):
+    buffer = io.BytesIO()
+    Image.linear_gradient('L').resize(size).convert('RGB').save(buffer, format=format)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def pool():
+    pool = ImagePool(workers=1, max_queue=0)
+    pool.start()
+    yield pool
+    if pool._executor:
+        pool._executor.shutdown()
+
+
+def test_render_photo_resizes_and_thumbnails():
+    result = render_photo(photo(format='PNG'), max_dimension=320, thumbnail_size=64)
+    assert (result['width'], result['height']) == (320, 240)
+    assert Image.open(io.BytesIO(result['jpeg'])).format == 'JPEG'
+    assert Image.open(io.BytesIO(result['thumb'])).size == (64, 48)
+    assert len(result['phash']) == 16
+
+
+def test_pool_matches_inline_rendering(pool):
+    data = photo()
+    inline = ImagePool(workers=0).render(data, thumbnail_size=64)
+    pooled = pool.render(data, thumbnail_size=64)
+    assert {field: pooled[field] for field in inline} == inline
+    stats = pool.stats()
+    assert (stats['processed'], stats['shared_bytes'], stats['pickled_outputs'], stats['in_flight']) == (1, len(data), 0, 0)
+
+
+def test_outputs_larger_than_the_block_come_back_pickled(pool, monkeypatch):
+    monkeypatch.setattr(image_pool, 'OUTPUT_HEADROOM', 0)
+    data = photo((1600, 1200), format='PNG')
+    result = pool.render(data, quality=95)
+    assert result['jpeg'] == render_photo(data, quality=95)['jpeg']
+    assert pool.stats()['pickled_outputs'] == 1
+
+
+def test_full_queue_rejects_after_the_wait(pool):
+    pool._slots.acquire()
+    try:
+        with pytest.raises(ImagePoolBusy) as busy:
+            pool.render(photo(), wait=0.01)
+    finally:
+        pool._slots.release()
+    assert busy.value.retry_after >= 1
+    assert pool.stats()['rejected'] == 1
+    assert pool.render(photo(), wait=0.01)['width'] == 640
+
+
+def test_broken_pool_falls_back_to_inline(pool):
+    # A worker dying, as it would out of memory, breaks the whole executor
+    with pytest.raises(BrokenProcessPool):
+        pool._executor.submit(os._exit, 1).result()
+    assert pool.render(photo())['width'] == 640
+    stats = pool.stats()
+    assert (stats['workers'], stats['inline'], stats['utilization']) == (0, 1, None)
+
+
+def test_unreadable_photo_counts_as_failed(pool):
+    with pytest.raises(Exception):
+        pool.render(b'not a photo')
+    assert pool.stats()['failed'] == 1
+    assert pool.stats()['in_flight'] == 0
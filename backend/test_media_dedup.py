@@ -0,0 +1,85 @@
+import io
+from types import SimpleNamespace
+
+import boto3
+import pytest
+from moto import mock_aws
+from PIL import Image
+
+from aws_backend import DynamoPersonStore
+from local_backend import LocalPersonStore
+from media_dedup import MediaDeduplicator, content_digest, hash_distance, perceptual_hash
+
+TENANT = SimpleNamespace(tenant_id='t1')
+
+
+@pytest.fixture(params=['dynamodb', 'local'])
+def people(request, tmp_path, monkeypatch):
+    if request.param == 'local':
+        store = LocalPersonStore(str(tmp_path / 'people.sqlite'))
+        store.put_person(TENANT, {'person_id': 'p1', 'tenant_id': 't1', 'created_at': '2024-01-01'})
+        yield store
+        return
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        table = boto3.resource('dynamodb').create_table(
+            TableName='people', BillingMode='PAY_PER_REQUEST',
+            KeySchema=[{'AttributeName': 'person_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'person_id', 'AttributeType': 'S'}])
+        store = DynamoPersonStore(table)
+        store.put_person(TENANT, {'person_id': 'p1', 'tenant_id': 't1', 'created_at': '2024-01-01'})
+        yield store
+
+
+def jpeg(image, quality=90):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def test_reencoded_photo_is_within_a_few_bits():
+    photo = Image.linear_gradient('L').rotate(90).resize((320, 240)).convert('RGB')
+    original = perceptual_hash(Image.open(io.BytesIO(jpeg(photo))))
+    smaller = perceptual_hash(Image.open(io.BytesIO(jpeg(photo.resize((160, 120)), quality=60))))
+    assert len(original) == 16
+    assert hash_distance(original, smaller) <= 4
+    assert hash_distance(original, perceptual_hash(photo.transpose(Image.FLIP_LEFT_RIGHT))) > 32
+
+
+def test_find_matches_exact_copies_and_near_copies_within_the_distance():
+    person = MediaDeduplicator.initial_hashes(content_digest(b'a'), 'm1', 'ffff000000000000')
+    exact_only = MediaDeduplicator(None)
+    assert exact_only.find(person, content_digest(b'a')) == 'm1'
+    assert exact_only.find(person, content_digest(b'b'), 'ffff000000000001') is None
+
+    dedup = MediaDeduplicator(None, perceptual_distance=2)
+    assert dedup.find(person, content_digest(b'b'), 'ffff000000000003') == 'm1'
+    assert dedup.find(person, content_digest(b'b'), 'ffff000000000007') is None
+    assert dedup.duplicates == 1
+
+
+def test_claim_returns_the_first_uploads_media_id(people):
+    dedup = MediaDeduplicator(people)
+    digest = content_digest(b'photo')
+    assert dedup.claim('p1', digest, 'm1', 'abcd000000000000') is None
+    assert dedup.claim('p1', digest, 'm2', 'abcd000000000000') == 'm1'
+    assert dedup.duplicates == 1
+    item = people.get('p1')
+    assert (item['media_hashes'], item['media_phashes']) == ({digest: 'm1'}, {'m1': 'abcd000000000000'})
+
+
+def test_release_forgets_the_photo(people):
+    dedup = MediaDeduplicator(people)
+    dedup.claim('p1', content_digest(b'photo'), 'm1', 'abcd000000000000')
+    dedup.claim('p1', content_digest(b'other'), 'm2')
+    dedup.release('p1', 'm1')
+    item = people.get('p1')
+    assert (item['media_hashes'], item['media_phashes']) == ({content_digest(b'other'): 'm2'}, {})
+    assert dedup.claim('p1', content_digest(b'photo'), 'm3') is None
+
+
+def test_claim_for_a_missing_person_fails(people):
+    with pytest.raises(LookupError):
+        MediaDeduplicator(people).claim('gone', content_digest(b'photo'), 'm1')
@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+
+import pytest
+
+from phrase_audio import PhraseAudioCache, announcement_segments, mp3_frames, _BITRATES, _SAMPLE_RATES
+
+PROFILE = SimpleNamespace(name='mp3_44100_128', content_type='audio/mpeg')
+
+
+def frame(bitrate_index=9, rate_index=0, mode=0, fill=b'\x00'):
+    """One MPEG-1 Layer III frame (128 kbps, 44.1 kHz by default)"""
+    length = 144 * _BITRATES[3][bitrate_index] * 1000 // _SAMPLE_RATES[3][rate_index]
+    header = bytes([0xFF, 0xFB, bitrate_index << 4 | rate_index << 2, mode << 6])
+    return header + fill * (length - 4)
+
+
+def id3(payload=b'x' * 20):
+    size = len(payload)
+    return b'ID3\x04\x00\x00' + bytes([size >> 21 & 0x7F, size >> 14 & 0x7F, size >> 7 & 0x7F, size & 0x7F]) + payload
+
+
+class MemoryObjects:
+    def __init__(self):
+        self.items = {}
+
+    def get(self, key):
+        return self.items.get(key)
+
+    def put(self, key, data, content_type):
+        self.items[key] = data
+
+
+def test_frames_without_tags():
+    frames = frame(fill=b'\x01') + frame(fill=b'\x02')
+    data = id3() + frames + b'TAG' + b'\x00' * 125
+    assert mp3_frames(data) == (frames, (3, 44100, 0))
+
+
+def test_info_header_frame_is_dropped():
+    info = bytearray(frame())
+    info[36:40] = b'Info'
+    assert mp3_frames(bytes(info) + frame(fill=b'\x03')) == (frame(fill=b'\x03'), (3, 44100, 0))
+
+
+def test_truncated_trailing_frame_is_dropped():
+    assert mp3_frames(frame() + frame()[:100])[0] == frame()
+
+
+def test_format_change_is_rejected():
+    with pytest.raises(ValueError):
+        mp3_frames(frame() + frame(mode=3))
+
+
+def test_lost_sync_is_rejected():
+    with pytest.raises(ValueError):
+        mp3_frames(frame() + b'\x00' * 8 + frame())
+
+
+def test_empty_input_is_rejected():
+    with pytest.raises(ValueError):
+        mp3_frames(b'')
+
+
+def test_stitch_caches_name_per_person_and_phrases_per_tenant():
+    spoken = []
+
+    def synthesize(text, profile):
+        spoken.append(text)
+        return id3() + frame(fill=bytes([len(text)]))
+
+    objects = MemoryObjects()
+    cache = PhraseAudioCache(synthesize, objects, {'voice_id': 'v'})
+    phrases = announcement_segments('Ann', 'daughter', 40, tenant_folder='tenants/t1/', person_folder='tenants/t1/p1/')
+
+    audio = cache.stitch(phrases, PROFILE)
+    assert audio == b''.join(frame(fill=bytes([len(text)])) for _, text in phrases)
+    assert spoken == ['This is Ann,', 'your daughter,', 'age 40.']
+    assert sorted(key.split('tts-cache/')[0] for key in objects.items) == ['tenants/t1/', 'tenants/t1/', 'tenants/t1/p1/']
+
+    # Same tenant, another person: only the name is new
+    cache.stitch(announcement_segments('Bob', 'daughter', 40, 'tenants/t1/', 'tenants/t1/p2/'), PROFILE)
+    assert spoken[3:] == ['This is Bob,']
+    assert cache.stats()['memory_hits'] == 2
+
+
+def test_stitch_reads_segments_back_from_the_store():
+    objects = MemoryObjects()
+    phrases = [('', 'hello')]
+    PhraseAudioCache(lambda text, profile: frame(), objects, {}).stitch(phrases, PROFILE)
+
+    cache = PhraseAudioCache(lambda text, profile: pytest.fail('synthesized again'), objects, {})
+    assert cache.stitch(phrases, PROFILE) == frame()
+    assert cache.stats()['store_hits'] == 1
+
+
+def test_stitch_falls_back_when_a_segment_is_unavailable():
+    cache = PhraseAudioCache(lambda text, profile: None, MemoryObjects(), {})
+    assert cache.stitch([('', 'hello')], PROFILE) is None
+    assert cache.stats()['fallbacks'] == 1
+
+
+def test_stitch_refuses_mixed_formats():
+    audio = {'a': frame(), 'b': frame(rate_index=1)}
+    cache = PhraseAudioCache(lambda text, profile: audio[text], MemoryObjects(), {})
+    assert cache.stitch([('', 'a'), ('', 'b')], PROFILE) is None
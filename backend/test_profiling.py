@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+from profiling import PROFILE_HEADER, RequestProfiler
+
+
+def request_with(headers):
+    return SimpleNamespace(headers=headers)
+
+
+def test_authorized(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), token='s3cret')
+    assert profiler.authorized('s3cret')
+    assert not profiler.authorized('wrong')
+    assert not profiler.authorized(None)
+    assert not RequestProfiler(str(tmp_path)).authorized('s3cret')
+
+
+def test_non_ascii_token_is_denied_not_an_error(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), token='s3cret')
+    assert not profiler.authorized('s3crét')
+    assert profiler.start(request_with({PROFILE_HEADER: 'caf\xe9'})) is None
+    assert profiler.stats()['denied'] == 1
+
+
+def profile(profiler):
+    handle = profiler.start(request_with({PROFILE_HEADER: 's3cret'}))
+    return profiler.finish(handle, {'path': '/health'})
+
+
+def test_oldest_profiles_are_pruned(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), token='s3cret', max_profiles=2)
+    ids = [profile(profiler) for _ in range(3)]
+    assert {stored['id'] for stored in profiler.list()} == set(ids[1:])
+    assert len(list(tmp_path.iterdir())) == 4
+
+
+def test_profiles_already_on_disk_count_toward_the_limit(tmp_path):
+    first = RequestProfiler(str(tmp_path), token='s3cret', max_profiles=2)
+    kept = [profile(first) for _ in range(2)]
+    second = RequestProfiler(str(tmp_path), token='s3cret', max_profiles=2)
+    newest = profile(second)
+    assert {stored['id'] for stored in second.list()} == {kept[1], newest}
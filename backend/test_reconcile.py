@@ -0,0 +1,44 @@
+import os
+
+from reconcile import LOOKUP_CHUNK, _SpillStore
+
+
+def test_spill_store_membership():
+    store = _SpillStore()
+    try:
+        store.add_faces([('f1', 'p1'), ('f2', 'p2'), ('f1', 'p9')])
+        store.add_people(['p1', 'p2'])
+        assert store.existing_faces(['f1', 'f3']) == {'f1'}
+        assert store.existing_people(['p2', 'p3']) == {'p2'}
+        assert store.existing_faces([]) == set()
+    finally:
+        store.close()
+
+
+def test_spill_store_lookups_span_chunks():
+    store = _SpillStore()
+    try:
+        face_ids = [f"f{i:05d}" for i in range(LOOKUP_CHUNK * 2 + 7)]
+        store.add_faces((face_id, 'p1') for face_id in face_ids[::2])
+        assert store.existing_faces(face_ids) == set(face_ids[::2])
+    finally:
+        store.close()
+
+
+def test_spill_store_iterates_faces_in_order_by_chunk():
+    store = _SpillStore()
+    try:
+        faces = [(f"f{i:03d}", f"p{i % 3}") for i in range(10)]
+        store.add_faces(reversed(faces))
+        chunks = list(store.iter_faces(chunk_size=4))
+        assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+        assert [face for chunk in chunks for face in chunk] == faces
+    finally:
+        store.close()
+
+
+def test_spill_store_close_removes_its_file():
+    store = _SpillStore()
+    assert os.path.exists(store.path)
+    store.close()
+    assert not os.path.exists(store.path)
@@ -0,0 +1,69 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from reminders import advance, fire_time, new_reminder
+
+NEW_YORK = 'America/New_York'
+
+
+def reminder(fire_at, tz=NEW_YORK, repeat='daily'):
+    return {'reminder_id': 'r1', 'tenant_id': 't1', 'text': 'Pills', 'fire_at': fire_at, 'timezone': tz, 'repeat': repeat}
+
+
+def test_fire_time_is_wall_clock_in_the_zone():
+    expected = datetime(2026, 1, 5, 9, 0, tzinfo=ZoneInfo(NEW_YORK)).timestamp()
+    assert fire_time(reminder('2026-01-05T09:00:00')) == expected
+
+
+def test_daily_keeps_wall_time_across_spring_forward():
+    # US clocks go forward on 2026-03-08, so that day is 23 hours long
+    before = reminder('2026-03-07T09:00:00')
+    after = advance(before, fire_time(before))
+    assert after['fire_at'] == '2026-03-08T09:00:00'
+    assert fire_time(after) - fire_time(before) == 23 * 3600
+
+
+def test_daily_keeps_wall_time_across_fall_back():
+    before = reminder('2026-10-31T21:30:00')
+    after = advance(before, fire_time(before))
+    assert after['fire_at'] == '2026-11-01T21:30:00'
+    assert fire_time(after) - fire_time(before) == 25 * 3600
+
+
+def test_weekly_advance():
+    assert advance(reminder('2026-01-05T09:00:00', repeat='weekly'), 0)['fire_at'] == '2026-01-12T09:00:00'
+
+
+def test_advance_skips_missed_occurrences():
+    start = reminder('2026-01-01T09:00:00')
+    later = datetime(2026, 1, 10, 12, 0, tzinfo=ZoneInfo(NEW_YORK)).timestamp()
+    assert advance(start, later)['fire_at'] == '2026-01-11T09:00:00'
+
+
+def test_advance_leaves_the_original_untouched():
+    start = reminder('2026-01-01T09:00:00')
+    advance(start, fire_time(start))
+    assert start['fire_at'] == '2026-01-01T09:00:00'
+
+
+def test_one_shot_does_not_advance():
+    assert advance(reminder('2026-01-01T09:00:00', repeat=None), 0) is None
+
+
+def test_new_reminder_converts_offsets_to_zone_wall_time():
+    created = new_reminder('t1', ' Lunch ', '2026-07-01T16:00:00+00:00', tz=NEW_YORK, repeat='daily')
+    assert (created['text'], created['fire_at'], created['timezone']) == ('Lunch', '2026-07-01T12:00:00', NEW_YORK)
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'text': ''},
+    {'repeat': 'hourly'},
+    {'tz': 'Mars/Olympus'},
+    {'fire_at': 'tomorrow'},
+])
+def test_new_reminder_rejects_bad_input(kwargs):
+    args = dict({'text': 'Lunch', 'fire_at': '2026-07-01T12:00:00'}, **kwargs)
+    with pytest.raises(ValueError):
+        new_reminder('t1', **args)
@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from flask import Flask, request
+from moto import mock_aws
+
+import roster as roster_module
+from roster import RosterLog
+from serialization import representation_etag
+
+TENANT = SimpleNamespace(tenant_id='t1')
+app = Flask(__name__)
+
+
+@pytest.fixture
+def roster(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        table = boto3.resource('dynamodb').create_table(
+            TableName='people', BillingMode='PAY_PER_REQUEST',
+            KeySchema=[{'AttributeName': 'person_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'person_id', 'AttributeType': 'S'}])
+        yield RosterLog(table)
+
+
+def person(person_id, **fields):
+    return dict(fields, person_id=person_id, tenant_id=TENANT.tenant_id, name=person_id)
+
+
+def test_every_write_bumps_the_version(roster):
+    assert roster.read(TENANT)['version'] == 0
+    assert roster.put_people(TENANT, [person('p1'), person('p2')]) == 1
+    assert roster.update_person(TENANT, 'p1', {'age': 80}) == 2
+    assert roster.delete_person(TENANT, 'p2') == 3
+    meta = roster.read(TENANT)
+    assert (meta['version'], meta['floor'], meta['exists']) == (3, 0, True)
+    assert roster.get_people(['p1', 'p2', roster_module.ROSTER_META_PREFIX + 't1'])['p1']['roster_version'] == 2
+
+
+def test_changes_since_merges_versions(roster):
+    roster.put_people(TENANT, [person('p1'), person('p2')])
+    roster.update_person(TENANT, 'p1', {'age': 80})
+    roster.delete_person(TENANT, 'p2')
+    roster.put_person(TENANT, person('p3'))
+    meta = roster.read(TENANT)
+    assert roster.changes_since(meta, 0) == (['p1', 'p3'], ['p2'])
+    assert roster.changes_since(meta, 2) == (['p3'], ['p2'])
+    assert roster.changes_since(meta, 4) == ([], [])
+    assert roster.changes_since(meta, 5) is None
+    assert roster.recent_person_ids(meta) == ['p3', 'p2', 'p1']
+
+
+def test_changes_below_the_floor_need_a_full_roster(roster, monkeypatch):
+    monkeypatch.setattr(roster_module, 'CHANGELOG_LIMIT', 2)
+    for version in range(1, 5):
+        roster.put_person(TENANT, person(f"p{version}"))
+    meta = roster.read(TENANT)
+    assert (meta['version'], meta['floor']) == (4, 2)
+    assert roster.changes_since(meta, 1) is None
+    assert roster.changes_since(meta, 2) == (['p3', 'p4'], [])
+    assert roster.get_people([f"{roster_module.ROSTER_META_PREFIX}t1#{v}" for v in range(1, 5)]).keys() == {
+        f"{roster_module.ROSTER_META_PREFIX}t1#3", f"{roster_module.ROSTER_META_PREFIX}t1#4"
+    }
+
+
+def test_inline_changelog_meta_item_gets_a_full_roster(roster):
+    roster.table.put_item(Item={'person_id': roster_module.ROSTER_META_PREFIX + 't1', 'version': 5, 'changes': []})
+    meta = roster.read(TENANT)
+    assert meta['floor'] == 5
+    assert roster.changes_since(meta, 4) is None
+    roster.put_person(TENANT, person('p1'))
+    assert roster.changes_since(roster.read(TENANT), 5) == (['p1'], [])
+
+
+def test_updating_a_missing_person_fails_without_a_version_bump(roster):
+    roster.put_person(TENANT, person('p1'))
+    with pytest.raises(ClientError):
+        roster.update_person(TENANT, 'gone', {'age': 80})
+    assert roster.read(TENANT)['version'] == 1
+
+
+def if_none_match(roster, etag, path='/reminders'):
+    with app.test_request_context(path, headers={'If-None-Match': f'"{etag}"'}):
+        current = representation_etag(roster.etag(TENANT, roster.read(TENANT)['version']), request)
+        return request.if_none_match.contains(current)
+
+
+def test_etag_matches_until_the_roster_changes(roster):
+    roster.put_person(TENANT, person('p1'))
+    assert roster.etag(TENANT, 1) == 'roster-t1-1'
+    assert if_none_match(roster, 'roster-t1-1')
+    roster.update_person(TENANT, 'p1', {'age': 80})
+    assert not if_none_match(roster, 'roster-t1-1')
+    assert if_none_match(roster, 'roster-t1-2')
+    assert not if_none_match(roster, 'roster-t1-2', '/reminders?since=1')
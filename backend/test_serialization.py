@@ -0,0 +1,56 @@
+from flask import Flask, request
+
+from serialization import apply_fields, parse_fields, representation_etag, select
+
+app = Flask(__name__)
+
+
+def test_parse_fields_builds_a_tree():
+    assert parse_fields('name, person.name,person.age,,capture.') == {
+        'name': {}, 'person': {'name': {}, 'age': {}}, 'capture': {}
+    }
+    assert parse_fields(None) == {}
+
+
+def test_select_keeps_only_requested_fields():
+    person = {'person_id': 'p1', 'name': 'Ann', 'notes': 'long', 'photos': [{'url': 'u', 'size': 3}]}
+    assert select(person, parse_fields('name,photos.url,missing')) == {'name': 'Ann', 'photos': [{'url': 'u'}]}
+
+
+def test_select_with_empty_tree_keeps_everything():
+    value = {'a': {'b': 1}}
+    assert select(value, {}) is value
+    assert select(value, parse_fields('a')) == value
+
+
+def test_apply_fields_picks_from_list_items_and_keeps_the_envelope():
+    payload = {'version': 7, 'full': True, 'reminders': [{'person_id': 'p1', 'name': 'Ann', 'notes': 'x'}]}
+    assert apply_fields(payload, parse_fields('name')) == {'version': 7, 'full': True, 'reminders': [{'name': 'Ann'}]}
+
+
+def test_apply_fields_filters_plain_bodies():
+    assert apply_fields({'matched': True, 'person': {'name': 'Ann', 'age': 80}}, parse_fields('person.name')) == {
+        'person': {'name': 'Ann'}
+    }
+
+
+def test_apply_fields_leaves_errors_alone():
+    payload = {'error': 'Not found', 'detail': 'x'}
+    assert apply_fields(payload, parse_fields('detail')) is payload
+
+
+def etag_for(path, **headers):
+    with app.test_request_context(path, headers=headers):
+        return representation_etag('roster-t1-7', request)
+
+
+def test_representation_etag_varies_with_the_representation():
+    assert etag_for('/reminders') == 'roster-t1-7'
+    assert etag_for('/reminders?fields=name,person_id') == etag_for('/reminders?fields=person_id,name')
+    assert etag_for('/reminders?fields=name') != 'roster-t1-7'
+    assert etag_for('/reminders', **{'Accept-Encoding': 'gzip'}) != 'roster-t1-7'
+
+
+
+def test_delta_and_full_roster_have_different_etags():
+    assert etag_for('/reminders?since=3') not in ('roster-t1-7', etag_for('/reminders?since=4'))
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+import pytest
+
+from tracing import format_traceparent, parse_traceparent
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+SPAN_ID = '00f067aa0ba902b7'
+
+
+def test_parse_traceparent():
+    assert parse_traceparent(f"00-{TRACE_ID}-{SPAN_ID}-01") == (TRACE_ID, SPAN_ID, True)
+    assert parse_traceparent(f"00-{TRACE_ID}-{SPAN_ID}-00") == (TRACE_ID, SPAN_ID, False)
+
+
+def test_parse_traceparent_normalizes_case_and_whitespace():
+    assert parse_traceparent(f"  00-{TRACE_ID.upper()}-{SPAN_ID}-03 ") == (TRACE_ID, SPAN_ID, True)
+
+
+@pytest.mark.parametrize('value', [
+    None,
+    '',
+    f"01-{TRACE_ID}-{SPAN_ID}-01",
+    f"00-{'0' * 32}-{SPAN_ID}-01",
+    f"00-{TRACE_ID}-{'0' * 16}-01",
+    f"00-{TRACE_ID[:-1]}-{SPAN_ID}-01",
+    f"00-{TRACE_ID}-{SPAN_ID}-01-extra",
+    f"00-{TRACE_ID}-{SPAN_ID[:-1]}g-01",
+])
+def test_parse_traceparent_rejects_malformed_headers(value):
+    assert parse_traceparent(value) is None
+
+
+def test_format_traceparent_round_trips():
+    span = SimpleNamespace(trace_id=TRACE_ID, span_id=SPAN_ID, sampled=False)
+    assert parse_traceparent(format_traceparent(span)) == (TRACE_ID, SPAN_ID, False)
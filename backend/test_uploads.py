@@ -0,0 +1,105 @@
+import io
+from types import SimpleNamespace
+
+import pytest
+
+from jobs import JobRegistry
+from local_backend import LocalObjectStore
+from uploads import ChunkedUploads, DirectUploads, staging_key
+
+TENANT = SimpleNamespace(tenant_id='t1', s3_prefix='tenants/t1/')
+PERSON = {'person_id': 'p1'}
+
+
+@pytest.fixture
+def objects(tmp_path):
+    return LocalObjectStore(str(tmp_path), 'http://hub:8000', 'secret')
+
+
+class FakeImages:
+    def render(self, data, **options):
+        if data == b'broken':
+            raise ValueError('cannot identify image file')
+        return {'jpeg': b'jpeg:' + data, 'thumb': b'thumb:' + data, 'options': options}
+
+
+def direct_uploads(objects, saved, max_bytes=100):
+    def save_photo(tenant, person_info, raw, rendition):
+        duplicate = raw in [data for data, _ in saved]
+        saved.append((raw, rendition['options']))
+        return f"m{len(saved)}", f"{tenant.s3_prefix}{person_info['person_id']}/m{len(saved)}.jpg", duplicate
+    return DirectUploads(objects, JobRegistry(), FakeImages(), save_photo, max_bytes)
+
+
+def test_open_issues_targets_under_the_staging_folder(objects):
+    uploads = direct_uploads(objects, [])
+    targets = uploads.open(TENANT, 'p1', count=2)
+    assert len({target['upload_id'] for target in targets}) == 2
+    assert all('/local-objects/tenants/t1/p1/incoming/' in target['url'] for target in targets)
+    with pytest.raises(ValueError):
+        uploads.open(TENANT, 'p1', content_type='image/gif')
+    with pytest.raises(ValueError):
+        uploads.open(TENANT, 'p1', count=0)
+
+
+def test_complete_processes_and_removes_staged_photos(objects):
+    saved = []
+    uploads = direct_uploads(objects, saved)
+    ids = [target['upload_id'] for target in uploads.open(TENANT, 'p1', count=5)]
+    for upload_id, data in zip(ids, [b'ann', b'ann', b'broken', b'x' * 101]):
+        objects.put(staging_key(TENANT, 'p1', upload_id), data, 'image/jpeg')
+    job = uploads.complete(TENANT, PERSON, ids)
+    uploads.executor.shutdown(wait=True)
+    status = job.to_dict()
+    assert (status['succeeded'], status['failed'], status['details']['duplicates']) == (2, 3, 1)
+    assert [error['item'] for error in status['errors']] == ids[2:]
+    assert saved[0][1]['exif_transpose'] and saved[0][1]['max_dimension'] == 2048
+    assert list(objects.list_pages('tenants/t1/p1/incoming/')) == []
+
+
+def test_complete_refuses_ids_it_did_not_issue(objects):
+    uploads = direct_uploads(objects, [])
+    with pytest.raises(ValueError):
+        uploads.complete(TENANT, PERSON, ['../../t2/p9/photo'])
+    with pytest.raises(ValueError):
+        uploads.complete(TENANT, PERSON, [])
+
+
+def send(videos, video, part_number, data):
+    return videos.write_part(TENANT, 'p1', video['name'], video['upload_id'], part_number, io.BytesIO(data), len(data))
+
+
+def test_interrupted_video_resumes_from_the_parts_received(objects):
+    videos = ChunkedUploads(objects, JobRegistry(), max_bytes=100, chunk_bytes=4)
+    videos.ffmpeg = None
+    video = videos.open(TENANT, 'p1', 'video/mp4', 10)
+    assert (video['parts'], video['name']) == (3, video['media_id'] + '.mp4')
+    send(videos, video, 1, b'0123')
+    send(videos, video, 3, b'89')
+    assert videos.status(TENANT, 'p1', video['name'], video['upload_id']) == {'received': [1, 3], 'bytes': 6}
+    with pytest.raises(ValueError, match='Missing parts: 2'):
+        videos.complete(TENANT, 'p1', video['name'], video['upload_id'])
+
+    send(videos, video, 2, b'4567')
+    send(videos, video, 2, b'4567')  # A retried chunk replaces the first attempt
+    assert videos.complete(TENANT, 'p1', video['name'], video['upload_id']) == (10, None)
+    assert objects.get(f"tenants/t1/p1/{video['name']}") == b'0123456789'
+
+
+def test_chunks_must_be_whole_and_within_limits(objects):
+    videos = ChunkedUploads(objects, JobRegistry(), max_bytes=100, chunk_bytes=4)
+    video = videos.open(TENANT, 'p1', 'video/webm', 8)
+    with pytest.raises(ValueError):
+        send(videos, video, 1, b'01234')
+    with pytest.raises(ValueError, match='ended after 2 of 4'):
+        videos.write_part(TENANT, 'p1', video['name'], video['upload_id'], 1, io.BytesIO(b'01'), 4)
+    send(videos, video, 1, b'012')
+    send(videos, video, 2, b'3456')
+    with pytest.raises(ValueError, match='must be 4 bytes'):
+        videos.complete(TENANT, 'p1', video['name'], video['upload_id'])
+    with pytest.raises(KeyError):
+        videos.status(TENANT, 'p1', '../p2/clip.mp4', video['upload_id'])
+    with pytest.raises(ValueError):
+        videos.open(TENANT, 'p1', 'video/avi', 8)
+    with pytest.raises(ValueError):
+        videos.open(TENANT, 'p1', 'video/mp4', 101)
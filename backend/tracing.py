@@ -0,0 +1,385 @@
+import contextvars
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import requests
+
+# W3C Trace Context header, minted by the camera at capture and carried through every hop
+TRACEPARENT_HEADER = 'traceparent'
+TRACEPARENT_PATTERN = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+# AWS services record the trace under X-Ray's header
+XRAY_HEADER = 'X-Amzn-Trace-Id'
+# OTLP span kinds
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+# Recent traces kept in memory for GET /traces/<trace_id>
+TRACE_BUFFER_SIZE = 500
+# Spans kept per buffered trace, and accepted per POST /v1/traces; beyond these they're dropped or refused
+MAX_SPANS_PER_TRACE = 1000
+MAX_INGEST_SPANS = 500
+# Spans waiting for export; beyond this they are dropped rather than slowing requests
+EXPORT_QUEUE_SIZE = 4096
+EXPORT_INTERVAL = 2.0
+
+_current = contextvars.ContextVar('current_span', default=None)
+
+
+def new_trace_id():
+    return f"{random.getrandbits(128):032x}"
+
+
+def new_span_id():
+    return f"{random.getrandbits(64):016x}"
+
+
+def parse_traceparent(value):
+    """(trace_id, parent span_id, sampled) from a traceparent header, or None if it's missing or malformed"""
+    match = TRACEPARENT_PATTERN.match((value or '').strip().lower())
+    if not match or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+def format_traceparent(span):
+    return f"00-{span.trace_id}-{span.span_id}-{'01' if span.sampled else '00'}"
+
+
+class Span:
+    """One timed operation; `record()` gives its export form"""
+
+    def __init__(self, tracer, name, trace_id, parent_id, sampled, kind, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.kind = kind
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, error):
+        self.error = str(error) or type(error).__name__
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        if self.sampled:
+            self.tracer.record([self.record()])
+
+    def record(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'service': self.tracer.service,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(records):
+    """OTLP/JSON ExportTraceServiceRequest body for span records, grouped by service"""
+    by_service = OrderedDict()
+    for record in records:
+        by_service.setdefault(record['service'], []).append({
+            'traceId': record['trace_id'],
+            'spanId': record['span_id'],
+            'parentSpanId': record['parent_id'] or '',
+            'name': record['name'],
+            'kind': record['kind'],
+            'startTimeUnixNano': str(record['start_ns']),
+            'endTimeUnixNano': str(record['end_ns']),
+            'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in record['attributes'].items()],
+            'status': {'code': 2, 'message': record['error']} if record['error'] else {'code': 1}
+        })
+    return {'resourceSpans': [
+        {
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service}}]},
+            'scopeSpans': [{'scope': {'name': 'alzheimer-camera'}, 'spans': spans}]
+        }
+        for service, spans in by_service.items()
+    ]}
+
+
+def _plain_value(value):
+    for key in ('stringValue', 'boolValue', 'doubleValue'):
+        if key in value:
+            return value[key]
+    if 'intValue' in value:
+        return int(value['intValue'])
+    return None
+
+
+def from_otlp(body):
+    """Span records from an OTLP/JSON ExportTraceServiceRequest; raises ValueError if it isn't one"""
+    records = []
+    try:
+        for resource_spans in body.get('resourceSpans', []):
+            resource = {item['key']: _plain_value(item['value']) for item in resource_spans.get('resource', {}).get('attributes', [])}
+            for scope_spans in resource_spans.get('scopeSpans', []):
+                for span in scope_spans.get('spans', []):
+                    status = span.get('status', {})
+                    records.append({
+                        'trace_id': span['traceId'],
+                        'span_id': span['spanId'],
+                        'parent_id': span.get('parentSpanId') or None,
+                        'name': span['name'],
+                        'kind': span.get('kind', KIND_INTERNAL),
+                        'service': resource.get('service.name', 'unknown'),
+                        'start_ns': int(span['startTimeUnixNano']),
+                        'end_ns': int(span['endTimeUnixNano']),
+                        'attributes': {item['key']: _plain_value(item['value']) for item in span.get('attributes', [])},
+                        'error': (status.get('message') or 'error') if status.get('code') == 2 else None
+                    })
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Not an OTLP/JSON trace export: {e}")
+    return records
+
+
+class JsonLinesExporter:
+    """Appends span records to a local file, one JSON object per line"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def export(self, records):
+        with open(self.path, 'a') as f:
+            f.writelines(json.dumps(record, default=str) + '\n' for record in records)
+
+
+class OtlpHttpExporter:
+    """POSTs spans as OTLP/JSON to a collector's /v1/traces"""
+
+    def __init__(self, endpoint, timeout=5):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, records):
+        response = requests.post(self.endpoint, json=to_otlp(records), timeout=self.timeout)
+        response.raise_for_status()
+
+
+def parse_exporters(spec):
+    """Exporters from e.g. "file:traces.jsonl,otlp:http://collector:4318/v1/traces"; empty exports nothing"""
+    exporters = []
+    for entry in filter(None, (part.strip() for part in (spec or '').split(','))):
+        kind, _, target = entry.partition(':')
+        if kind == 'file' and target:
+            exporters.append(JsonLinesExporter(target))
+        elif kind == 'otlp' and target:
+            exporters.append(OtlpHttpExporter(target))
+        else:
+            raise ValueError(f"Invalid trace exporter {entry!r}, expected file:<path> or otlp:<url>")
+    return exporters
+
+
+class Tracer:
+    """Creates spans, keeps recent traces in memory and exports finished spans in the background"""
+
+    def __init__(self, service, exporters=(), sample_rate=1.0, buffer_size=TRACE_BUFFER_SIZE):
+        self.service = service
+        self.exporters = list(exporters)
+        # Share of traces started here (rather than continued from a caller) that are recorded
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        self._traces = OrderedDict()
+        # Tenants of the requests each buffered trace went through, from this service's own spans
+        self._owners = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self.counters = {'spans': 0, 'ingested': 0, 'exported': 0, 'dropped': 0, 'export_errors': 0}
+        if self.exporters:
+            threading.Thread(target=self._export_loop, name='trace-export', daemon=True).start()
+
+    def current(self):
+        return _current.get()
+
+    def start_span(self, name, kind=KIND_INTERNAL, traceparent=None, **attributes):
+        """Start a span as the current one: a child of the current span, of a remote traceparent, or a new root
+
+        The caller must end() it in the same context.
+        """
+        parent = _current.get()
+        remote = parse_traceparent(traceparent) if traceparent else None
+        if remote:
+            trace_id, parent_id, sampled = remote
+        elif parent:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        else:
+            trace_id, parent_id, sampled = new_trace_id(), None, random.random() < self.sample_rate
+        span = Span(self, name, trace_id, parent_id, sampled, kind, attributes)
+        span._token = _current.set(span)
+        return span
+
+    @contextmanager
+    def span(self, name, kind=KIND_INTERNAL, **attributes):
+        span = self.start_span(name, kind, **attributes)
+        try:
+            yield span
+        except Exception as e:
+            span.fail(e)
+            raise
+        finally:
+            span.end()
+
+    def inject(self, headers):
+        """Add the current span's traceparent to outgoing HTTP headers"""
+        span = _current.get()
+        if span:
+            headers[TRACEPARENT_HEADER] = format_traceparent(span)
+        return headers
+
+    def record(self, records, ingested=False):
+        """Keep finished span records (our own, or ingested from clients) and queue them for export"""
+        with self._lock:
+            self.counters['ingested' if ingested else 'spans'] += len(records)
+            for record in records:
+                spans = self._traces.get(record['trace_id'])
+                if spans is None:
+                    spans = self._traces[record['trace_id']] = []
+                    while len(self._traces) > self.buffer_size:
+                        self._owners.pop(self._traces.popitem(last=False)[0], None)
+                if len(spans) >= MAX_SPANS_PER_TRACE:
+                    self.counters['dropped'] += 1
+                    continue
+                spans.append(record)
+                if not ingested and record['attributes'].get('tenant'):
+                    self._owners.setdefault(record['trace_id'], set()).add(record['attributes']['tenant'])
+        if not self.exporters:
+            return
+        for record in records:
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                with self._lock:
+                    self.counters['dropped'] += 1
+
+    def trace(self, trace_id, tenant_id=None):
+        """Spans of a recent trace ordered by start, with each stage's share of the end-to-end time
+
+        With a tenant, only spans tagged for that tenant are returned, plus this service's
+        untagged spans if one of the trace's requests was made for it.
+        """
+        with self._lock:
+            spans = sorted(self._traces.get(trace_id, []), key=lambda record: record['start_ns'])
+            owned = tenant_id in self._owners.get(trace_id, ())
+        if tenant_id is not None:
+            spans = [record for record in spans
+                     if record['attributes'].get('tenant', tenant_id if owned else None) == tenant_id]
+        if not spans:
+            return None
+        start = min(record['start_ns'] for record in spans)
+        end = max(record['end_ns'] for record in spans)
+        total_ms = (end - start) / 1e6
+        return {
+            'trace_id': trace_id,
+            'duration_ms': round(total_ms, 1),
+            'stages': [
+                {
+                    'name': record['name'],
+                    'service': record['service'],
+                    'span_id': record['span_id'],
+                    'parent_id': record['parent_id'],
+                    'offset_ms': round((record['start_ns'] - start) / 1e6, 1),
+                    'duration_ms': round((record['end_ns'] - record['start_ns']) / 1e6, 1),
+                    'share': round((record['end_ns'] - record['start_ns']) / 1e6 / total_ms, 3) if total_ms else 1.0,
+                    'attributes': record['attributes'],
+                    'error': record['error']
+                }
+                for record in spans
+            ]
+        }
+
+    def _export_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + EXPORT_INTERVAL
+            while len(batch) < 512:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            for exporter in self.exporters:
+                try:
+                    exporter.export(batch)
+                except Exception as e:
+                    print(f"[TRACE] {type(exporter).__name__} failed: {e}")
+                    with self._lock:
+                        self.counters['export_errors'] += 1
+            with self._lock:
+                self.counters['exported'] += len(batch)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, traces=len(self._traces), queued=self._queue.qsize())
+
+
+def instrument_boto3(tracer, session):
+    """Time every AWS call made through clients later created from a boto3 session, tagged with the current trace
+
+    Must run before the clients are created: each client copies the session's event hooks.
+    """
+    def before_call(model, context, **kwargs):
+        if tracer.current():
+            context['trace_span'] = tracer.start_span(
+                f"aws.{model.service_model.service_name}.{model.name}", KIND_CLIENT)
+
+    def before_sign(request, **kwargs):
+        span = request.context.get('trace_span')
+        if span:
+            # X-Ray accepts W3C trace IDs split as 1-<first 8 hex>-<remaining 24>
+            request.headers[XRAY_HEADER] = (
+                f"Root=1-{span.trace_id[:8]}-{span.trace_id[8:]};Parent={span.span_id};Sampled={int(span.sampled)}")
+
+    def after_call(http_response, context, **kwargs):
+        span = context.pop('trace_span', None)
+        if span:
+            span.set(status=http_response.status_code)
+            span.end()
+
+    def after_call_error(exception, context, **kwargs):
+        span = context.pop('trace_span', None)
+        if span:
+            span.fail(exception)
+            span.end()
+
+    session.events.register('before-call', before_call)
+    # Signing skips this header, so it can be set on every (re)signed attempt
+    session.events.register('before-sign', before_sign)
+    session.events.register('after-call', after_call)
+    session.events.register('after-call-error', after_call_error)
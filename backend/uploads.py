@@ -0,0 +1,248 @@
+import math
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Image types the phone may upload directly; anything else is rejected when the session is opened
+UPLOAD_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/webp')
+# Presigned upload targets stay valid this long
+UPLOAD_EXPIRES_SECONDS = 900
+# Most upload targets issued by one session request
+MAX_UPLOADS_PER_SESSION = 20
+# Upload IDs are generated here ("<ms>-<hex>"); anything else is refused so keys can't escape the staging folder
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9]{13}-[0-9a-f]{12}$')
+# Gallery photos are stored no larger than this on their longest side
+MAX_PHOTO_DIMENSION = 2048
+# Longest side of the thumbnails listed next to gallery photos
+THUMBNAIL_SIZE = 320
+# Video types and the extension they're stored under
+VIDEO_CONTENT_TYPES = {'video/mp4': '.mp4', 'video/quicktime': '.mov', 'video/webm': '.webm'}
+# Size of each chunk the phone sends; every part but the last must be exactly this (S3 needs >= 5 MiB)
+VIDEO_CHUNK_BYTES = 8 * 1024 * 1024
+# Chunk bodies are buffered in memory up to this, then on disk
+SPOOL_BYTES = 1024 * 1024
+READ_BYTES = 64 * 1024
+# Video media are named "<uuid><extension>"; the name doubles as the upload's handle
+VIDEO_NAME_PATTERN = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(\.mp4|\.mov|\.webm)$')
+# Posters are taken this far in, past any fade-in; shorter clips use their first frame
+POSTER_OFFSET_SECONDS = 1.0
+
+
+def staging_key(tenant, person_id, upload_id):
+    """Where the phone uploads to; a subfolder, so gallery listings skip it and person deletion removes it"""
+    return f"{tenant.s3_prefix}{person_id}/incoming/{upload_id}"
+
+
+def thumbnail_key(tenant, person_id, media_id):
+    return f"{tenant.s3_prefix}{person_id}/thumbs/{media_id}.jpg"
+
+
+def media_type(key):
+    return 'video' if os.path.splitext(key)[1] in VIDEO_CONTENT_TYPES.values() else 'image'
+
+
+class DirectUploads:
+    """Gallery photos uploaded by the phone straight to the object store, then processed as a job
+
+    open() hands out presigned targets under the person's staging folder, so the bytes
+    never pass through a request worker. complete() queues the staged objects for
+    normalization and thumbnails (on the image pool), then dedup and exemplar indexing
+    (via save_photo), and deletes them once handled.
+    """
+
+    def __init__(self, objects, jobs, images, save_photo, max_bytes, workers=2):
+        self.objects = objects
+        self.jobs = jobs
+        self.images = images
+        self.save_photo = save_photo
+        self.max_bytes = max_bytes
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='direct-upload')
+
+    def open(self, tenant, person_id, count=1, content_type='image/jpeg'):
+        """Presigned upload targets, one per photo; raises ValueError for bad counts or types"""
+        if content_type not in UPLOAD_CONTENT_TYPES:
+            raise ValueError(f"Unsupported content type {content_type!r}, expected one of {', '.join(UPLOAD_CONTENT_TYPES)}")
+        if not 1 <= count <= MAX_UPLOADS_PER_SESSION:
+            raise ValueError(f"count must be between 1 and {MAX_UPLOADS_PER_SESSION}")
+        expires_at = int(time.time()) + UPLOAD_EXPIRES_SECONDS
+        uploads = []
+        for _ in range(count):
+            upload_id = f"{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:12]}"
+            target = self.objects.upload_target(staging_key(tenant, person_id, upload_id), content_type,
+                                                self.max_bytes, expires_in=UPLOAD_EXPIRES_SECONDS)
+            uploads.append(dict(target, upload_id=upload_id, expires_at=expires_at))
+        return uploads
+
+    def complete(self, tenant, person_info, upload_ids):
+        """Queue uploaded photos for processing; raises ValueError for IDs this API didn't issue"""
+        bad = [upload_id for upload_id in upload_ids if not UPLOAD_ID_PATTERN.match(str(upload_id))]
+        if bad or not upload_ids:
+            raise ValueError(f"Invalid upload IDs: {', '.join(map(str, bad))}" if bad else 'No upload IDs given')
+        job = self.jobs.create('direct_upload', total=len(upload_ids), details={
+            'tenant_id': tenant.tenant_id,
+            'person_id': person_info['person_id'],
+            'duplicates': 0
+        })
+        self.executor.submit(self._run_job, job, tenant, person_info, list(upload_ids))
+        return job
+
+    def _run_job(self, job, tenant, person_info, upload_ids):
+        job.start()
+        try:
+            # One person's photos go one at a time so their dedup claims see each other
+            for upload_id in upload_ids:
+                try:
+                    job.record_success(self._process(job, tenant, person_info, upload_id))
+                except Exception as e:
+                    print(f"[UPLOAD] {job.job_id} upload {upload_id} failed: {e}")
+                    job.record_error(upload_id, e)
+            job.finish()
+        except Exception as e:
+            job.finish(error=e)
+
+    def _process(self, job, tenant, person_info, upload_id):
+        person_id = person_info['person_id']
+        key = staging_key(tenant, person_id, upload_id)
+        info = self.objects.head(key)
+        if info is None:
+            raise ValueError('Nothing uploaded, or already processed')
+        try:
+            if info['size'] > self.max_bytes:
+                raise ValueError(f"Upload is {info['size']} bytes, limit is {self.max_bytes}")
+            data = self.objects.get(key)
+            # EXIF rotation applied and size capped; waits for a pool slot however long it takes
+            rendition = self.images.render(data, max_dimension=MAX_PHOTO_DIMENSION, exif_transpose=True,
+                                           thumbnail_size=THUMBNAIL_SIZE, quality=90)
+            media_id, s3_key, duplicate = self.save_photo(tenant, person_info, data, rendition)
+            if duplicate:
+                job.increment_detail('duplicates')
+        finally:
+            # Rejected uploads are dropped too; the phone has to upload them again anyway
+            self.objects.delete(key)
+        return {
+            'upload_id': upload_id,
+            'media_id': media_id,
+            'duplicate': duplicate,
+            'uri': self.objects.url(s3_key),
+            'thumb': self.objects.url(thumbnail_key(tenant, person_id, media_id)) if not duplicate else None
+        }
+
+
+class ChunkedUploads:
+    """Resumable video uploads, streamed through the API into a multipart object
+
+    Each chunk request is read in small blocks into a spooled buffer and sent on as one
+    part, so a worker holds at most SPOOL_BYTES of it in memory. The upload is stateless
+    on the API side: the object store's multipart upload is the session, and the phone
+    resumes by asking which parts arrived. Posters are cut with ffmpeg when it's installed.
+    """
+
+    def __init__(self, objects, jobs, max_bytes, chunk_bytes=VIDEO_CHUNK_BYTES, workers=1):
+        self.objects = objects
+        self.jobs = jobs
+        self.max_bytes = max_bytes
+        self.chunk_bytes = chunk_bytes
+        self.ffmpeg = shutil.which('ffmpeg')
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='video-poster')
+
+    def _key(self, tenant, person_id, name):
+        if not VIDEO_NAME_PATTERN.match(name):
+            raise KeyError(name)
+        return f"{tenant.s3_prefix}{person_id}/{name}"
+
+    def open(self, tenant, person_id, content_type, size):
+        """Start an upload; raises ValueError for unsupported types or sizes"""
+        extension = VIDEO_CONTENT_TYPES.get(content_type)
+        if not extension:
+            raise ValueError(f"Unsupported content type {content_type!r}, expected one of {', '.join(VIDEO_CONTENT_TYPES)}")
+        if not 0 < size <= self.max_bytes:
+            raise ValueError(f"size must be between 1 and {self.max_bytes} bytes")
+        name = f"{uuid.uuid4()}{extension}"
+        upload_id = self.objects.start_multipart(self._key(tenant, person_id, name), content_type)
+        return {
+            'media_id': name[:-len(extension)],
+            'name': name,
+            'upload_id': upload_id,
+            'chunk_bytes': self.chunk_bytes,
+            'parts': math.ceil(size / self.chunk_bytes)
+        }
+
+    def write_part(self, tenant, person_id, name, upload_id, part_number, stream, length):
+        """Stream one chunk into part `part_number`; raises ValueError for bad sizes, KeyError for unknown uploads"""
+        if not 1 <= part_number <= math.ceil(self.max_bytes / self.chunk_bytes):
+            raise ValueError(f"Part number {part_number} out of range")
+        if not length or length > self.chunk_bytes:
+            raise ValueError(f"Chunks must be between 1 and {self.chunk_bytes} bytes")
+        key = self._key(tenant, person_id, name)
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as buffer:
+            received = 0
+            while received < length:
+                block = stream.read(min(READ_BYTES, length - received))
+                if not block:
+                    break
+                buffer.write(block)
+                received += len(block)
+            if received != length:
+                raise ValueError(f"Chunk ended after {received} of {length} bytes")
+            buffer.seek(0)
+            self.objects.upload_part(key, upload_id, part_number, buffer, length)
+        return length
+
+    def status(self, tenant, person_id, name, upload_id):
+        """Parts received so far, for resuming"""
+        parts = self.objects.list_parts(self._key(tenant, person_id, name), upload_id)
+        return {'received': sorted(parts), 'bytes': sum(parts.values())}
+
+    def complete(self, tenant, person_id, name, upload_id):
+        """Assemble the video and queue its poster; returns (size, poster job or None)"""
+        key = self._key(tenant, person_id, name)
+        parts = self.objects.list_parts(key, upload_id)
+        numbers = sorted(parts)
+        if not numbers or numbers != list(range(1, len(numbers) + 1)):
+            missing = sorted(set(range(1, (numbers[-1] if numbers else 0) + 1)) - set(numbers)) or [1]
+            raise ValueError(f"Missing parts: {', '.join(map(str, missing))}")
+        if any(parts[number] != self.chunk_bytes for number in numbers[:-1]):
+            raise ValueError(f"Every part but the last must be {self.chunk_bytes} bytes")
+        if sum(parts.values()) > self.max_bytes:
+            self.objects.abort_multipart(key, upload_id)
+            raise ValueError(f"Video is larger than {self.max_bytes} bytes")
+        size = self.objects.complete_multipart(key, upload_id)
+        if not self.ffmpeg:
+            return size, None
+        media_id = os.path.splitext(name)[0]
+        job = self.jobs.create('video_poster', total=1, details={'tenant_id': tenant.tenant_id, 'person_id': person_id,
+                                                                 'media_id': media_id})
+        self.executor.submit(self._run_poster, job, tenant, person_id, media_id, key)
+        return size, job
+
+    def abort(self, tenant, person_id, name, upload_id):
+        self.objects.abort_multipart(self._key(tenant, person_id, name), upload_id)
+
+    def _run_poster(self, job, tenant, person_id, media_id, key):
+        job.start()
+        try:
+            poster = self.extract_poster(self.objects.url(key, expires_in=600))
+            self.objects.put(thumbnail_key(tenant, person_id, media_id), poster, 'image/jpeg')
+            job.record_success({'media_id': media_id, 'thumb': self.objects.url(thumbnail_key(tenant, person_id, media_id))})
+            job.finish()
+        except Exception as e:
+            print(f"[VIDEO] Poster for {key} failed: {e}")
+            job.record_error(media_id, e)
+            job.finish()
+
+    def extract_poster(self, url):
+        """JPEG poster from a video URL; ffmpeg reads only the ranges it needs, never the whole file"""
+        for offset in (POSTER_OFFSET_SECONDS, 0):
+            result = subprocess.run(
+                [self.ffmpeg, '-v', 'error', '-ss', str(offset), '-i', url, '-frames:v', '1',
+                 '-vf', f"scale='min({THUMBNAIL_SIZE},iw)':-2", '-f', 'image2', '-c:v', 'mjpeg', '-'],
+                capture_output=True, timeout=60
+            )
+            if result.returncode == 0 and result.stdout:
+                return result.stdout
+        raise RuntimeError(result.stderr.decode(errors='replace').strip() or 'No frame decoded')
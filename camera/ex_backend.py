@@ -1,31 +1,97 @@
 from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import base64
+import os
+import threading
+import time
+
+from tracing import SpanSink, TRACEPARENT_HEADER, new_span_id, parse_traceparent, traceparent
 
 app = Flask(__name__)
 CORS(app)
 
 latest_frame_b64 = None  # global variable to store last uploaded frame as base64
+latest_frame_meta = {}
+
+# Relay spans (how long each frame waited here for the viewer) go to a JSON-lines file
+# or an OTLP collector URL such as the API's /v1/traces, authorized by a device token
+spans = SpanSink("relay", os.getenv("TRACE_EXPORT"), token=os.getenv("TRACE_TOKEN"))
+latest_frame_trace = None  # (trace_id, upload span_id, wait span_id, received ns) of the stored frame
+
+# Capture hints sent back to the camera: frames only need to arrive as often as the
+# viewer polls for them, and smaller/slower while uploads are backing up
+MIN_FRAME_INTERVAL_MS = 100
+IDLE_FRAME_INTERVAL_MS = 2000
+VIEWER_TIMEOUT = 10  # seconds without a /get_frame poll before the viewer counts as gone
+hints_lock = threading.Lock()
+uploads_in_flight = 0
+last_poll = 0.0
+poll_interval = None  # moving average of seconds between polls
+
+def capture_hints():
+    with hints_lock:
+        viewer_active = poll_interval is not None and time.time() - last_poll < VIEWER_TIMEOUT
+        interval_ms = round(poll_interval * 1000) if viewer_active else IDLE_FRAME_INTERVAL_MS
+        backed_up = uploads_in_flight > 1
+    if backed_up:
+        return {'frame_interval_ms': max(interval_ms, 500) * 2, 'max_dimension': 640, 'jpeg_quality': 70}
+    return {
+        'frame_interval_ms': min(max(interval_ms, MIN_FRAME_INTERVAL_MS), IDLE_FRAME_INTERVAL_MS),
+        'max_dimension': 960,
+        'jpeg_quality': 80
+    }
 
 @app.route('/upload', methods=['POST'])
 def upload():
-    global latest_frame_b64
+    global latest_frame_b64, latest_frame_meta, latest_frame_trace, uploads_in_flight
+    received = time.time_ns()
+    with hints_lock:
+        uploads_in_flight += 1
     try:
         data = request.get_json()
         if not data or "frame" not in data:
             return jsonify({"error": "No frame provided"}), 400
         
         latest_frame_b64 = data["frame"]  # store base64 string directly
+        # "raw" frames come with their numpy shape; "jpeg" frames are self-describing
+        latest_frame_meta = {"encoding": data.get("encoding", "raw"), "shape": data.get("shape")}
+
+        # Continue the camera's trace: the viewer forwards the frame's traceparent to /recognize
+        trace = parse_traceparent(request.headers.get(TRACEPARENT_HEADER))
+        if trace:
+            trace_id, camera_span = trace
+            upload_span = new_span_id()
+            spans.add("relay.upload", trace_id, upload_span, camera_span, received, time.time_ns())
+            latest_frame_trace = (trace_id, upload_span, new_span_id(), received)
+            latest_frame_meta["traceparent"] = traceparent(trace_id, latest_frame_trace[2])
+        else:
+            latest_frame_trace = None
 
-        return jsonify({"success": True, "message": "Frame received"}), 200
+        return jsonify({"success": True, "message": "Frame received", "capture": capture_hints()}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        with hints_lock:
+            uploads_in_flight -= 1
 
 @app.route('/get_frame')
 def get_frame():
-    global latest_frame_b64
+    global latest_frame_b64, latest_frame_trace, last_poll, poll_interval
+    now = time.time()
+    with hints_lock:
+        if now - last_poll < VIEWER_TIMEOUT:
+            elapsed = now - last_poll
+            poll_interval = elapsed if poll_interval is None else 0.8 * poll_interval + 0.2 * elapsed
+        else:
+            poll_interval = None
+        last_poll = now
     if latest_frame_b64:
-        return jsonify({"frame": latest_frame_b64})
+        # A frame's wait ends the first time the viewer picks it up
+        if latest_frame_trace:
+            trace_id, upload_span, wait_span, received = latest_frame_trace
+            spans.add("relay.wait", trace_id, wait_span, upload_span, received, time.time_ns())
+            latest_frame_trace = None
+        return jsonify({"frame": latest_frame_b64, **latest_frame_meta})
     else:
         return jsonify({"error": "No frame available"}), 404
 
@@ -0,0 +1,123 @@
+import math
+import time
+
+import cv2
+import numpy as np
+
+# Frames are scored on a small grayscale copy; blur and exposure show up fine at this size
+SCORE_WIDTH = 320
+# Pixels this close to black or white count as clipped
+CLIP_LOW = 5
+CLIP_HIGH = 250
+# Faces smaller than this fraction of the frame get little credit; Rekognition misses them anyway
+MIN_FACE_AREA = 0.01
+
+
+def load_face_detector():
+    """OpenCV's bundled frontal-face Haar cascade, or None if this build doesn't ship it"""
+    try:
+        detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    except AttributeError:
+        return None
+    return None if detector.empty() else detector
+
+
+def _gray(frame):
+    height, width = frame.shape[:2]
+    if width > SCORE_WIDTH:
+        frame = cv2.resize(frame, (SCORE_WIDTH, int(height * SCORE_WIDTH / width)), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+
+def sharpness(gray):
+    """Variance of the Laplacian: low for motion-blurred or out-of-focus frames"""
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def exposure(gray):
+    """1 for a well-exposed frame, towards 0 as it gets dark, blown out or clipped"""
+    mean = float(gray.mean())
+    clipped = float(np.count_nonzero((gray < CLIP_LOW) | (gray > CLIP_HIGH))) / gray.size
+    return max(0.0, 1 - abs(mean - 128) / 128) * (1 - clipped)
+
+
+def largest_face(gray, detector):
+    """(left, top, width, height) of the largest detected face in the scoring image, or None"""
+    faces = detector.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=4, minSize=(24, 24))
+    if len(faces) == 0:
+        return None
+    return tuple(int(v) for v in max(faces, key=lambda face: face[2] * face[3]))
+
+
+def pad_box(box, frame_shape, padding=0.4):
+    """A face box grown by `padding` of its size on every side, clamped to the frame
+
+    Rekognition wants some context around the face (hair, jaw, ears) to match reliably.
+    """
+    height, width = frame_shape[:2]
+    left, top, w, h = box
+    pad_x, pad_y = int(w * padding), int(h * padding)
+    x0, y0 = max(0, left - pad_x), max(0, top - pad_y)
+    x1, y1 = min(width, left + w + pad_x), min(height, top + h + pad_y)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+class FrameScorer:
+    """Scores frames by sharpness and exposure, and by face size when a detector is available"""
+
+    def __init__(self, detector=None):
+        self.detector = detector
+
+    def cheap_score(self, gray):
+        return math.log1p(sharpness(gray)) * exposure(gray)
+
+    def score(self, frame, gray=None, cheap=None):
+        """(score, largest face box in frame coordinates or None)"""
+        gray = _gray(frame) if gray is None else gray
+        cheap = self.cheap_score(gray) if cheap is None else cheap
+        if self.detector is None:
+            return cheap, None
+        box = largest_face(gray, self.detector)
+        area = box[2] * box[3] / gray.size if box else 0.0
+        # No face: keep the frame only as a last resort; bigger faces up to ~10% of the frame help
+        if area < MIN_FACE_AREA:
+            return cheap * 0.1, None
+        scale = frame.shape[1] / gray.shape[1]
+        return cheap * (0.5 + min(area, 0.1) * 5), tuple(round(v * scale) for v in box)
+
+
+class BurstSelector:
+    """Keeps the best-scoring frame seen in the current window
+
+    The face detector is the expensive part, so it only runs on frames whose cheap
+    sharpness/exposure score comes close to the best frame so far.
+    """
+
+    def __init__(self, scorer, detect_ratio=0.8):
+        self.scorer = scorer
+        self.detect_ratio = detect_ratio
+        self.reset()
+
+    def reset(self):
+        self.best = None
+        self.best_box = None
+        self.best_score = -1.0
+        self.best_cheap = 0.0
+        self.frames = 0
+        self.started = time.monotonic()
+
+    def add(self, frame):
+        self.frames += 1
+        gray = _gray(frame)
+        cheap = self.scorer.cheap_score(gray)
+        if self.best is not None and cheap < self.best_cheap * self.detect_ratio:
+            return
+        score, box = self.scorer.score(frame, gray, cheap)
+        if score > self.best_score:
+            self.best, self.best_box, self.best_score, self.best_cheap = frame, box, score, cheap
+
+    def take(self):
+        """(best frame, its face box or None, its score, frames considered) for the window, then start a new one"""
+        result = (self.best, self.best_box, self.best_score, self.frames)
+        self.reset()
+        return result
@@ -4,7 +4,36 @@ import base64
 import json
 import time
 
+from frame_quality import FrameScorer, BurstSelector, load_face_detector, pad_box
+from tracing import SpanSink, TRACEPARENT_HEADER, new_trace_id, new_span_id, traceparent
+
 url = "http://127.0.0.1:5000/upload"
+# Set to the API's /recognize (e.g. "http://127.0.0.1:8000/recognize") to send padded face
+# crops straight to recognition instead of whole frames to the relay; frames without a face are skipped
+RECOGNIZE_URL = None
+# Where this camera's trace spans go: a JSON-lines file, or an OTLP collector such as the
+# API's "http://127.0.0.1:8000/v1/traces"; None still sends trace IDs but records nothing here
+TRACE_EXPORT = None
+# Device token for the API's collector (python backend/device_auth.py --tenant <id> --device <name>)
+TRACE_TOKEN = None
+
+# Capture settings; the server's "capture" hints replace these after every upload
+capture = {"frame_interval_ms": 200, "max_dimension": 960, "jpeg_quality": 80}
+# Client-side backoff when the server stops answering in time, on top of the hints
+MAX_BACKOFF_MS = 5000
+backoff_ms = 0
+
+def apply_hints(hints):
+    """Adopt the server's capture hints, resizing the camera only when the resolution changes"""
+    global capture
+    if not hints:
+        return
+    if hints.get("max_dimension") != capture.get("max_dimension"):
+        size = hints["max_dimension"]
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, size)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size * 3 // 4)
+        print(f"↻ Capture now every {hints['frame_interval_ms']} ms at ≤{size}px, quality {hints['jpeg_quality']}")
+    capture = {**capture, **hints}
 
 # Try different camera indices
 camera_found = False
@@ -20,32 +49,95 @@ if not camera_found:
     print("Error: Could not open any webcam")
     exit()
 
+# Only the best frame of each interval is sent: sharp, well exposed, largest face
+face_detector = load_face_detector()
+if face_detector is None:
+    print("No face detector available; picking frames by sharpness and exposure only")
+selector = BurstSelector(FrameScorer(face_detector))
+spans = SpanSink("camera", TRACE_EXPORT, token=TRACE_TOKEN)
+
 while True:
-    ret, frame = cap.read()
+    # Read frames for one interval, keeping the best
+    window = (capture["frame_interval_ms"] + backoff_ms) / 1000
+    # Every sent frame starts a trace that the relay and the API continue
+    trace_id, frame_span = new_trace_id(), new_span_id()
+    capture_started = time.time_ns()
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        selector.add(frame)
+        if time.monotonic() - selector.started >= window:
+            break
     if not ret:
         break
+    frame, face_box, score, considered = selector.take()
+    encode_started = time.time_ns()
+    spans.add("camera.capture", trace_id, new_span_id(), frame_span, capture_started, encode_started,
+              frames=considered, score=round(score, 2))
+
+    crop = None
+    if RECOGNIZE_URL and face_detector is not None:
+        if face_box is None:
+            print(f"· No face in {considered} frames, nothing sent")
+            continue
+        # Only the padded face region goes over the wire
+        left, top, box_width, box_height = pad_box(face_box, frame.shape)
+        crop = {"box": [left, top, box_width, box_height], "frame": [frame.shape[1], frame.shape[0]]}
+        frame = frame[top:top + box_height, left:left + box_width]
 
-    # Convert raw frame directly to base64 (much faster)
-    frame_bytes = frame.tobytes()
-    frame_b64 = base64.b64encode(frame_bytes).decode('utf-8')
+    # Shrink to the hinted size and send as JPEG rather than raw pixels
+    height, width = frame.shape[:2]
+    scale = capture["max_dimension"] / max(height, width)
+    if scale < 1:
+        frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, capture["jpeg_quality"]])
+    if not ok:
+        continue
+    frame_b64 = base64.b64encode(jpeg.tobytes()).decode('utf-8')
+    upload_started = time.time_ns()
+    spans.add("camera.encode", trace_id, new_span_id(), frame_span, encode_started, upload_started,
+              bytes=len(jpeg), cropped=crop is not None)
 
-    # Build JSON payload with raw frame data
-    payload = json.dumps({"frame": frame_b64, "shape": frame.shape})
+    # Build JSON payload with the encoded frame
+    if RECOGNIZE_URL:
+        target = RECOGNIZE_URL
+        payload = json.dumps({"image": frame_b64, **({"crop": crop} if crop else {})})
+    else:
+        target = url
+        payload = json.dumps({"frame": frame_b64, "encoding": "jpeg", "shape": frame.shape})
 
-    headers = {"Content-Type": "application/json"}
+    upload_span = new_span_id()
+    headers = {"Content-Type": "application/json", TRACEPARENT_HEADER: traceparent(trace_id, upload_span)}
+    status = None
 
     try:
-        response = requests.post(url, data=payload, headers=headers, timeout=1)
+        # Allow a slow server up to a few frame intervals before giving up on this frame
+        timeout = max(1, 3 * capture["frame_interval_ms"] / 1000)
+        response = requests.post(target, data=payload, headers=headers, timeout=(1, timeout))
+        status = response.status_code
+        body = response.json() if response.headers.get("Content-Type", "").startswith("application/json") else {}
+        apply_hints(body.get("capture"))
         if response.status_code == 200:
-            print("✓ Frame sent successfully")
+            print(f"✓ Frame sent successfully (best of {considered}, score {score:.2f}, {len(jpeg)} bytes)")
+            if body.get("matched"):
+                print(f"  Recognized: {body.get('note')} (trace {trace_id})")
+            backoff_ms = 0
         else:
             print(f"✗ Server error: {response.status_code}")
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                backoff_ms = min(MAX_BACKOFF_MS, int(retry_after) * 1000)
+    except requests.exceptions.Timeout:
+        backoff_ms = min(MAX_BACKOFF_MS, max(2 * backoff_ms, capture["frame_interval_ms"]))
+        print(f"✗ Server too slow, backing off {backoff_ms} ms")
     except requests.exceptions.ConnectionError:
         print("✗ Cannot connect to server - is ex_backend.py running?")
     except Exception as e:
         print(f"✗ Error sending frame: {e}")
-
-    # No delay - send as fast as possible
-    pass
+    finally:
+        finished = time.time_ns()
+        spans.add("camera.upload", trace_id, upload_span, frame_span, upload_started, finished, status=status or 0)
+        spans.add("camera.frame", trace_id, frame_span, None, capture_started, finished)
 
 cap.release()
\ No newline at end of file
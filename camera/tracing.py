@@ -0,0 +1,94 @@
+import json
+import queue
+import random
+import threading
+import time
+
+import requests
+
+# W3C Trace Context header; the backend continues the trace a frame starts here
+TRACEPARENT_HEADER = "traceparent"
+
+
+def new_trace_id():
+    return f"{random.getrandbits(128):032x}"
+
+
+def new_span_id():
+    return f"{random.getrandbits(64):016x}"
+
+
+def traceparent(trace_id, span_id):
+    return f"00-{trace_id}-{span_id}-01"
+
+
+def parse_traceparent(value):
+    """(trace_id, span_id) from a traceparent header, or None"""
+    parts = (value or "").strip().lower().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+class SpanSink:
+    """Ships finished spans from a background thread so the capture loop never waits on it
+
+    `target` is a file path (one JSON span per line) or an OTLP/JSON collector URL,
+    e.g. the backend's own http://<host>:8000/v1/traces. None drops spans. `token` is
+    sent as a bearer token to collector URLs; the backend's needs a device token.
+    """
+
+    def __init__(self, service, target=None, batch_seconds=2.0, token=None):
+        self.service = service
+        self.target = target
+        self.token = token
+        self.batch_seconds = batch_seconds
+        self._queue = queue.Queue(maxsize=1024)
+        if target:
+            threading.Thread(target=self._run, name="span-sink", daemon=True).start()
+
+    def add(self, name, trace_id, span_id, parent_id, start_ns, end_ns, **attributes):
+        if not self.target:
+            return
+        try:
+            self._queue.put_nowait({
+                "trace_id": trace_id, "span_id": span_id, "parent_id": parent_id, "name": name, "kind": 1,
+                "service": self.service, "start_ns": start_ns, "end_ns": end_ns, "attributes": attributes, "error": None
+            })
+        except queue.Full:
+            pass
+
+    def _otlp(self, spans):
+        def value(v):
+            if isinstance(v, bool):
+                return {"boolValue": v}
+            if isinstance(v, int):
+                return {"intValue": str(v)}
+            if isinstance(v, float):
+                return {"doubleValue": v}
+            return {"stringValue": str(v)}
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service}}]},
+            "scopeSpans": [{"scope": {"name": "alzheimer-camera"}, "spans": [{
+                "traceId": span["trace_id"], "spanId": span["span_id"], "parentSpanId": span["parent_id"] or "",
+                "name": span["name"], "kind": 1,
+                "startTimeUnixNano": str(span["start_ns"]), "endTimeUnixNano": str(span["end_ns"]),
+                "attributes": [{"key": k, "value": value(v)} for k, v in span["attributes"].items()]
+            } for span in spans]}]
+        }]}
+
+    def _run(self):
+        while True:
+            spans = [self._queue.get()]
+            time.sleep(self.batch_seconds)
+            while not self._queue.empty():
+                spans.append(self._queue.get_nowait())
+            try:
+                if self.target.startswith(("http://", "https://")):
+                    headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+                    requests.post(self.target, json=self._otlp(spans), headers=headers, timeout=5)
+                else:
+                    with open(self.target, "a") as f:
+                        f.writelines(json.dumps(span) + "\n" for span in spans)
+            except Exception as e:
+                print(f"✗ Could not export {len(spans)} spans: {e}")
@@ -1,28 +1,89 @@
 // Use your computer's IP address for mobile testing
 const API_BASE_URL = __DEV__ ? 'http://172.17.204.88:8000' : 'http://localhost:8000';
 
+// Patient/household this device belongs to (null uses the backend's default tenant)
+const TENANT_ID = null;
+
+// Push-channel token from `python device_auth.py --tenant <id> --device <name>` (null disables live updates)
+const DEVICE_TOKEN = null;
+
+// Announcement audio profile: 'standard', 'compact' or 'voice' (smallest, for low-bandwidth wearables); null uses the server default
+const AUDIO_PROFILE = null;
+
+// Report the phone's recognize round trip to the API's trace collector, next to the server's own spans (needs DEVICE_TOKEN)
+const TRACE_REPORTING = false;
+
+const randomHex = (length) => Array.from({ length }, () => Math.floor(Math.random() * 16).toString(16)).join('');
+
+// Sends one finished span as OTLP/JSON; failures are ignored, tracing must never break the app
+const reportSpan = (name, traceId, spanId, startMs, endMs, attributes = {}) => {
+  if (!TRACE_REPORTING || !DEVICE_TOKEN) return;
+  fetch(`${API_BASE_URL}/v1/traces`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Authorization: `Bearer ${DEVICE_TOKEN}` },
+    body: JSON.stringify({
+      resourceSpans: [{
+        resource: { attributes: [{ key: 'service.name', value: { stringValue: 'phone' } }] },
+        scopeSpans: [{
+          scope: { name: 'alzheimer-camera' },
+          spans: [{
+            traceId,
+            spanId,
+            name,
+            kind: 3,
+            startTimeUnixNano: `${startMs}000000`,
+            endTimeUnixNano: `${endMs}000000`,
+            attributes: Object.entries(attributes).map(([key, value]) => ({ key, value: { stringValue: String(value) } })),
+          }],
+        }],
+      }],
+    }),
+  }).catch(() => {});
+};
+
+const withTenant = (headers = {}) => (TENANT_ID ? { ...headers, 'X-Tenant-ID': TENANT_ID } : headers);
+
+// Roster kept between refreshes so /reminders only sends what changed.
+// Presigned image URLs expire after an hour, so refetch in full before that.
+const ROSTER_FULL_REFRESH_MS = 50 * 60 * 1000;
+let rosterCache = null; // { version, etag, fetchedAt, people: Map<person_id, reminder> }
+
+// Unfinished video uploads by file URI, so a retry resumes instead of starting over
+const videoUploads = new Map();
+
+const sortedRoster = () =>
+  [...rosterCache.people.values()].sort((a, b) => String(a.added_date ?? '').localeCompare(String(b.added_date ?? '')));
+
 export const api = {
   // Recognize a person from image
   async recognizePerson(imageBase64) {
+    // The photo starts a trace; the result's trace_id finds it under /traces/<trace_id>
+    const traceId = randomHex(32);
+    const spanId = randomHex(16);
+    const startedAt = Date.now();
     const response = await fetch(`${API_BASE_URL}/recognize`, {
       method: 'POST',
-      headers: {
+      headers: withTenant({
         'Content-Type': 'application/json',
-      },
+        traceparent: `00-${traceId}-${spanId}-01`,
+        ...(AUDIO_PROFILE ? { 'X-Audio-Profile': AUDIO_PROFILE } : {}),
+      }),
       body: JSON.stringify({
         image: imageBase64
       })
     });
-    return response.json();
+    const result = await response.json();
+    reportSpan('phone.recognize', traceId, spanId, startedAt, Date.now(), { status: response.status });
+    return result;
   },
 
   // Add a new person
   async addPerson(imageBase64, name, relationship, age, notes) {
     const response = await fetch(`${API_BASE_URL}/add_person`, {
       method: 'POST',
-      headers: {
+      headers: withTenant({
         'Content-Type': 'application/json',
-      },
+      }),
       body: JSON.stringify({
         image: imageBase64,
         name,
@@ -34,19 +95,45 @@ export const api = {
     return response.json();
   },
 
-  // Get all people (reminders)
+  // Get all people (reminders), syncing only changes since the last call
   async getReminders() {
-    const response = await fetch(`${API_BASE_URL}/reminders`);
-    return response.json();
+    const cacheFresh = rosterCache && Date.now() - rosterCache.fetchedAt < ROSTER_FULL_REFRESH_MS;
+    const url = cacheFresh
+      ? `${API_BASE_URL}/reminders?since=${rosterCache.version}`
+      : `${API_BASE_URL}/reminders`;
+    const headers = withTenant(cacheFresh ? { 'If-None-Match': rosterCache.etag } : {});
+
+    const response = await fetch(url, { headers });
+    if (response.status === 304 && cacheFresh) {
+      return { reminders: sortedRoster() };
+    }
+
+    const data = await response.json();
+    if (!response.ok || data.error) {
+      return data;
+    }
+
+    if (data.full) {
+      rosterCache = {
+        people: new Map(data.reminders.map((person) => [person.person_id, person])),
+        fetchedAt: Date.now(),
+      };
+    } else {
+      data.changed.forEach((person) => rosterCache.people.set(person.person_id, person));
+      data.deleted.forEach((personId) => rosterCache.people.delete(personId));
+    }
+    rosterCache.version = data.version;
+    rosterCache.etag = response.headers.get('ETag');
+    return { reminders: sortedRoster() };
   },
 
   // Edit a person
   async editPerson(personId, name, relationship, age, notes, images = []) {
     const response = await fetch(`${API_BASE_URL}/edit_person/${personId}`, {
       method: 'PUT',
-      headers: {
+      headers: withTenant({
         'Content-Type': 'application/json',
-      },
+      }),
       body: JSON.stringify({
         name,
         relationship,
@@ -62,22 +149,22 @@ export const api = {
   async deletePerson(personId) {
     const response = await fetch(`${API_BASE_URL}/delete_person/${personId}`, {
       method: 'DELETE',
-      headers: {
+      headers: withTenant({
         'Content-Type': 'application/json',
-      }
+      })
     });
     return response.json();
   },
 
   // Get person details
   async getPersonDetails(personId) {
-    const response = await fetch(`${API_BASE_URL}/person/${personId}`);
+    const response = await fetch(`${API_BASE_URL}/person/${personId}`, { headers: withTenant() });
     return response.json();
   },
 
   // Get person's media gallery
   async getPersonMedia(personId) {
-    const response = await fetch(`${API_BASE_URL}/person/${personId}/media`);
+    const response = await fetch(`${API_BASE_URL}/person/${personId}/media`, { headers: withTenant() });
     return response.json();
   },
 
@@ -85,9 +172,9 @@ export const api = {
   async addPersonMedia(personId, images) {
     const response = await fetch(`${API_BASE_URL}/person/${personId}/media`, {
       method: 'POST',
-      headers: {
+      headers: withTenant({
         'Content-Type': 'application/json',
-      },
+      }),
       body: JSON.stringify({
         images: Array.isArray(images) ? images : [images]
       })
@@ -95,13 +182,137 @@ export const api = {
     return response.json();
   },
 
+  // Upload photos (local file URIs) straight to storage, then have the backend process them.
+  // Resolves with the processing job; poll getJob(job_id) for the new media.
+  async uploadPersonPhotos(personId, imageUris) {
+    const uris = Array.isArray(imageUris) ? imageUris : [imageUris];
+    const contentType = uris[0].toLowerCase().endsWith('.png') ? 'image/png' : 'image/jpeg';
+    const session = await fetch(`${API_BASE_URL}/person/${personId}/uploads`, {
+      method: 'POST',
+      headers: withTenant({
+        'Content-Type': 'application/json',
+      }),
+      body: JSON.stringify({ count: uris.length, content_type: contentType })
+    }).then((response) => response.json());
+    if (session.error) return session;
+
+    const uploaded = [];
+    await Promise.all(session.uploads.map(async (target, index) => {
+      let response;
+      if (target.method === 'POST') {
+        const form = new FormData();
+        Object.entries(target.fields).forEach(([key, value]) => form.append(key, value));
+        form.append('file', { uri: uris[index], name: `photo-${index}`, type: contentType });
+        response = await fetch(target.url, { method: 'POST', body: form });
+      } else {
+        const blob = await (await fetch(uris[index])).blob();
+        response = await fetch(target.url, { method: 'PUT', headers: target.headers, body: blob });
+      }
+      if (response.ok) uploaded.push(target.upload_id);
+    }));
+    if (!uploaded.length) return { error: 'Photo upload failed' };
+
+    const response = await fetch(`${API_BASE_URL}${session.complete_url}`, {
+      method: 'POST',
+      headers: withTenant({
+        'Content-Type': 'application/json',
+      }),
+      body: JSON.stringify({ upload_ids: uploaded })
+    });
+    return response.json();
+  },
+
+  // Upload a video message in chunks. Calling it again with the same URI after a failure
+  // resumes from the chunks the backend already has.
+  async uploadPersonVideo(personId, videoUri, contentType = 'video/mp4', onProgress = null) {
+    const blob = await (await fetch(videoUri)).blob();
+    let session = videoUploads.get(videoUri);
+    let received = [];
+    if (session) {
+      const status = await fetch(`${API_BASE_URL}${session.upload_url}?upload_id=${session.upload_id}`, { headers: withTenant() });
+      if (status.ok) received = (await status.json()).received;
+      else session = null;
+    }
+    if (!session) {
+      const response = await fetch(`${API_BASE_URL}/person/${personId}/videos`, {
+        method: 'POST',
+        headers: withTenant({
+          'Content-Type': 'application/json',
+        }),
+        body: JSON.stringify({ content_type: contentType, size: blob.size })
+      });
+      session = await response.json();
+      if (session.error) return session;
+      videoUploads.set(videoUri, session);
+    }
+
+    const query = `?upload_id=${session.upload_id}`;
+    for (let part = 1; part <= session.parts; part++) {
+      if (!received.includes(part)) {
+        const chunk = blob.slice((part - 1) * session.chunk_bytes, part * session.chunk_bytes);
+        const response = await fetch(`${API_BASE_URL}${session.upload_url}/parts/${part}${query}`, {
+          method: 'PUT',
+          headers: withTenant({ 'Content-Type': 'application/octet-stream' }),
+          body: chunk
+        });
+        if (!response.ok) return { error: `Chunk ${part} failed; call again to resume` };
+      }
+      if (onProgress) onProgress(part / session.parts);
+    }
+
+    const response = await fetch(`${API_BASE_URL}${session.upload_url}/complete${query}`, {
+      method: 'POST',
+      headers: withTenant()
+    });
+    const result = await response.json();
+    if (result.success) videoUploads.delete(videoUri);
+    return result;
+  },
+
+  async getJob(jobId) {
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`, { headers: withTenant() });
+    return response.json();
+  },
+
   // Delete specific media from person's gallery
   async deletePersonMedia(personId, mediaId) {
     const response = await fetch(`${API_BASE_URL}/person/${personId}/media/${mediaId}`, {
       method: 'DELETE',
-      headers: {
+      headers: withTenant({
         'Content-Type': 'application/json',
-      }
+      })
+    });
+    return response.json();
+  },
+
+  // Scheduled reminders ("take pills at 9"), pushed as `reminder` events when due
+  async getTimedReminders() {
+    const response = await fetch(`${API_BASE_URL}/timed_reminders`, { headers: withTenant() });
+    return response.json();
+  },
+
+  // fireAt: ISO date/time in timeZone; repeat: null, 'daily' or 'weekly'
+  async addTimedReminder(text, fireAt, { timeZone, repeat = null, personId = null } = {}) {
+    const response = await fetch(`${API_BASE_URL}/timed_reminders`, {
+      method: 'POST',
+      headers: withTenant({
+        'Content-Type': 'application/json',
+      }),
+      body: JSON.stringify({
+        text,
+        fire_at: fireAt,
+        timezone: timeZone ?? Intl.DateTimeFormat().resolvedOptions().timeZone,
+        repeat,
+        person_id: personId
+      })
+    });
+    return response.json();
+  },
+
+  async cancelTimedReminder(reminderId) {
+    const response = await fetch(`${API_BASE_URL}/timed_reminders/${reminderId}`, {
+      method: 'DELETE',
+      headers: withTenant()
     });
     return response.json();
   },
@@ -144,22 +355,21 @@ export const imagesToBase64 = async (imageUris) => {
   }
 };
 
-// Update person with gallery images
+// Update person with gallery images, uploaded directly to storage rather than through the API
 export const updatePersonWithImages = async (personId, personData, imageUris = []) => {
   try {
-    let images = [];
-    if (imageUris.length > 0) {
-      images = await imagesToBase64(imageUris);
-    }
-    
-    return await api.editPerson(
+    const result = await api.editPerson(
       personId,
       personData.name,
       personData.relationship,
       personData.age,
-      personData.notes,
-      images
+      personData.notes
     );
+    if (result.success && imageUris.length > 0) {
+      const upload = await api.uploadPersonPhotos(personId, imageUris);
+      return { ...result, upload_job: upload.job_id, upload_error: upload.error };
+    }
+    return result;
   } catch (error) {
     console.error('Error updating person with images:', error);
     throw error;
@@ -177,4 +387,82 @@ export const testConnection = async () => {
     console.error('Backend connection failed:', error);
     throw error;
   }
-};
\ No newline at end of file
+};
+// Subscribe to live recognition/roster events over SSE.
+// handlers: { onRecognition(event), onRoster(event), onReminder(event), onReset() }; returns an unsubscribe function.
+export const subscribeEvents = (handlers = {}) => {
+  if (!DEVICE_TOKEN) {
+    return () => {};
+  }
+
+  let xhr = null;
+  let lastEventId = null;
+  let retryMs = 3000;
+  let reconnectTimer = null;
+  let closed = false;
+
+  // Roster events only say what changed; handlers call getReminders(), which delta-syncs by version
+  const dispatch = (type, data) => {
+    if (type === 'recognition') handlers.onRecognition?.(data);
+    if (type === 'roster') handlers.onRoster?.(data);
+    if (type === 'reminder') handlers.onReminder?.(data);
+    if (type === 'reset') handlers.onReset?.(data);
+  };
+
+  const parseBlock = (block) => {
+    let type = 'message';
+    const dataLines = [];
+    block.split('\n').forEach((line) => {
+      if (line.startsWith(':')) return;
+      const [field, ...rest] = line.split(':');
+      const value = rest.join(':').replace(/^ /, '');
+      if (field === 'id') lastEventId = value;
+      else if (field === 'event') type = value;
+      else if (field === 'retry') retryMs = parseInt(value) || retryMs;
+      else if (field === 'data') dataLines.push(value);
+    });
+    if (dataLines.length) {
+      try {
+        dispatch(type, JSON.parse(dataLines.join('\n')));
+      } catch (error) {
+        console.warn('Bad push event', error);
+      }
+    }
+  };
+
+  const connect = () => {
+    let seen = 0;
+    let buffer = '';
+    xhr = new XMLHttpRequest();
+    xhr.open('GET', `${API_BASE_URL}/events`);
+    xhr.setRequestHeader('Authorization', `Bearer ${DEVICE_TOKEN}`);
+    xhr.setRequestHeader('Accept', 'text/event-stream');
+    if (lastEventId) {
+      xhr.setRequestHeader('Last-Event-ID', lastEventId);
+    }
+    xhr.onprogress = () => {
+      buffer += xhr.responseText.slice(seen);
+      seen = xhr.responseText.length;
+      const blocks = buffer.split('\n\n');
+      buffer = blocks.pop();
+      blocks.forEach(parseBlock);
+    };
+    xhr.onloadend = () => {
+      if (closed) return;
+      if (xhr.status === 401) {
+        console.warn('Push channel rejected the device token');
+        return;
+      }
+      const retryAfter = parseInt(xhr.getResponseHeader('Retry-After'));
+      reconnectTimer = setTimeout(connect, retryAfter ? retryAfter * 1000 : retryMs);
+    };
+    xhr.send();
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(reconnectTimer);
+    xhr?.abort();
+  };
+};